@@ -120,6 +120,8 @@ if /i "%INSTALL_UI%"=="Y" (
     python --version
     call "%SCRIPT_DIR%\lollmsenv.bat" install pyqt5
     copy "src\lollmsenv_ui.py" "%SCRIPT_DIR%\lollmsenv_ui.py"
+    :: The UI reads registries and package metadata in-process through the lollmsenv package
+    xcopy /E /I /Y "lollmsenv_py\lollmsenv" "%INSTALL_DIR%\lib\lollmsenv" >nul
     echo LollmsEnv UI installed successfully
 )
 
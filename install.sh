@@ -156,6 +156,10 @@ if [[ $INSTALL_UI =~ ^[Yy]$ ]]; then
     source "$SCRIPT_DIR/lollmsenv" activate lollmsenv_ui
     "$SCRIPT_DIR/lollmsenv" install pyqt5
     cp src/lollmsenv_ui.py "$SCRIPT_DIR/lollmsenv_ui.py"
+    # The UI reads registries and package metadata in-process through the lollmsenv package
+    mkdir -p "$INSTALL_DIR/lib"
+    rm -rf "$INSTALL_DIR/lib/lollmsenv"
+    cp -r lollmsenv_py/lollmsenv "$INSTALL_DIR/lib/lollmsenv"
     echo "LollmsEnv UI installed successfully"
 fi
 
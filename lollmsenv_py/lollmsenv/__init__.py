@@ -1,3 +1,10 @@
-from .core import LollmsEnv
 __version__ = "0.1.0"
-__all__ = ["LollmsEnv"]
\ No newline at end of file
+__all__ = ["LollmsEnv"]
+
+
+def __getattr__(name):
+    # `from lollmsenv import LollmsEnv` loads the engine; importing a submodule (the CLI, the registry) does not
+    if name == "LollmsEnv":
+        from .core import LollmsEnv
+        return LollmsEnv
+    raise AttributeError(f"module 'lollmsenv' has no attribute {name!r}")
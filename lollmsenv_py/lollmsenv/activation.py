@@ -0,0 +1,105 @@
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from .exceptions import LollmsEnvError
+from .utils import IS_WINDOWS
+
+
+def venv_home(env_path):
+    # pyvenv.cfg "home" is the bin directory of the interpreter the venv was created from (bundles included)
+    try:
+        with open(Path(env_path) / "pyvenv.cfg") as f:
+            for line in f:
+                key, sep, value = line.partition("=")
+                if sep and key.strip() == "home":
+                    return value.strip()
+    except OSError:
+        pass
+    return None
+
+
+class Activation:
+    # Everything bin/activate changes, resolved once per env: VIRTUAL_ENV, the PATH prefix, the interpreter,
+    # and program names already looked up in the env's bin directories.
+
+    def __init__(self, env_path, python_bin):
+        self.env_path = Path(env_path)
+        self.bin_dir = self.env_path / ("Scripts" if IS_WINDOWS else "bin")
+        self.python = self.bin_dir / ("python.exe" if IS_WINDOWS else "python")
+        dirs = [str(self.bin_dir)] + ([str(python_bin)] if python_bin else [])
+        self.path_prefix = os.pathsep.join(dirs)
+        self._programs = {}
+        self._bin_mtime = None
+
+    def environ(self, base=None):
+        env = dict(os.environ if base is None else base)
+        env.pop("PYTHONHOME", None)
+        env["VIRTUAL_ENV"] = str(self.env_path)
+        env["PATH"] = self.path_prefix + os.pathsep + env["PATH"] if env.get("PATH") else self.path_prefix
+        return env
+
+    def resolve(self, program):
+        # "python", "pip", console scripts... -> absolute path inside the env, otherwise left to PATH.
+        # Only hits are remembered, while the file is still there and bin/ is unchanged (pip install adds to it).
+        if os.path.dirname(program):
+            return program
+        try:
+            mtime = os.stat(self.bin_dir).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._bin_mtime:
+            self._programs.clear()
+            self._bin_mtime = mtime
+        resolved = self._programs.get(program)
+        if resolved is not None and os.path.isfile(resolved):
+            return resolved
+        resolved = shutil.which(program, path=self.path_prefix)
+        if resolved is None:
+            self._programs.pop(program, None)
+            return program
+        self._programs[program] = resolved
+        return resolved
+
+
+class ActivationCache:
+    # One Activation per env name, reused until the registry entry for that env changes
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        env = self.engine.registry.get_env(name)
+        if env is None:
+            raise LollmsEnvError(f"Environment '{name}' not found")
+        key = (str(env["path"]), env["python"])
+        with self._lock:
+            cached = self._cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if not Path(env["path"]).is_dir():
+            raise LollmsEnvError(f"Environment directory '{env['path']}' does not exist")
+        python_bin = venv_home(env["path"])
+        if python_bin is None:
+            # The registry holds a version, or the interpreter prefix for bundles and discovered interpreters
+            _, prefix = (None, env["python"]) if os.path.isabs(env["python"]) else self.engine.resolve_python(env["python"])
+            python_bin = self.engine.interpreter_path(prefix).parent if prefix is not None else None
+        activation = Activation(env["path"], python_bin)
+        with self._lock:
+            self._cache[name] = (key, activation)
+        return activation
+
+    def invalidate(self, name):
+        with self._lock:
+            self._cache.pop(name, None)
+
+    def run(self, name, command, **kwargs):
+        # Execute directly with the env applied: no shell, no sourcing of bin/activate
+        if isinstance(command, (str, os.PathLike)):
+            command = [command]
+        activation = self.get(name)
+        argv = [activation.resolve(str(command[0]))] + [str(arg) for arg in command[1:]]
+        return subprocess.run(argv, env=activation.environ(kwargs.pop("env", None)), **kwargs)
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+import posixpath
+import shutil
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from .exceptions import LollmsEnvError
+from .utils import FileLock, atomic_write_text
+from .download import ChunkedDownloader
+
+DEFAULT_MAX_MB = 2048
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def asset_name(url):
+    return urllib.parse.unquote(posixpath.basename(urllib.parse.urlparse(url).path))
+
+
+class ArchiveCache:
+    # Persistent, content-addressed store for interpreter archives shared with lollmsenv.sh.
+    # objects/<sha256> holds verified archives, index.txt maps "asset name<TAB>sha256",
+    # partial/<asset name> holds interrupted downloads that are resumed with an HTTP Range request.
+    # Object mtimes are bumped on every hit and drive LRU eviction.
+
+    def __init__(self, home, max_bytes=None, offline=None):
+        self.dir = Path(home) / "cache" / "archives"
+        self.objects_dir = self.dir / "objects"
+        self.partial_dir = self.dir / "partial"
+        self.index_path = self.dir / "index.txt"
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("LOLLMSENV_ARCHIVE_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.offline = offline if offline is not None else bool(os.environ.get("LOLLMSENV_OFFLINE"))
+        self.downloader = ChunkedDownloader()
+
+    def _index(self):
+        index = {}
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 2:
+                        index[parts[0]] = parts[1]
+        except FileNotFoundError:
+            pass
+        return index
+
+    def _record(self, name, digest):
+        with FileLock(self.dir / "index.lock"):
+            index = self._index()
+            index[name] = digest
+            atomic_write_text(self.index_path, "".join(f"{n}\t{d}\n" for n, d in index.items()))
+
+    def object_path(self, digest):
+        return self.objects_dir / digest
+
+    def lookup(self, url):
+        digest = self._index().get(asset_name(url))
+        if digest and self.object_path(digest).exists():
+            path = self.object_path(digest)
+            os.utime(path)
+            return path
+        return None
+
+    def published_checksum(self, url):
+        # python-build-standalone publishes <asset>.sha256 for each asset and SHA256SUMS per release
+        name = asset_name(url)
+        try:
+            with urllib.request.urlopen(url + ".sha256", timeout=30) as response:
+                return response.read().decode().split()[0].lower()
+        except (urllib.error.URLError, OSError, IndexError):
+            pass
+        try:
+            with urllib.request.urlopen(posixpath.dirname(url) + "/SHA256SUMS", timeout=30) as response:
+                for line in response.read().decode().splitlines():
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1].lstrip("*") == name:
+                        return parts[0].lower()
+        except (urllib.error.URLError, OSError):
+            pass
+        return None
+
+    def _download(self, url, partial, progress=None):
+        if partial.exists() and not os.path.exists(f"{partial}.chunks"):
+            # Left behind by an interrupted single-stream download (ours or lollmsenv.sh's wget -c)
+            return self._resume(url, partial)
+        self.downloader.download(url, str(partial), progress)
+
+    def _resume(self, url, partial):
+        offset = partial.stat().st_size if partial.exists() else 0
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        try:
+            response = urllib.request.urlopen(request, timeout=60)
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                # Partial file is already complete (or garbage): let verification decide
+                return
+            raise LollmsEnvError(f"Failed to download {url}: HTTP {e.code}")
+        except (urllib.error.URLError, OSError) as e:
+            raise LollmsEnvError(f"Failed to download {url}: {e}")
+        with response:
+            resumed = offset and response.status == 206
+            if offset and not resumed:
+                logger.info("Server ignored the Range request, restarting download of %s", url)
+            length = response.headers.get("Content-Length")
+            expected_size = (offset if resumed else 0) + int(length) if length else None
+            try:
+                with open(partial, "ab" if resumed else "wb") as f:
+                    shutil.copyfileobj(response, f, CHUNK_SIZE)
+            except OSError as e:
+                raise LollmsEnvError(f"Download of {url} interrupted, it will resume on the next attempt: {e}")
+        if expected_size is not None and partial.stat().st_size < expected_size:
+            raise LollmsEnvError(f"Download of {url} interrupted, it will resume on the next attempt")
+
+    def _store(self, name, partial, expected, digest=None):
+        digest = digest or sha256_file(partial)
+        if expected and digest != expected:
+            partial.unlink()
+            raise LollmsEnvError(f"Checksum mismatch for {name}: expected {expected}, got {digest}")
+        path = self.object_path(digest)
+        os.replace(partial, path)
+        self._record(name, digest)
+        self.evict(keep=path)
+        return path
+
+    def _prepare(self, url, expected_sha256):
+        if self.offline:
+            raise LollmsEnvError(f"Offline mode and {asset_name(url)} is not in the archive cache")
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        expected = expected_sha256 or self.published_checksum(url)
+        if expected is None:
+            logger.warning("No published checksum found for %s, caching it unverified", asset_name(url))
+        return expected
+
+    def fetch(self, url, expected_sha256=None, progress=None):
+        cached = self.lookup(url)
+        if cached:
+            return cached
+        name = asset_name(url)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        # One downloader per asset; other processes wait and then hit the cache
+        with FileLock(self.partial_dir / f"{name}.lock"):
+            cached = self.lookup(url)
+            if cached:
+                return cached
+            expected = self._prepare(url, expected_sha256)
+            partial = self.partial_dir / name
+            self._download(url, partial, progress)
+            return self._store(name, partial, expected)
+
+    def fetch_streaming(self, url, consume, expected_sha256=None, progress=None):
+        # Hand the archive to consume(fileobj) while it downloads, hashing the stream on the way;
+        # the verified archive still ends up in the cache for the next install.
+        cached = self.lookup(url)
+        if cached is None:
+            name = asset_name(url)
+            self.partial_dir.mkdir(parents=True, exist_ok=True)
+            with FileLock(self.partial_dir / f"{name}.lock"):
+                cached = self.lookup(url)
+                if cached is None:
+                    expected = self._prepare(url, expected_sha256)
+                    partial = self.partial_dir / name
+                    if partial.exists() and not os.path.exists(f"{partial}.chunks"):
+                        self._resume(url, partial)
+                        cached = self._store(name, partial, expected)
+                    else:
+                        transfer = self.downloader.start(url, str(partial), progress)
+                        reader = transfer.reader()
+                        try:
+                            consume(reader)
+                            digest = reader.drain()
+                            transfer.wait()
+                        except BaseException:
+                            transfer.cancel()
+                            transfer.thread.join()
+                            raise
+                        finally:
+                            reader.close()
+                        return self._store(name, partial, expected, digest)
+        with open(cached, "rb") as f:
+            consume(f)
+        return cached
+
+    def usage(self):
+        if not self.objects_dir.exists():
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.objects_dir) if entry.is_file())
+
+    def evict(self, keep=None):
+        if not self.objects_dir.exists():
+            return []
+        entries = sorted((e for e in os.scandir(self.objects_dir) if e.is_file()), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and Path(entry.path) == Path(keep):
+                continue
+            total -= entry.stat().st_size
+            os.unlink(entry.path)
+            removed.append(entry.name)
+        if removed:
+            with FileLock(self.dir / "index.lock"):
+                index = self._index()
+                atomic_write_text(self.index_path, "".join(f"{n}\t{d}\n" for n, d in index.items() if d not in removed))
+        return removed
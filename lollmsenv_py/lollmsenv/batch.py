@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .exceptions import LollmsEnvError
+
+DEFAULT_WORKERS = 8
+
+
+class ItemResult:
+    def __init__(self, item, ok, value=None, error=None, duration=0.0):
+        self.item = item
+        self.ok = ok
+        self.value = value
+        self.error = error
+        self.duration = duration
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"ItemResult({self.item!r}, {status}, {self.duration:.3f}s)"
+
+    def to_dict(self):
+        return {"item": self.item, "ok": self.ok, "value": None if self.value is None else str(self.value),
+                "error": self.error, "duration": self.duration}
+
+
+class KeyedLimiter:
+    # Per-resource concurrency limits: "python:3.11.9" -> 1 installer, "env:foo" -> 1 mutator, ...
+    def __init__(self, limits=None, default=1):
+        self.limits = dict(limits or {})
+        self.default = default
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, key):
+        with self._lock:
+            if key not in self._semaphores:
+                kind = key.split(":", 1)[0]
+                self._semaphores[key] = threading.BoundedSemaphore(self.limits.get(kind, self.default))
+            return self._semaphores[key]
+
+    def hold(self, key):
+        return self._semaphore(key)
+
+
+class _Once:
+    # Runs shared work once per key; concurrent callers wait for, and share, the first outcome
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+        self._results = {}
+
+    def run(self, key, fn):
+        with self._lock:
+            event = self._events.get(key)
+            owner = event is None
+            if owner:
+                event = self._events[key] = threading.Event()
+        if owner:
+            try:
+                self._results[key] = (True, fn())
+            except Exception as e:
+                self._results[key] = (False, e)
+            finally:
+                event.set()
+        else:
+            event.wait()
+        ok, value = self._results[key]
+        if not ok:
+            raise value
+        return value
+
+
+class BatchRunner:
+    # Thread-pool scheduler over an Engine. Shared prerequisites (interpreter installs, venv templates)
+    # run once per key, mutations of one env are serialized, and every item yields an ItemResult.
+
+    def __init__(self, engine, max_workers=None, limits=None):
+        self.engine = engine
+        self.max_workers = max_workers or int(os.environ.get("LOLLMSENV_BATCH_WORKERS", DEFAULT_WORKERS))
+        self.limiter = KeyedLimiter({"python": 1, "env": 1, "pip": self.max_workers, **(limits or {})})
+        self._once = _Once()
+
+    def _timed(self, item, fn):
+        start = time.perf_counter()
+        try:
+            value = fn()
+            return ItemResult(item, True, value, duration=time.perf_counter() - start)
+        except Exception as e:
+            return ItemResult(item, False, error=str(e), duration=time.perf_counter() - start)
+
+    def map(self, fn, items):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda item: self._timed(item, lambda: fn(item)), items))
+
+    def ensure_python(self, version):
+        def install():
+            with self.limiter.hold(f"python:{version}"):
+                # Managed or discovered interpreters are used as they are; only a miss is downloaded
+                try:
+                    located = self.engine.locate_python(version)
+                except LollmsEnvError:
+                    self.engine.install_python(version)
+                    located = self.engine.locate_python(version)
+                if self.engine.templates.enabled:
+                    self.engine.templates.ensure(located[1])
+                return located
+        return self._once.run(f"python:{version}", install)
+
+    def create_envs(self, specs):
+        # specs: iterable of (name, python_version[, custom_dir]) tuples or {"name", "python_version", "custom_dir"}
+        specs = [dict(zip(("name", "python_version", "custom_dir"), s)) if not isinstance(s, dict) else s
+                 for s in specs]
+        names = [s["name"] for s in specs]
+        duplicates = {n for n in names if names.count(n) > 1}
+
+        def create(spec):
+            if spec["name"] in duplicates:
+                raise LollmsEnvError(f"Environment '{spec['name']}' is requested more than once")
+            python, interpreter = self.ensure_python(spec["python_version"])
+            with self.limiter.hold(f"env:{spec['name']}"):
+                return self.engine.create_env(spec["name"], python, spec.get("custom_dir"), interpreter=interpreter)
+
+        results = self.map(create, specs)
+        for result in results:
+            result.item = result.item["name"]
+        return results
+
+    def delete_envs(self, names):
+        def delete(name):
+            with self.limiter.hold(f"env:{name}"):
+                self.engine.delete_env(name)
+                return name
+        return self.map(delete, list(names))
+
+    def install_packages(self, env_name, packages):
+        # One resolver pass for the whole list; if it fails, retry one by one to attribute the errors
+        packages = list(dict.fromkeys(packages))
+        if not packages:
+            return []
+        start = time.perf_counter()
+        with self.limiter.hold(f"env:{env_name}"), self.limiter.hold("pip:global"):
+            try:
+                output = self.engine.install_packages(env_name, packages)
+                duration = time.perf_counter() - start
+                return [ItemResult(p, True, output, duration=duration) for p in packages]
+            except LollmsEnvError:
+                pass
+            return [self._timed(p, lambda p=p: self.engine.install_packages(env_name, [p])) for p in packages]
+
+    def install_packages_many(self, requests):
+        # requests: {env_name: [packages]}; envs proceed in parallel, each env's installs are serialized
+        items = list(requests.items())
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda kv: (kv[0], self.install_packages(kv[0], kv[1])), items)
+            return dict(results)
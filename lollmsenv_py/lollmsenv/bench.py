@@ -0,0 +1,693 @@
+import argparse
+import hashlib
+import io
+import http.server
+import os
+import re
+import threading
+import json
+import multiprocessing
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from . import __version__
+from .core import LollmsEnv
+from .registry import Registry
+from .download import ChunkedDownloader
+from .engine import Engine
+from .batch import BatchRunner
+from .discovery import InterpreterIndex
+from .packing import default_compression
+from .packages import site_packages_dirs
+from .telemetry import Telemetry, phase
+from .utils import run_command
+
+
+def _timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "mean_ms": statistics.mean(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+    }
+
+
+def make_home(root, entries):
+    root = Path(root)
+    (root / "pythons").mkdir(parents=True, exist_ok=True)
+    (root / "envs").mkdir(parents=True, exist_ok=True)
+    with open(root / "pythons" / "installed_pythons.txt", "w") as f:
+        for i in range(entries):
+            f.write(f"3.{i // 100}.{i % 100}:{root}/pythons/3.{i // 100}.{i % 100}\n")
+    with open(root / "envs" / "installed_envs.txt", "w") as f:
+        for i in range(entries):
+            f.write(f"env{i}:{root}/envs/env{i}:3.11.9\n")
+    return root
+
+
+def bench_list(script, entries=100, repeat=50):
+    # Per-call latency of list-envs/list-pythons: in-process engine vs the shell front-end
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        home = make_home(tmp, entries)
+        (home / "bin").mkdir()
+        shutil.copy(script, home / "bin" / "lollmsenv")
+        env = LollmsEnv(home)
+        results = {}
+        for command in ("list-envs", "list-pythons"):
+            method = getattr(env, command.replace("-", "_"))
+            results[command] = {
+                "engine": _timeit(method, repeat),
+                "subprocess": _timeit(lambda: run_command(["bash", env.lollmsenv_path, command]), repeat),
+            }
+            results[command]["speedup"] = results[command]["subprocess"]["mean_ms"] / results[command]["engine"]["mean_ms"]
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _stress_worker(home, worker, ops):
+    registry = Registry(home)
+    for i in range(ops):
+        name = f"w{worker}-{i}"
+        registry.add_env(name, f"{home}/envs/{name}", "3.11.9")
+        if i % 2 == 0:
+            registry.remove_env(name)
+
+
+def stress_registry(workers=16, ops=100):
+    # Parallel create/delete from many processes; every surviving entry must be present exactly once
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-stress-"))
+    try:
+        start = time.perf_counter()
+        procs = [multiprocessing.Process(target=_stress_worker, args=(str(tmp), w, ops)) for w in range(workers)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - start
+        expected = {f"w{w}-{i}" for w in range(workers) for i in range(ops) if i % 2}
+        registry = Registry(tmp)
+        in_db = set(registry.envs())
+        in_text = [line.split(":")[0] for line in (tmp / "envs" / "installed_envs.txt").read_text().splitlines()]
+        return {
+            "workers": workers,
+            "operations": workers * ops * 3 // 2,
+            "seconds": elapsed,
+            "lost": len(expected - in_db),
+            "stale": len(in_db - expected),
+            "text_mirror_consistent": sorted(in_text) == sorted(expected),
+            "failed_workers": sum(1 for proc in procs if proc.exitcode != 0),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+class StandInServer:
+    # Local HTTP stand-in for the release API and asset host: serves in-memory files with ETag (and, given
+    # last_modified, Last-Modified) validators and byte-range support, optionally throttled per connection to
+    # mimic a high-latency link. requests records (path, headers) per GET; drop maps the number of a request
+    # (1 for the first) to the byte count its response is cut off after, like a dropped connection.
+
+    def __init__(self, files=None, bytes_per_second=None, ranges=True, last_modified=None):
+        self.files = dict(files or {})
+        self.bytes_per_second = bytes_per_second
+        self.ranges = ranges
+        self.last_modified = last_modified
+        self.drop = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                with server._lock:
+                    server.requests.append((path, self.headers))
+                    drop = server.drop.get(len(server.requests))
+                body = server.files.get(path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = f'"{hash(body) & 0xffffffff:x}"'
+                if self.headers.get("If-None-Match") == etag or (
+                        server.last_modified and self.headers.get("If-Modified-Since") == server.last_modified):
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+                if server.ranges and match:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else len(body) - 1
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                    body = body[start:end + 1]
+                else:
+                    self.send_response(200)
+                self.send_header("ETag", etag)
+                if server.last_modified:
+                    self.send_header("Last-Modified", server.last_modified)
+                self.send_header("Accept-Ranges", "bytes" if server.ranges else "none")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if drop is not None:
+                    body = body[:drop]
+                    self.close_connection = True
+                step = 64 * 1024
+                try:
+                    for offset in range(0, len(body), step):
+                        self.wfile.write(body[offset:offset + step])
+                        if server.bytes_per_second:
+                            time.sleep(step / server.bytes_per_second)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client went away (cancelled or interrupted download)
+                    self.close_connection = True
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def bench_download(size_mb=32, bytes_per_second=8 * 1024 * 1024, connections=8):
+    # Throughput of a single stream vs parallel byte-range chunks against a throttled local server
+    payload = os.urandom(size_mb * 1024 * 1024)
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    results = {"size_mb": size_mb, "per_connection_mb_s": bytes_per_second / 1024 / 1024}
+    try:
+        with StandInServer({"/archive.tar.gz": payload}, bytes_per_second) as server:
+            for label, count in (("single_stream", 1), ("chunked", connections)):
+                dest = tmp / f"{label}.bin"
+                start = time.perf_counter()
+                ChunkedDownloader(connections=count).download(f"{server.url}/archive.tar.gz", str(dest))
+                elapsed = time.perf_counter() - start
+                if dest.read_bytes() != payload:
+                    raise RuntimeError(f"{label} download is corrupted")
+                results[label] = {"seconds": elapsed, "mb_s": size_mb / elapsed}
+        results["speedup"] = results["single_stream"]["seconds"] / results["chunked"]["seconds"]
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+ASSET = "cpython-3.11.9+20240415-x86_64-unknown-linux-gnu-install_only.tar.gz"
+
+
+def make_archive(size_mb=32, files=8):
+    # python-build-standalone shaped archive: python/bin/python3 plus incompressible payload
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=1) as tar:
+        def add(name, data, mode=0o644):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = mode
+            tar.addfile(info, io.BytesIO(data))
+        add("python/bin/python3", b"#!/bin/sh\nexit 0\n", 0o755)
+        for i in range(files):
+            add(f"python/lib/payload{i}.bin", os.urandom(size_mb * 1024 * 1024 // files))
+    return buf.getvalue()
+
+
+def release_server(archive, bytes_per_second=None):
+    server = StandInServer(bytes_per_second=bytes_per_second)
+    releases = [{"assets": [{"browser_download_url": f"{server.url}/download/{ASSET}"}]}]
+    server.files["/releases"] = json.dumps(releases).encode()
+    server.files[f"/download/{ASSET}"] = archive
+    server.files[f"/download/{ASSET}.sha256"] = hashlib.sha256(archive).hexdigest().encode()
+    return server
+
+
+def bench_install(size_mb=32, bytes_per_second=16 * 1024 * 1024):
+    # Streaming install (extract while downloading) against the download alone
+    archive = make_archive(size_mb)
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        with release_server(archive, bytes_per_second) as server:
+            start = time.perf_counter()
+            ChunkedDownloader().download(f"{server.url}/download/{ASSET}", str(tmp / "download-only.bin"))
+            download = time.perf_counter() - start
+            engine = Engine(tmp / "home")
+            engine.catalog.url = f"{server.url}/releases"
+            start = time.perf_counter()
+            engine.install_python("3.11.9")
+            install = time.perf_counter() - start
+        return {"size_mb": size_mb, "download_seconds": download, "install_seconds": install,
+                "overhead": install / download}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_create_env(interpreter_prefix=None, repeat=3):
+    # create-env latency: venv + pip bootstrap every time vs cloning the interpreter's golden venv
+    prefix = Path(interpreter_prefix or sys.base_prefix)
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        engine = Engine(tmp)
+        engine.register_python("bench", prefix)
+        results = {}
+        for label, enabled in (("venv_and_pip", False), ("template_clone", True)):
+            engine.templates.enabled = enabled
+            if enabled:
+                engine.templates.ensure(engine.resolve_interpreter("bench"))
+            counter = iter(range(repeat))
+            results[label] = _timeit(lambda: engine.create_env(f"{label}-{next(counter)}", "bench"), repeat)
+        results["speedup"] = results["venv_and_pip"]["mean_ms"] / results["template_clone"]["mean_ms"]
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_batch(interpreter_prefix=None, count=16, workers=8):
+    # create_envs on a worker pool vs one create_env after the other (templates built beforehand for both)
+    prefix = Path(interpreter_prefix or sys.base_prefix)
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        engine = Engine(tmp)
+        engine.register_python("bench", prefix)
+        engine.templates.ensure(engine.resolve_interpreter("bench"))
+        start = time.perf_counter()
+        for i in range(count):
+            engine.create_env(f"serial-{i}", "bench")
+        serial = time.perf_counter() - start
+        start = time.perf_counter()
+        items = BatchRunner(engine, workers).create_envs([(f"batch-{i}", "bench") for i in range(count)])
+        batch = time.perf_counter() - start
+        return {"envs": count, "workers": workers, "serial_s": serial, "batch_s": batch,
+                "failed": [r.item for r in items if not r.ok], "speedup": serial / batch}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_run(script, interpreter_prefix=None, repeat=20):
+    # Launching `python -c pass` inside an env: sourcing bin/activate in a shell, `lollmsenv run`, run_in_env()
+    prefix = Path(interpreter_prefix or sys.base_prefix)
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        (tmp / "bin").mkdir()
+        shutil.copy(script, tmp / "bin" / "lollmsenv")
+        env = LollmsEnv(tmp)
+        env.engine.register_python("bench", prefix)
+        env_path = env.engine.create_env("bench", "bench")
+        command = ["python", "-c", "pass"]
+        activate = f"source '{env_path}/bin/activate' && python -c pass"
+        results = {
+            "source_activate": _timeit(lambda: run_command(["bash", "-c", activate]), repeat),
+            "lollmsenv_run": _timeit(lambda: run_command(["bash", env.lollmsenv_path, "run", "bench", "--", *command]), repeat),
+            "run_in_env": _timeit(lambda: env.run_in_env("bench", command, check=True), repeat),
+        }
+        results["speedup"] = results["source_activate"]["mean_ms"] / results["run_in_env"]["mean_ms"]
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_discovery(repeat=20):
+    # Interpreter discovery: first scan (every candidate probed) vs later scans and spec queries served by the index
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        index = InterpreterIndex(tmp)
+        start = time.perf_counter()
+        found = index.scan()
+        cold = time.perf_counter() - start
+        return {"interpreters": len(found), "cold_ms": cold * 1000, "warm": _timeit(index.scan, repeat),
+                "find": _timeit(lambda: index.find(">=3.10,<3.12"), repeat)}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_du(interpreter_prefix=None, count=32, workers=8, repeat=3):
+    # Per-tree accounting of a home with many template-cloned envs: one scanning thread vs a pool
+    prefix = Path(interpreter_prefix or sys.base_prefix)
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        engine = Engine(tmp)
+        engine.register_python("bench", prefix)
+        BatchRunner(engine, workers).create_envs([(f"env-{i}", "bench") for i in range(count)])
+        results = {"envs": count, "workers": workers}
+        for label, pool in (("serial", 1), ("parallel", workers)):
+            engine.garbage.workers = pool
+            results[label] = _timeit(engine.garbage.du, repeat)
+        results["speedup"] = results["serial"]["mean_ms"] / results["parallel"]["mean_ms"]
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_bundle(interpreter_prefix=None, packages=("numpy", "scipy", "pandas", "scikit-learn"), repeat=1):
+    # Exporting a bundle with a typical ML stack to an archive and importing it into another home, per compression
+    prefix = Path(interpreter_prefix or sys.base_prefix)
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        engine = Engine(tmp / "source")
+        engine.register_python("bench", prefix)
+        engine.create_bundle("ml", "bench", "ml")
+        engine.install_packages("ml", packages)
+        results = {"packages": list(packages)}
+        for compression in dict.fromkeys([default_compression(), "gzip"]):
+            archive = tmp / f"ml.{compression}"
+            stats = {}
+
+            def export():
+                stats.update(engine.export_bundle("ml", archive, compression))
+
+            def import_():
+                shutil.rmtree(tmp / "target", ignore_errors=True)
+                Engine(tmp / "target").import_bundle(archive)
+
+            pack, unpack = _timeit(export, repeat), _timeit(import_, repeat)
+            mb = stats["input_bytes"] / 1024 / 1024
+            results[compression] = {
+                "files": stats["files"], "objects": stats["objects"], "input_mb": mb,
+                "archive_mb": stats["output_bytes"] / 1024 / 1024, "ratio": stats["input_bytes"] / stats["output_bytes"],
+                "export": pack, "import": unpack, "export_mb_s": mb / pack["mean_ms"] * 1000,
+                "import_mb_s": mb / unpack["mean_ms"] * 1000,
+            }
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_telemetry(spans=1000, repeat=5):
+    # Cost of an operation span with one nested phase: event log on (one appended line per span) vs disabled
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        results = {"spans": spans}
+        for label, path in (("event_log", tmp / "events.jsonl"), ("disabled", "")):
+            telemetry = Telemetry(tmp, path)
+
+            def run():
+                for _ in range(spans):
+                    with telemetry.span("bench"), phase("step"):
+                        pass
+
+            timing = _timeit(run, repeat)
+            results[label] = dict(timing, per_span_us=timing["mean_ms"] * 1000 / (spans * 2))
+        results["metrics_render_ms"] = _timeit(Telemetry(tmp, tmp / "events.jsonl").render_metrics, repeat)["mean_ms"]
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Modules a read-only command must not import: `python -m lollmsenv list-envs` and `import lollmsenv` stay cheap only
+# while the engine and its dependencies are loaded lazily
+EAGER = ("lollmsenv.core", "lollmsenv.engine", "subprocess", "urllib.request", "tarfile", "concurrent.futures")
+STARTUP_BUDGET_MS = 50
+
+
+def bench_startup(entries=100, repeat=21, budget_ms=STARTUP_BUDGET_MS):
+    # Cold-interpreter wall time of `import lollmsenv`, `python -m lollmsenv list-envs` and the full LollmsEnv
+    # import, next to a bare interpreter; list-envs is held to budget_ms and to importing none of EAGER
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        home = make_home(tmp, entries)
+        env = dict(os.environ, LOLLMSENV_DIR=str(home), LOLLMSENV_DAEMON="0",
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(Path(__file__).resolve().parents[1]),
+                                                            os.environ.get("PYTHONPATH")])))
+
+        def cold(*args):
+            return lambda: subprocess.run([sys.executable, *args], env=env, check=True, capture_output=True)
+
+        # The first run imports the text registries into registry.db
+        cold("-m", "lollmsenv", "list-envs")()
+        loaded = {}
+        for name, code in (("import", "import lollmsenv"),
+                           ("cli_list_envs", "from lollmsenv.cli import main; main(['list-envs'])")):
+            probe = subprocess.run([sys.executable, "-c", f"{code}\nimport sys; sys.stderr.write(' '.join(sys.modules))"],
+                                   env=env, check=True, capture_output=True, text=True)
+            loaded[name] = sorted(set(probe.stderr.split()) & set(EAGER))
+        result = {
+            "entries": entries,
+            "interpreter": _timeit(cold("-c", "pass"), repeat),
+            "import": _timeit(cold("-c", "import lollmsenv"), repeat),
+            "cli_list_envs": _timeit(cold("-m", "lollmsenv", "list-envs"), repeat),
+            "import_lollmsenv_class": _timeit(cold("-c", "from lollmsenv import LollmsEnv"), repeat),
+            "eager_imports": loaded,
+            "budget_ms": budget_ms,
+        }
+        result["within_budget"] = result["cli_list_envs"]["median_ms"] <= budget_ms and not any(loaded.values())
+        return result
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Regression suite: the provisioning hot paths, offline against the stand-in release server. Every timing is a
+# _timeit dict; compare() flags those whose median got slower than in a baseline run saved with --output.
+SUITE = ("registry", "install_python", "create_env", "bundle", "packages", "startup")
+
+
+def make_interpreter_archive(prefix):
+    # The local interpreter packed like a python-build-standalone install_only archive (site-packages and the
+    # stdlib tests left out), so installs from the stand-in server give a working Python without network
+    prefix = Path(prefix)
+    skip = {"site-packages", "test", "__pycache__"}
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz", compresslevel=1) as tar:
+        for top in ("bin", "lib", "include"):
+            if (prefix / top).exists():
+                tar.add(prefix / top, f"python/{top}",
+                        filter=lambda info: None if os.path.basename(info.name) in skip else info)
+    return buf.getvalue()
+
+
+def suite_registry(script, entries=10000, repeat=20):
+    # Registries of 10k interpreters and envs: first load, point lookups, listings, spec resolution
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-bench-"))
+    try:
+        home = make_home(tmp, entries)
+        (home / "bin").mkdir()
+        shutil.copy(script, home / "bin" / "lollmsenv")
+        first_load = _timeit(lambda: Engine(home).envs(), 1)
+        env = LollmsEnv(home)
+        last = f"env{entries - 1}"
+        return {
+            "entries": entries,
+            "first_load": first_load,
+            "get_env": _timeit(lambda: env.engine.registry.get_env(last), repeat),
+            "get_env_missing": _timeit(lambda: env.engine.registry.get_env("missing"), repeat),
+            "envs": _timeit(env.engine.envs, repeat),
+            "list_envs": _timeit(env.list_envs, repeat),
+            "resolve_spec": _timeit(lambda: env.engine.resolve_python(">=3.50,<3.60"), repeat),
+            "shell_list_envs": _timeit(lambda: run_command(["bash", env.lollmsenv_path, "list-envs"]), 5),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def suite_install_python(new_engine, repeat=3):
+    # cold: catalog, download from the stand-in server, streaming extract, ensurepip; cached: archive cache hit
+    homes = iter(range(repeat))
+    cold = _timeit(lambda: new_engine(f"install-{next(homes)}").install_python("3.11.9"), repeat)
+    engine = new_engine("install-cached")
+    engine.install_python("3.11.9")
+
+    def cached():
+        engine.delete_python("3.11.9")
+        engine.install_python("3.11.9")
+
+    return {"cold": cold, "cached": _timeit(cached, repeat)}
+
+
+def suite_create_env(new_engine, repeat=10):
+    # Template clone into envs/ and removal; the template itself is built before timing
+    engine = new_engine("create-env")
+    engine.templates.ensure(engine.interpreter_path(engine.install_python("3.11.9")))
+    created, deleted = iter(range(repeat)), iter(range(repeat))
+    return {"create_env": _timeit(lambda: engine.create_env(f"env-{next(created)}", "3.11.9"), repeat),
+            "delete_env": _timeit(lambda: engine.delete_env(f"env-{next(deleted)}"), repeat)}
+
+
+def suite_bundle(new_engine, repeat=2):
+    # Interpreter linked from pythons/, then an env with its own template (the bundle's interpreter path is new)
+    engine = new_engine("bundle")
+    engine.install_python("3.11.9")
+    bundles = iter(range(repeat))
+
+    def create():
+        i = next(bundles)
+        engine.create_bundle(f"bundle-{i}", "3.11.9", f"bundle-env-{i}")
+
+    return {"create_bundle": _timeit(create, repeat)}
+
+
+def suite_packages(new_engine, count=300, repeat=20):
+    # The UI's package list for an env of `count` distributions: first scan, in-memory and on-disk cache hits
+    engine = new_engine("packages")
+    env_path = engine.envs_dir / "listing"
+    site = env_path / "lib" / "python3.11" / "site-packages"
+    for i in range(count):
+        info = site / f"package_{i}-1.{i}.0.dist-info"
+        info.mkdir(parents=True)
+        (info / "METADATA").write_text(f"Metadata-Version: 2.1\nName: package-{i}\nVersion: 1.{i}.0\n\nPayload\n")
+    engine.register_env("listing", env_path, "3.11.9")
+    assert site_packages_dirs(env_path)
+    env = LollmsEnv(engine.home)
+
+    def cold():
+        env.engine.packages.invalidate(str(env_path))
+        env.list_packages("listing")
+
+    scan = _timeit(cold, repeat)
+    env.list_packages("listing")
+    return {"packages": count, "scan": scan, "memory_cache": _timeit(lambda: env.list_packages("listing"), repeat),
+            "disk_cache": _timeit(lambda: LollmsEnv(engine.home).list_packages("listing"), repeat)}
+
+
+def run_suite(script, components=SUITE, wheelhouse=None):
+    tmp = Path(tempfile.mkdtemp(prefix="lollmsenv-suite-"))
+    try:
+        wheels = Path(wheelhouse) if wheelhouse else tmp / "wheels"
+        with release_server(make_interpreter_archive(sys.base_prefix)) as server:
+            def new_engine(name, offline=True):
+                # Timed work never reaches the network: the wheelhouse is shared and used offline
+                engine = Engine(tmp / name)
+                engine.catalog.url = f"{server.url}/releases"
+                engine.wheelhouse.dir = wheels
+                engine.wheelhouse.offline = offline
+                return engine
+
+            if {"create_env", "bundle"} & set(components):
+                # Templates need pip, setuptools and wheel: fetched once here unless --wheelhouse already has them
+                setup = new_engine("setup")
+                interpreter = setup.interpreter_path(setup.install_python("3.11.9"))
+                setup.wheelhouse.offline = bool(os.environ.get("LOLLMSENV_OFFLINE"))
+                setup.templates.ensure(interpreter)
+            runs = {
+                "registry": lambda: suite_registry(script),
+                "install_python": lambda: suite_install_python(new_engine),
+                "create_env": lambda: suite_create_env(new_engine),
+                "bundle": lambda: suite_bundle(new_engine),
+                "packages": lambda: suite_packages(new_engine),
+                "startup": lambda: bench_startup(),
+            }
+            results = {component: runs[component]() for component in components}
+        return {"suite": 1, "lollmsenv": __version__, "python": platform.python_version(),
+                "platform": platform.platform(), "timestamp": time.time(), "results": results}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def timings(results, prefix=""):
+    # {"create_env.create_env": median_ms, ...} for every _timeit dict in a suite result
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            if "median_ms" in value:
+                flat[prefix + key] = value["median_ms"]
+            else:
+                flat.update(timings(value, f"{prefix}{key}."))
+    return flat
+
+
+def compare(current, baseline, tolerance=0.25, floor_ms=1.0):
+    # Medians slower than the baseline by more than `tolerance`, ignoring differences under floor_ms (timer noise)
+    now, before = timings(current["results"]), timings(baseline["results"])
+    regressions = []
+    for key, median in now.items():
+        old = before.get(key)
+        if old is not None and median > old * (1 + tolerance) and median - old > floor_ms:
+            regressions.append({"metric": key, "baseline_ms": old, "current_ms": median, "ratio": median / old})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="lollmsenv benchmarks")
+    parser.add_argument("--script", default=str(Path(__file__).resolve().parents[2] / "src" / "lollmsenv.sh"),
+                        help="Path to lollmsenv.sh used for the subprocess baseline")
+    parser.add_argument("--entries", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--stress", action="store_true", help="Run the registry concurrency stress check instead")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--download", action="store_true", help="Compare single-stream and chunked downloads")
+    parser.add_argument("--install", action="store_true", help="Compare a streaming install with the download alone")
+    parser.add_argument("--create-env", action="store_true", help="Compare plain venv creation with template cloning")
+    parser.add_argument("--batch", action="store_true", help="Compare serial and pooled creation of many envs")
+    parser.add_argument("--run", action="store_true", help="Compare sourcing bin/activate with `run` and run_in_env")
+    parser.add_argument("--discovery", action="store_true", help="Compare a first interpreter scan with indexed ones")
+    parser.add_argument("--du", action="store_true", help="Compare serial and parallel disk-usage accounting")
+    parser.add_argument("--bundle", action="store_true", help="Time bundle export and import of an ML environment")
+    parser.add_argument("--telemetry", action="store_true", help="Measure the per-span cost of the event log")
+    parser.add_argument("--startup", action="store_true",
+                        help="Time cold starts of the CLI and package imports; exits with 1 past --budget-ms")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--suite", action="store_true", help="Run the offline regression suite")
+    parser.add_argument("--only", help=f"Comma-separated suite components ({', '.join(SUITE)})")
+    parser.add_argument("--output", help="Also write the suite result to this JSON file")
+    parser.add_argument("--baseline", help="Suite result to compare with; exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown of a median (0.25 = 25%%)")
+    parser.add_argument("--wheelhouse", help="Prefilled wheelhouse (pip, setuptools, wheel) for a fully offline suite")
+    args = parser.parse_args(argv)
+    if args.suite:
+        components = args.only.split(",") if args.only else SUITE
+        unknown = set(components) - set(SUITE)
+        if unknown:
+            parser.error(f"unknown suite components: {', '.join(sorted(unknown))}")
+        result = run_suite(args.script, components, args.wheelhouse)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(result, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                result["regressions"] = compare(result, json.load(f), args.tolerance)
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 1 if result.get("regressions") else 0
+    if args.startup:
+        result = bench_startup(args.entries, budget_ms=args.budget_ms)
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0 if result["within_budget"] else 1
+    if args.stress:
+        result = stress_registry(args.workers, args.repeat)
+    elif args.download:
+        result = bench_download(connections=args.workers)
+    elif args.install:
+        result = bench_install()
+    elif args.batch:
+        result = bench_batch(workers=args.workers)
+    elif args.telemetry:
+        result = bench_telemetry(repeat=args.repeat)
+    elif args.bundle:
+        result = bench_bundle()
+    elif args.du:
+        result = bench_du(workers=args.workers)
+    elif args.discovery:
+        result = bench_discovery(args.repeat)
+    elif args.run:
+        result = bench_run(args.script, repeat=args.repeat)
+    elif args.create_env:
+        result = bench_create_env(repeat=args.repeat)
+    else:
+        result = bench_list(args.script, args.entries, args.repeat)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import shutil
+from .exceptions import LollmsEnvError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+
+
+def _reflink(src, dst):
+    if fcntl is None or not hasattr(fcntl, "ioctl"):
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def place_file(src, dst, mode, stats):
+    # auto: reflink (copy-on-write, fully independent), then hardlink (shared inode), then a real copy
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(src, dst)
+            stats["reflink"] += 1
+            return mode
+        except OSError:
+            if mode == "reflink":
+                raise
+            mode = "auto-hardlink"
+    if mode in ("auto-hardlink", "hardlink"):
+        try:
+            os.link(src, dst)
+            stats["hardlink"] += 1
+            return mode
+        except OSError:
+            if mode == "hardlink":
+                raise
+            mode = "copy"
+    shutil.copy2(src, dst)
+    stats["copy"] += 1
+    return mode
+
+
+def link_tree(src, dst, mode=None):
+    # Materialize src at dst sharing file data with the store whenever the filesystem allows it.
+    # Once one strategy fails (e.g. EXDEV across filesystems) the cheaper ones are not retried per file.
+    mode = mode or os.environ.get("LOLLMSENV_BUNDLE_LINK", "auto")
+    if mode not in LINK_MODES:
+        raise LollmsEnvError(f"Unknown link mode '{mode}', expected one of {', '.join(LINK_MODES)}")
+    if os.path.exists(dst):
+        raise LollmsEnvError(f"{dst} already exists")
+    stats = {"reflink": 0, "hardlink": 0, "copy": 0}
+    for root, dirs, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        target_root = os.path.join(dst, rel) if rel != "." else dst
+        os.makedirs(target_root, exist_ok=True)
+        for name in dirs:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target_root, name))
+        for name in files:
+            path = os.path.join(root, name)
+            target = os.path.join(target_root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), target)
+            else:
+                mode = place_file(path, target, mode, stats)
+        shutil.copymode(root, target_root)
+    return stats
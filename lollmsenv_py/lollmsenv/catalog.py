@@ -0,0 +1,176 @@
+import json
+import os
+import platform
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from .exceptions import LollmsEnvError
+from .utils import FileLock, atomic_write_text
+
+RELEASES_URL = "https://api.github.com/repos/indygreg/python-build-standalone/releases"
+DEFAULT_TTL = 3600
+# After a failed refresh the cached index is used for this long (at most the TTL) before the network is tried again
+RETRY_AFTER = 300
+
+# cpython-3.11.9+20240415-x86_64-unknown-linux-gnu-install_only.tar.gz
+_ASSET_RE = re.compile(r"/(cpython-(\d+\.\d+\.\d+)\+(\d+)-(.+)-install_only\.tar\.gz)$")
+
+
+def platform_pattern():
+    # Same triples lollmsenv.sh get_platform_info() selects
+    system = sys.platform
+    machine = platform.machine().lower()
+    if system.startswith("linux"):
+        return re.compile(rf"^{re.escape(machine)}-.*linux-gnu$")
+    if system == "darwin":
+        return re.compile(r"^aarch64-apple-darwin$" if machine == "arm64" else r"^x86_64-apple-darwin$")
+    if system.startswith("win"):
+        return re.compile(r"^x86_64-pc-windows-msvc(-shared)?$")
+    raise LollmsEnvError(f"Unsupported operating system: {system}")
+
+
+def version_key(version):
+    return tuple(int(p) if p.isdigit() else 0 for p in str(version).split("."))
+
+
+def parse_releases(releases):
+    # Every build of every release, in the order lollmsenv.sh writes index.txt (sort -u -k1,1V -k3,3 -k2,2n)
+    entries = {}
+    for release in releases:
+        for asset in release.get("assets", []):
+            match = _ASSET_RE.search(asset.get("browser_download_url", ""))
+            if not match:
+                continue
+            name, version, build, triple = match.groups()
+            entries.setdefault((version, build, triple), {"version": version, "build": build, "triple": triple,
+                                                          "url": asset["browser_download_url"], "name": name})
+    return sorted(entries.values(), key=lambda e: (version_key(e["version"]), e["triple"], int(e["build"])))
+
+
+class ReleaseCatalog:
+    # Parsed python-build-standalone asset index shared with lollmsenv.sh.
+    # cache/releases/index.txt holds "version<TAB>build<TAB>triple<TAB>url" lines; its mtime is the fetch time.
+    # etag / last-modified hold the validators for conditional refreshes, and the mtime of "failed" the last
+    # refresh that fell back to the cached index.
+
+    def __init__(self, home, url=None, ttl=None, offline=None):
+        self.dir = Path(home) / "cache" / "releases"
+        self.index_path = self.dir / "index.txt"
+        self.url = url or os.environ.get("LOLLMSENV_RELEASES_URL", RELEASES_URL)
+        self.ttl = ttl if ttl is not None else int(os.environ.get("LOLLMSENV_CATALOG_TTL", DEFAULT_TTL))
+        self.offline = offline if offline is not None else bool(os.environ.get("LOLLMSENV_OFFLINE"))
+        self._entries = None
+        self._loaded_mtime = None
+
+    def _read_validator(self, name):
+        try:
+            return (self.dir / name).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_validator(self, name, value):
+        if value:
+            atomic_write_text(self.dir / name, value + "\n")
+        elif (self.dir / name).exists():
+            (self.dir / name).unlink()
+
+    def _age(self, name="index.txt"):
+        try:
+            return time.time() - (self.dir / name).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _fresh(self, age):
+        if age is None:
+            return False
+        if age < self.ttl:
+            return True
+        failed = self._age("failed")
+        return failed is not None and failed < min(self.ttl, RETRY_AFTER)
+
+    def _fetched(self):
+        # The index is current again: the next TTL expiry goes straight to the network
+        if (self.dir / "failed").exists():
+            (self.dir / "failed").unlink()
+
+    def _failed(self, reason):
+        if self._age() is None:
+            raise LollmsEnvError(f"Failed to fetch release catalog from {self.url}: {reason}")
+        (self.dir / "failed").touch()
+        return False
+
+    def refresh(self, force=False):
+        age = self._age()
+        if self.offline:
+            if age is None:
+                raise LollmsEnvError(f"Offline mode and no cached release catalog in {self.dir}")
+            return False
+        if not force and self._fresh(age):
+            return False
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.dir / "catalog.lock"):
+            # Another process may have refreshed (or failed to) while we waited
+            age = self._age()
+            if not force and self._fresh(age):
+                return False
+            separator = "&" if "?" in self.url else "?"
+            request = urllib.request.Request(f"{self.url}{separator}per_page=100", headers={"Accept": "application/vnd.github+json"})
+            if age is not None:
+                etag = self._read_validator("etag")
+                last_modified = self._read_validator("last-modified")
+                if etag:
+                    request.add_header("If-None-Match", etag)
+                if last_modified:
+                    request.add_header("If-Modified-Since", last_modified)
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    releases = json.load(response)
+                    headers = response.headers
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    os.utime(self.index_path)
+                    self._fetched()
+                    return False
+                return self._failed(f"HTTP {e.code}")
+            except (urllib.error.URLError, OSError) as e:
+                return self._failed(e)
+            lines = "".join(f"{e['version']}\t{e['build']}\t{e['triple']}\t{e['url']}\n" for e in parse_releases(releases))
+            atomic_write_text(self.index_path, lines)
+            self._write_validator("etag", headers.get("ETag"))
+            self._write_validator("last-modified", headers.get("Last-Modified"))
+            self._fetched()
+            self._entries = None
+            return True
+
+    def entries(self):
+        self.refresh()
+        mtime = self.index_path.stat().st_mtime_ns
+        if self._entries is None or mtime != self._loaded_mtime:
+            entries = []
+            with open(self.index_path) as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 4:
+                        entries.append(dict(zip(("version", "build", "triple", "url"), parts)))
+            self._entries = entries
+            self._loaded_mtime = mtime
+        return self._entries
+
+    def for_platform(self, pattern=None):
+        pattern = pattern or platform_pattern()
+        return [e for e in self.entries() if pattern.match(e["triple"])]
+
+    def versions(self, pattern=None):
+        return sorted({e["version"] for e in self.for_platform(pattern)}, key=version_key)
+
+    def find(self, version, pattern=None):
+        # "3.11" resolves to the newest 3.11.x, "3.11.9" to that exact release and a spec such as ">=3.10" or
+        # "~=3.11" to the newest release it allows, with the rules create_env and discover_pythons use
+        from .discovery import version_matches
+        candidates = [e for e in self.for_platform(pattern) if version_matches(e["version"], version)]
+        if not candidates:
+            raise LollmsEnvError(f"No compatible Python version found for {version}")
+        return max(candidates, key=lambda e: (version_key(e["version"]), int(e["build"])))
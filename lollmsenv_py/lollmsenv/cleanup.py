@@ -0,0 +1,250 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from .templates import STAMP
+from .usage import account, scan_trees
+
+# Directories younger than this may belong to an operation still in progress (a venv not registered yet)
+GRACE_SECONDS = 3600
+# Interrupted archive downloads are resumable, so they are only given up after a week
+PARTIAL_MAX_AGE = 7 * 86400
+_TEMP_NAME = re.compile(r"\.\d+\.tmp$")
+_PARTIAL_NAME = re.compile(r"^\..+\.partial-(\d+)(?:-[^-]+)?$")
+
+
+def last_used(path):
+    # Newest mtime of the tree root, plus the last run of its interpreter (atime: directory atimes move with
+    # every scan, including ours). Cheap, and needs no bookkeeping on every run.
+    times = []
+    for candidate in (path, os.path.join(path, "bin")):
+        try:
+            times.append(os.stat(candidate).st_mtime)
+        except OSError:
+            pass
+    for candidate in (os.path.join(path, "bin", "python3"), os.path.join(path, "python.exe")):
+        try:
+            st = os.stat(candidate)
+        except OSError:
+            continue
+        times += [st.st_mtime, st.st_atime]
+    return max(times, default=0)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _age(entry, now):
+    try:
+        return now - entry.stat(follow_symlinks=False).st_mtime
+    except OSError:
+        return 0
+
+
+def _children(path):
+    try:
+        with os.scandir(path) as it:
+            return [entry for entry in it]
+    except OSError:
+        return []
+
+
+class GarbageCollector:
+    # Accounting and reclaiming for the lollmsenv home. du() reports every interpreter, env, bundle, template and
+    # cache with hardlinks charged once (see usage.account); find() lists what nothing references any more:
+    # registry lines whose directory is gone, unregistered directories, orphaned bundles and templates, interrupted
+    # installs, temp files and cache entries of deleted envs. Registered interpreters no env uses are "optional"
+    # garbage, only reclaimed by an age (max_age) or size (max_bytes, least recently used first) policy.
+
+    def __init__(self, engine, workers=None, grace=GRACE_SECONDS):
+        self.engine = engine
+        self.workers = workers
+        self.grace = grace
+
+    def _env_paths(self):
+        return {name: os.path.realpath(env["path"]) for name, env in self.engine.envs().items()}
+
+    def _trees(self):
+        # Ordered so files the shared store hardlinks into bundles are charged to the store
+        engine = self.engine
+        env_paths = self._env_paths()
+        bundles = os.path.realpath(engine.bundles_dir) + os.sep
+        trees = {}
+        for version, prefix in engine.pythons().items():
+            trees[("python", version)] = str(prefix)
+        for entry in _children(engine.templates.dir):
+            if entry.is_dir(follow_symlinks=False):
+                trees[("template", entry.name)] = entry.path
+        for name, path in env_paths.items():
+            # Bundle envs are accounted for with their bundle
+            if not path.startswith(bundles):
+                trees[("env", name)] = path
+        for entry in _children(engine.bundles_dir):
+            if entry.is_dir(follow_symlinks=False) and not entry.name.startswith("."):
+                trees[("bundle", entry.name)] = entry.path
+        for entry in _children(engine.home / "cache"):
+            if entry.is_dir(follow_symlinks=False):
+                trees[("cache", entry.name)] = entry.path
+        known = {os.path.realpath(p) for p in trees.values()}
+        for root, kind in ((engine.python_dir, "python"), (engine.envs_dir, "env")):
+            for entry in _children(root):
+                # Dot entries are staging directories of installs in progress (see "partial" below)
+                if entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".") and \
+                        os.path.realpath(entry.path) not in known:
+                    trees[(f"unregistered-{kind}", entry.name)] = entry.path
+        return trees
+
+    def du(self):
+        # -> [{"kind", "name", "path", "files", "apparent_bytes", "real_bytes", "exclusive_bytes", "last_used"}]
+        trees = self._trees()
+        report = account(scan_trees(trees, self.workers))
+        return [dict(report[key], kind=key[0], name=key[1], path=path, last_used=last_used(path))
+                for key, path in trees.items()]
+
+    def find(self, usage=None):
+        engine = self.engine
+        now = time.time()
+        usage = usage if usage is not None else self.du()
+        size = {row["path"]: row["exclusive_bytes"] for row in usage}
+        env_paths = self._env_paths()
+        items = []
+
+        def add(kind, path, reason, optional=False, name=None):
+            path = str(path)
+            items.append({"kind": kind, "name": name or os.path.basename(path), "path": path, "reason": reason,
+                          "bytes": size.get(path, 0), "last_used": last_used(path), "optional": optional})
+
+        def settled(path):
+            return now - last_used(str(path)) > self.grace
+
+        # Registry lines whose directory is gone
+        for name, env in engine.envs().items():
+            if not os.path.isdir(env["path"]):
+                add("dangling-env", env["path"], "registered environment directory is missing", name=name)
+        pythons = engine.pythons()
+        for version, prefix in pythons.items():
+            if not os.path.isdir(prefix):
+                add("dangling-python", prefix, "registered interpreter directory is missing", name=version)
+        # Directories nothing refers to
+        for row in usage:
+            if row["kind"].startswith("unregistered-") and settled(row["path"]):
+                add(f"orphan-{row['kind'][len('unregistered-'):]}", row["path"], "not in the registry")
+        for entry in _children(engine.bundles_dir):
+            prefix = os.path.realpath(entry.path) + os.sep
+            if entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".") and settled(entry.path) and \
+                    not any(path.startswith(prefix) for path in env_paths.values()):
+                add("orphan-bundle", entry.path, "no registered environment lives in it")
+        for entry in _children(engine.templates.dir):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                interpreter = (Path(entry.path) / STAMP).read_text().strip()
+            except OSError:
+                interpreter = None
+            if interpreter is None and settled(entry.path):
+                add("orphan-template", entry.path, "interrupted template build")
+            elif interpreter is not None and not os.path.exists(interpreter):
+                add("orphan-template", entry.path, f"interpreter {interpreter} no longer exists")
+        # Interrupted installs and downloads, temp files
+        for entry in _children(engine.python_dir) + _children(engine.bundles_dir):
+            match = _PARTIAL_NAME.match(entry.name)
+            if match and (not _pid_alive(int(match.group(1))) or settled(entry.path)):
+                add("partial", entry.path, "interrupted install, bundle export or import")
+        for entry in _children(engine.home / "cache"):
+            if entry.name.startswith(".wheels-") and settled(entry.path):
+                add("partial", entry.path, "interrupted wheelhouse fill")
+        for entry in _children(engine.archives.partial_dir):
+            if _age(entry, now) > PARTIAL_MAX_AGE:
+                add("partial", entry.path, "download abandoned for more than a week")
+        temp_dirs = [engine.home, engine.python_dir, engine.envs_dir, engine.home / "cache"]
+        temp_dirs += [entry.path for entry in _children(engine.home / "cache") if entry.is_dir()]
+        for directory in temp_dirs:
+            for entry in _children(directory):
+                if _TEMP_NAME.search(entry.name) and _age(entry, now) > self.grace:
+                    add("temp", entry.path, "leftover temporary file")
+        for entry in _children(tempfile.gettempdir()):
+            if entry.name.startswith("lollmsenv-sync-") and _age(entry, now) > self.grace:
+                add("temp", entry.path, "leftover sync requirements file")
+        # Caches of environments that no longer exist
+        for entry in _children(engine.packages.dir):
+            try:
+                with open(entry.path) as f:
+                    env_path = json.load(f).get("env")
+            except (OSError, ValueError):
+                env_path = None
+            if not env_path or not os.path.isdir(env_path):
+                add("stale-cache", entry.path, "package inventory of a deleted environment")
+        envs = engine.envs()
+        for entry in _children(engine.home / "cache" / "activation"):
+            if entry.name not in envs:
+                add("stale-cache", entry.path, "activation record of a deleted environment")
+        # Registered interpreters no environment uses
+        used = set()
+        for env in envs.values():
+            if os.path.isabs(env["python"]):
+                used.add(os.path.realpath(env["python"]))
+            else:
+                _, prefix = engine.resolve_python(env["python"])
+                if prefix is not None:
+                    used.add(os.path.realpath(prefix))
+        for version, prefix in pythons.items():
+            if os.path.isdir(prefix) and os.path.realpath(prefix) not in used:
+                add("unused-python", prefix, "no environment uses it", optional=True, name=version)
+        return items
+
+    def plan(self, max_age=None, max_bytes=None, usage=None):
+        # Non-optional garbage always; unused interpreters older than max_age seconds, then least recently used
+        # ones until the home's real usage fits in max_bytes
+        usage = usage if usage is not None else self.du()
+        items = self.find(usage)
+        chosen = [item for item in items if not item["optional"]]
+        optional = sorted((item for item in items if item["optional"]), key=lambda item: item["last_used"])
+        now = time.time()
+        if max_age is not None:
+            chosen += [item for item in optional if now - item["last_used"] > max_age]
+        if max_bytes is not None:
+            total = sum(row["real_bytes"] for row in usage) - sum(item["bytes"] for item in chosen)
+            for item in optional:
+                if total <= max_bytes:
+                    break
+                if item not in chosen:
+                    chosen.append(item)
+                    total -= item["bytes"]
+        return chosen
+
+    def remove(self, item):
+        engine = self.engine
+        kind = item["kind"]
+        if kind == "dangling-env":
+            engine.packages.invalidate(item["path"])
+            engine.activations.invalidate(item["name"])
+            engine.unregister_env(item["name"])
+        elif kind == "dangling-python":
+            engine.unregister_python(item["name"])
+        elif kind == "unused-python":
+            engine.delete_python(item["name"])
+        elif os.path.isdir(item["path"]) and not os.path.islink(item["path"]):
+            shutil.rmtree(item["path"], ignore_errors=True)
+        else:
+            try:
+                os.unlink(item["path"])
+            except FileNotFoundError:
+                pass
+
+    def collect(self, dry_run=False, max_age=None, max_bytes=None):
+        # -> the items removed (or that would be, with dry_run)
+        items = self.plan(max_age, max_bytes)
+        if not dry_run:
+            for item in items:
+                self.remove(item)
+        return items
@@ -0,0 +1,214 @@
+import sys
+
+# `python -m lollmsenv <command> [args...]`: the commands and arguments of lollmsenv.sh, run by the Python package.
+# Nothing beyond this file is imported before a command is chosen, and each command only imports what it uses:
+# list-envs and list-pythons read the registry without loading the engine.
+
+
+def _api():
+    from .core import LollmsEnv
+    return LollmsEnv()
+
+
+def _registry():
+    from .registry import Registry
+    from .utils import home_dir
+    return Registry(home_dir())
+
+
+def _print(value):
+    if isinstance(value, str):
+        sys.stdout.write(value if value.endswith("\n") or not value else value + "\n")
+    elif value is not None:
+        import json
+        sys.stdout.write(json.dumps(value, indent=2, default=str) + "\n")
+
+
+def list_pythons():
+    from .registry import format_pythons
+    _print(format_pythons(_registry().pythons()))
+
+
+def list_envs():
+    from .registry import format_envs
+    _print(format_envs(_registry().envs()))
+
+
+def install_python(version, custom_dir=None):
+    _print(_api().install_python(version, custom_dir))
+
+
+def create_env(name, python_version, custom_dir=None):
+    _print(_api().create_env(name, python_version, custom_dir))
+
+
+def install(package, env_name=None):
+    _print(_api().install_package(package, env_name))
+
+
+def sync_env(env_name, lockfile):
+    _print(_api().sync_env(env_name, lockfile))
+
+
+def prefetch(requirements_file, python_version=None):
+    _print(_api().prefetch(requirements_file, python_version))
+
+
+def list_available_pythons():
+    _print(_api().list_available_pythons())
+
+
+def list_packages(env_name):
+    _print("".join(f"{p['name']}=={p['version']}\n" for p in _api().list_packages(env_name)))
+
+
+def find_python(version):
+    found = _api().discover_pythons(version)
+    if not found:
+        raise _error(f"No Python {version} found on this machine")
+    _print(found[0]["path"])
+
+
+def create_bundle(name, python_version, env_name):
+    _print(_api().create_bundle(name, python_version, env_name))
+
+
+def export_bundle(name, output):
+    _print(_api().export_bundle(name, output))
+
+
+def import_bundle(archive, name=None):
+    _print(_api().import_bundle(archive, name))
+
+
+def disk_usage():
+    _print(_api().disk_usage())
+
+
+def du():
+    _print(_api().du())
+
+
+def gc(*options):
+    dry_run, max_age = False, None
+    options = list(options)
+    while options:
+        option = options.pop(0)
+        if option == "--dry-run":
+            dry_run = True
+        elif option == "--max-age" and options:
+            max_age = float(options.pop(0)) * 86400
+        else:
+            raise _usage("gc")
+    for item in _api().gc(dry_run, max_age):
+        _print(f"{item['kind']}: {item['path']} ({item['reason']})")
+
+
+def delete_env(name):
+    _print(_api().delete_env(name))
+
+
+def delete_python(version):
+    _print(_api().delete_python(version))
+
+
+def metrics():
+    _print(_api().metrics())
+
+
+def run(name, *command):
+    # lollmsenv run <env> -- <program> [args...]; exits with the program's status
+    if command[:1] == ("--",):
+        command = command[1:]
+    if not command:
+        raise _usage("run")
+    from .engine import Engine
+    return Engine().run_in_env(name, list(command)).returncode
+
+
+def serve(*options):
+    from .daemon import main
+    return main(list(options))
+
+
+# name -> (function, arguments, description), in the order of lollmsenv.sh --help
+COMMANDS = {
+    "install-python": (install_python, "[version] [custom_dir]", "Install a specific Python version"),
+    "create-env": (create_env, "[name] [python-version] [custom_dir]", "Create a new virtual environment"),
+    "run": (run, "[name] -- [command]", "Run a command inside an environment without activating it"),
+    "install": (install, "[package] [env-name]", "Install a package in an environment"),
+    "sync-env": (sync_env, "[name] [lockfile]", "Install, upgrade or remove only what differs from a lockfile"),
+    "prefetch": (prefetch, "[requirements] [python-version]", "Fill the shared wheelhouse from a requirements file"),
+    "list-pythons": (list_pythons, "", "List installed Python versions"),
+    "list-envs": (list_envs, "", "List installed virtual environments"),
+    "list-packages": (list_packages, "[name]", "List the distributions installed in an environment"),
+    "list-available-pythons": (list_available_pythons, "", "List available Python versions for installation"),
+    "find-python": (find_python, "[version]", "Show the interpreter already on this machine create-env would use"),
+    "create-bundle": (create_bundle, "[name] [python-version] [env-name]", "Create a bundle with Python and environment"),
+    "export-bundle": (export_bundle, "[name] [archive]", "Pack a bundle into a portable, deduplicated archive"),
+    "import-bundle": (import_bundle, "[archive] [name]", "Unpack a bundle archive and register its environments"),
+    "disk-usage": (disk_usage, "", "Show apparent vs real disk usage of pythons, bundles and envs"),
+    "du": (du, "", "Show real disk usage per interpreter, env, bundle and cache"),
+    "gc": (gc, "[--dry-run] [--max-age days]", "Remove orphaned directories, stale registry lines and leftovers"),
+    "delete-env": (delete_env, "[name]", "Delete a virtual environment"),
+    "delete-python": (delete_python, "[version]", "Delete a Python installation"),
+    "metrics": (metrics, "", "Print operation and phase timings from the event log (Prometheus format)"),
+    "serve": (serve, "[--socket path]", "Run the daemon the Python package and UI call instead of starting cold"),
+}
+
+
+class _Exit(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _error(message):
+    return _Exit(f"Error: {message}", 1)
+
+
+def _usage(name):
+    return _Exit(f"Usage: lollmsenv {name} {COMMANDS[name][1]}".rstrip(), 2)
+
+
+def usage():
+    lines = ["Usage: python -m lollmsenv [command] [options]", "", "Commands:"]
+    for name, (_, arguments, description) in COMMANDS.items():
+        lines.append(f"  {f'{name} {arguments}'.rstrip():<50} {description}")
+    lines.append(f"  {'--help, -h':<50} Show this help message")
+    return "\n".join(lines) + "\n"
+
+
+def _arity(fn):
+    # (fewest, most) positional arguments a command takes; most is None for *args (CO_VARARGS)
+    code = fn.__code__
+    if code.co_flags & 0x04:
+        return code.co_argcount - len(fn.__defaults__ or ()), None
+    return code.co_argcount - len(fn.__defaults__ or ()), code.co_argcount
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("--help", "-h"):
+        sys.stdout.write(usage())
+        return 0 if argv else 2
+    name, args = argv[0], argv[1:]
+    try:
+        if name not in COMMANDS:
+            raise _Exit("Unknown command. Use --help or -h for usage information.", 2)
+        fn = COMMANDS[name][0]
+        least, most = _arity(fn)
+        if len(args) < least or (most is not None and len(args) > most):
+            raise _usage(name)
+        try:
+            return fn(*args) or 0
+        except Exception as e:
+            from .exceptions import LollmsEnvError
+            if isinstance(e, LollmsEnvError):
+                raise _error(e)
+            raise
+    except _Exit as e:
+        sys.stderr.write(f"{e}\n")
+        return e.status
+    except KeyboardInterrupt:
+        return 130
@@ -0,0 +1,129 @@
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+from .batch import ItemResult
+from .exceptions import CommandError, LollmsEnvError
+from .telemetry import Result
+
+# Wire format of `lollmsenv serve` (daemon.py): one JSON object per line each way, any number of calls per connection.
+#   -> {"method": "create_env", "args": [...], "kwargs": {...}}
+#   <- {"result": ...} or {"error": {"type": "LollmsEnvError", "message": "..."}}
+# Result and ItemResult values travel as {"$result": to_dict()} / {"$item": to_dict()} and are rebuilt on arrival.
+SOCKET_NAME = "lollmsenv.sock"
+
+
+def socket_path(home):
+    return Path(os.environ.get("LOLLMSENV_SOCKET") or Path(home) / "run" / SOCKET_NAME)
+
+
+def encode(value):
+    if isinstance(value, Result):
+        return {"$result": value.to_dict()}
+    if isinstance(value, ItemResult):
+        return {"$item": value.to_dict()}
+    if isinstance(value, dict):
+        return {str(k): encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    if isinstance(value, Path):
+        return str(value)
+    return value
+
+
+def decode(obj):
+    if "$result" in obj:
+        r = obj["$result"]
+        return Result(r["text"], r["value"], r["duration"], r["phases"], r["status"])
+    if "$item" in obj:
+        return ItemResult(**obj["$item"])
+    return obj
+
+
+def dumps(message):
+    return (json.dumps(message, separators=(",", ":"), default=str) + "\n").encode()
+
+
+def error_payload(e):
+    error = {"type": type(e).__name__, "message": str(e)}
+    if isinstance(e, CommandError):
+        error.update(cmd=str(e.cmd), returncode=e.returncode, stdout=e.stdout, stderr=e.stderr, duration=e.duration)
+    return error
+
+
+def raise_error(error):
+    if error.get("type") == "CommandError":
+        raise CommandError(error["cmd"], error["returncode"], error["stdout"], error["stderr"], error["duration"],
+                           error["message"])
+    raise LollmsEnvError(error.get("message", "lollmsenv daemon call failed"))
+
+
+class DaemonUnavailable(LollmsEnvError):
+    # Nothing accepted the connection: the call was never sent, so the caller may run it in-process instead
+    pass
+
+
+class DaemonClient:
+    # One connection per thread to a running `lollmsenv serve`, kept open between calls
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"lollmsenv daemon is not running on {self.path}: {e}")
+        self._local.conn = (sock, sock.makefile("rb"))
+        return self._local.conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def call(self, method, *args, **kwargs):
+        request = dumps({"method": method, "args": encode(list(args)), "kwargs": encode(kwargs)})
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            try:
+                conn[0].sendall(request)
+            except OSError:
+                # The daemon restarted since this connection was opened; the request did not reach it
+                self.close()
+                conn = None
+        if conn is None:
+            conn = self._connect()
+            try:
+                conn[0].sendall(request)
+            except OSError as e:
+                self.close()
+                raise DaemonUnavailable(f"lollmsenv daemon refused the request: {e}")
+        try:
+            line = conn[1].readline()
+        except OSError:
+            line = b""
+        if not line:
+            self.close()
+            raise LollmsEnvError(f"lollmsenv daemon closed the connection during {method}")
+        response = json.loads(line, object_hook=decode)
+        if "error" in response:
+            raise_error(response["error"])
+        return response.get("result")
+
+    def ping(self):
+        return self.call("ping")
+
+
+def connect(home):
+    # A client when a daemon socket exists for this home (LOLLMSENV_DAEMON=0 opts out), otherwise None
+    if os.environ.get("LOLLMSENV_DAEMON") == "0":
+        return None
+    path = socket_path(home)
+    return DaemonClient(path) if path.exists() else None
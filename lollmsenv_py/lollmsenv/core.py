@@ -1,53 +1,168 @@
-import subprocess
+import functools
 import os
+import shutil
 from .exceptions import LollmsEnvError
-from .utils import run_command
+from .utils import IS_WINDOWS, run_command
+from .engine import Engine
+from .batch import BatchRunner
+from .discovery import version_matches
+from .registry import format_envs, format_pythons
+from .telemetry import Result
+from .client import DaemonUnavailable, connect
+def _remote(*paths, name=None):
+    # Sent to `lollmsenv serve` when one runs for this home, run in-process otherwise (or once it is gone); the
+    # named path arguments are made absolute first since the daemon has its own working directory
+    def wrap(method):
+        remote_name = name or method.__name__
+        # Positions of the path arguments, read off the code object (inspect costs more to import than the calls)
+        positions = {arg: method.__code__.co_varnames.index(arg) - 1 for arg in paths}
+        @functools.wraps(method)
+        def call(self, *args, **kwargs):
+            if self.daemon is not None:
+                args = list(args)
+                for arg, i in positions.items():
+                    if i < len(args) and args[i] is not None:
+                        args[i] = os.path.abspath(args[i])
+                    elif kwargs.get(arg) is not None:
+                        kwargs[arg] = os.path.abspath(kwargs[arg])
+                try:
+                    return self.daemon.call(remote_name, *args, **kwargs)
+                except DaemonUnavailable:
+                    self.daemon = None
+            return method(self, *args, **kwargs)
+        return call
+    return wrap
+@functools.lru_cache(maxsize=None)
+def _find_lollmsenv(home):
+    # Prefer the script installed next to the registries, then whatever is on PATH
+    name = "lollmsenv.bat" if IS_WINDOWS else "lollmsenv"
+    candidate = os.path.join(home, "bin", name)
+    if os.path.exists(candidate):
+        return candidate
+    return shutil.which(name) or candidate
 class LollmsEnv:
-    def __init__(self):
-        self.lollmsenv_path = self._find_lollmsenv()
-    def _find_lollmsenv(self):
-        # Logic to find lollmsenv.bat
-        # This could be in the PATH or in a specific directory
-        pass
+    def __init__(self, home=None, daemon=None):
+        # daemon: None finds a running `lollmsenv serve` for the home, False always works in-process
+        self.engine = Engine(home)
+        self.daemon = connect(self.engine.home) if daemon is None else (daemon or None)
+        self._saved_environ = None
+    @property
+    def lollmsenv_path(self):
+        # Only the calls that still go through the shell script need it: looked up on first use, once per home
+        return _find_lollmsenv(str(self.engine.home))
+    def _traced(self, text, fn, *args):
+        # The usual text as a Result carrying the engine span's duration and phases; text=None means str(value)
+        with self.engine.telemetry.capture() as spans:
+            value = fn(*args)
+        return Result.of(spans[-1] if spans else None, str(value) if text is None else text, value)
+    @_remote("custom_dir")
     def install_python(self, version, custom_dir=None):
-        cmd = [self.lollmsenv_path, "install-python", version]
-        if custom_dir:
-            cmd.append(custom_dir)
-        return run_command(cmd)
+        return self._traced(None, self.engine.install_python, version, custom_dir)
+    @_remote("custom_dir")
     def create_env(self, name, python_version, custom_dir=None):
-        cmd = [self.lollmsenv_path, "create-env", name, python_version]
-        if custom_dir:
-            cmd.append(custom_dir)
-        return run_command(cmd)
+        return self._traced(None, self.engine.create_env, name, python_version, custom_dir)
+    @_remote()
+    def create_envs(self, specs, max_workers=None):
+        # [(name, python_version[, custom_dir]), ...] -> one ItemResult per env, missing interpreters installed once
+        return BatchRunner(self.engine, max_workers).create_envs(specs)
+    @_remote()
+    def install_packages(self, env_name, packages):
+        # Single pip resolve for the whole list; per-package results (retried one by one if the batch fails)
+        return BatchRunner(self.engine).install_packages(env_name, packages)
     def activate_env(self, name):
-        cmd = [self.lollmsenv_path, "activate", name]
-        result = run_command(cmd)
-        # Parse the output to get the activation command
-        # and execute it in the current Python process
-        pass
+        # Applied to os.environ in-process, from the cached activation (no shell round-trip)
+        activation = self.engine.activations.get(name)
+        if self._saved_environ is None:
+            self._saved_environ = {key: os.environ.get(key) for key in ("PATH", "VIRTUAL_ENV", "PYTHONHOME")}
+        # Built from the pre-activation values so switching envs does not stack PATH entries
+        base = {key: value for key, value in self._saved_environ.items() if value is not None}
+        environ = activation.environ(base)
+        os.environ.pop("PYTHONHOME", None)
+        os.environ["PATH"] = environ["PATH"]
+        os.environ["VIRTUAL_ENV"] = environ["VIRTUAL_ENV"]
+        return f"Environment '{name}' activated"
     def deactivate_env(self):
-        cmd = [self.lollmsenv_path, "deactivate"]
-        result = run_command(cmd)
-        # Parse the output and execute the deactivation command
-        pass
-    def install_package(self, package):
+        if self._saved_environ is None:
+            return "No environment is active"
+        for key, value in self._saved_environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self._saved_environ = None
+        return "Environment deactivated"
+    def run_in_env(self, env_name, command, **kwargs):
+        # [program, args...] run with the env's interpreter, PATH and VIRTUAL_ENV; kwargs go to subprocess.run
+        return self.engine.run_in_env(env_name, command, **kwargs)
+    def install_package(self, package, env_name=None):
+        if env_name:
+            return self._install_package(package, env_name)
         cmd = [self.lollmsenv_path, "install", package]
         return run_command(cmd)
+    @_remote(name="install_package")
+    def _install_package(self, package, env_name):
+        return self._traced(None, self.engine.install_package, env_name, package)
+    @_remote()
     def list_pythons(self):
-        cmd = [self.lollmsenv_path, "list-pythons"]
-        return run_command(cmd)
+        # Same text the shell front-end prints, read in-process
+        return format_pythons(self.engine.pythons())
+    @_remote()
     def list_envs(self):
-        cmd = [self.lollmsenv_path, "list-envs"]
-        return run_command(cmd)
+        return format_envs(self.engine.envs())
+    @_remote()
+    def list_packages(self, env_name):
+        # [{"name": ..., "version": ...}] from the env's dist-info metadata, cached until site-packages changes
+        return self.engine.list_packages(env_name)
+    @_remote("lockfile")
+    def sync_env(self, env_name, lockfile, remove=True, dry_run=False):
+        # {"install": [...], "upgrade": [...], "remove": [...], "unchanged": n}; pip only runs when something differs
+        return self.engine.sync_env(env_name, lockfile, remove, dry_run)
+    @_remote("requirements_file")
+    def prefetch(self, requirements_file, python_version=None):
+        # Fill the shared wheelhouse (cache/wheels/) so later installs need no network
+        return self.engine.prefetch(requirements_file, python_version)
+    @_remote()
+    def discover_pythons(self, spec=None):
+        # Interpreters outside lollmsenv (PATH, pyenv, asdf, conda, LOLLMSENV_PYTHON_ROOTS), newest first;
+        # create_env falls back to these before reporting a version as missing
+        found = self.engine.interpreters.scan()
+        return [e for e in found if spec is None or version_matches(e["version"], spec)]
+    @_remote()
     def list_available_pythons(self):
-        cmd = [self.lollmsenv_path, "list-available-pythons"]
-        return run_command(cmd)
-    def create_bundle(self, name, python_version, env_name):
-        cmd = [self.lollmsenv_path, "create-bundle", name, python_version, env_name]
-        return run_command(cmd)
+        # Served from the shared release catalog cache, refreshed with a conditional GET once the TTL expires
+        return "".join(f"{version}\n" for version in self.engine.catalog.versions())
+    @_remote()
+    def create_bundle(self, name, python_version, env_name, link_mode=None):
+        return self._traced(None, self.engine.create_bundle, name, python_version, env_name, link_mode)
+    @_remote("output")
+    def export_bundle(self, name, output, compression=None, level=None):
+        # Portable archive of bundles/<name>: zstd (with the zstandard package) or gzip tar, deduplicated by content
+        return self.engine.export_bundle(name, output, compression, level)
+    @_remote("archive")
+    def import_bundle(self, archive, name=None):
+        return self._traced(None, self.engine.import_bundle, archive, name)
+    @_remote()
+    def disk_usage(self):
+        # Apparent vs real (hardlinks counted once) usage of pythons/, bundles/ and envs/
+        return self.engine.disk_usage()
+    @_remote()
+    def du(self):
+        # Per interpreter, template, env, bundle and cache: real_bytes charges a hardlinked file to the first tree
+        # seen (stores first), exclusive_bytes is what deleting that tree would free
+        return self.engine.du()
+    @_remote()
+    def gc(self, dry_run=False, max_age=None, max_bytes=None):
+        # Removes orphans, dangling registry lines and leftovers; unused interpreters only past max_age seconds
+        # or, least recently used first, while the home exceeds max_bytes. Returns the items removed.
+        return self.engine.gc(dry_run, max_age, max_bytes)
+    @_remote()
+    def metrics(self):
+        # Prometheus text format: span durations (histograms) and counts per operation and phase, aggregated over
+        # the event log (logs/events.jsonl) so shell runs are included
+        return self.engine.telemetry.render_metrics()
+    @_remote()
     def delete_env(self, name):
-        cmd = [self.lollmsenv_path, "delete-env", name]
-        return run_command(cmd)
+        return self._traced(f"Environment '{name}' deleted successfully", self.engine.delete_env, name)
+    @_remote()
     def delete_python(self, version):
-        cmd = [self.lollmsenv_path, "delete-python", version]
-        return run_command(cmd)
\ No newline at end of file
+        return self._traced(f"Python {version} deleted successfully", self.engine.delete_python, version)
@@ -0,0 +1,209 @@
+import argparse
+import inspect
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from . import __version__
+from .batch import BatchRunner
+from .client import DaemonClient, DaemonUnavailable, decode, dumps, encode, error_payload, socket_path
+from .core import LollmsEnv
+from .exceptions import LollmsEnvError
+
+# Calls answered concurrently, without any lock
+READS = ("list_pythons", "list_envs", "list_packages", "discover_pythons", "list_available_pythons", "disk_usage",
+         "du", "metrics")
+# Mutations -> the resources they hold exclusively (KeyedLimiter keys, shared with BatchRunner); None takes the whole
+# home. create_envs and install_packages go through a BatchRunner on the daemon's limiter, which holds its own keys.
+MUTATIONS = {
+    "install_python": lambda a: [f"python:{a['version']}"],
+    "delete_python": lambda a: [f"python:{a['version']}"],
+    "create_env": lambda a: [f"env:{a['name']}"],
+    "delete_env": lambda a: [f"env:{a['name']}"],
+    "install_package": lambda a: [f"env:{a['env_name']}"],
+    "sync_env": lambda a: [f"env:{a['env_name']}"],
+    "create_envs": lambda a: [],
+    "install_packages": lambda a: [],
+    "prefetch": lambda a: [],
+    "create_bundle": lambda a: [f"bundle:{a['name']}", f"env:{a['env_name']}"],
+    "export_bundle": lambda a: [f"bundle:{a['name']}"],
+    "import_bundle": lambda a: None,
+    "gc": lambda a: None,
+}
+
+
+class _SharedLock:
+    # Any number of shared holders or a single exclusive one; a waiting exclusive holder is not starved by new
+    # shared ones
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._exclusive and not self._waiting)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting += 1
+            self._cond.wait_for(lambda: not self._exclusive and not self._shared)
+            self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+
+class Daemon:
+    # `lollmsenv serve`: one warm LollmsEnv (registry connections, package inventories, release catalog, interpreter
+    # index) shared by every client on the host through a Unix socket. Each connection gets a thread; reads run
+    # concurrently, mutations of the same env, interpreter or bundle are serialized, gc and import_bundle run alone.
+
+    def __init__(self, home=None, path=None, max_workers=None):
+        self.api = LollmsEnv(home, daemon=False)
+        self.path = Path(path) if path else socket_path(self.api.engine.home)
+        self.max_workers = max_workers
+        runner = BatchRunner(self.api.engine, max_workers)
+        self.limiter = runner.limiter
+        self.home_lock = _SharedLock()
+        self.started = time.time()
+        self.server = None
+
+    def _runner(self, max_workers=None):
+        # A BatchRunner per call (its run-once results must not outlive the call) on the daemon-wide limiter
+        runner = BatchRunner(self.api.engine, max_workers or self.max_workers)
+        runner.limiter = self.limiter
+        return runner
+
+    def create_envs(self, specs, max_workers=None):
+        return self._runner(max_workers).create_envs(specs)
+
+    def install_packages(self, env_name, packages):
+        return self._runner().install_packages(env_name, packages)
+
+    def ping(self):
+        return {"pid": os.getpid(), "version": __version__, "home": str(self.api.engine.home),
+                "uptime": time.time() - self.started}
+
+    @contextmanager
+    def _holding(self, keys):
+        if keys is None:
+            with self.home_lock.exclusive():
+                yield
+            return
+        # Sorted, so two calls needing the same pair of keys cannot deadlock
+        semaphores = [self.limiter.hold(key) for key in sorted(set(keys))]
+        with self.home_lock.shared():
+            for semaphore in semaphores:
+                semaphore.acquire()
+            try:
+                yield
+            finally:
+                for semaphore in reversed(semaphores):
+                    semaphore.release()
+
+    def dispatch(self, method, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        if method == "ping":
+            return self.ping()
+        if method in READS:
+            return getattr(self.api, method)(*args, **kwargs)
+        if method not in MUTATIONS:
+            raise LollmsEnvError(f"Unknown daemon method '{method}'")
+        bound = inspect.signature(getattr(LollmsEnv, method)).bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        with self._holding(MUTATIONS[method](bound.arguments)):
+            target = self if hasattr(Daemon, method) else self.api
+            return getattr(target, method)(*args, **kwargs)
+
+    def handle(self, line):
+        try:
+            request = json.loads(line, object_hook=decode)
+            result = self.dispatch(request["method"], request.get("args", ()), request.get("kwargs"))
+            return dumps({"result": encode(result)})
+        except Exception as e:
+            return dumps({"error": error_payload(e)})
+
+    def _bind(self):
+        if self.path.exists():
+            try:
+                DaemonClient(self.path).ping()
+            except DaemonUnavailable:
+                # Left behind by a daemon that did not shut down cleanly
+                self.path.unlink()
+            else:
+                raise LollmsEnvError(f"A lollmsenv daemon is already listening on {self.path}")
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    self.wfile.write(daemon.handle(line))
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.server = Server(str(self.path), Handler)
+        # Same-user clients only, like the rest of the home
+        os.chmod(self.path, 0o600)
+        return self.server
+
+    def serve_forever(self):
+        server = self._bind()
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lollmsenv serve", description="Serve a lollmsenv home on a Unix socket")
+    parser.add_argument("--home", help="lollmsenv home (default: $LOLLMSENV_DIR or ~/.lollmsenv)")
+    parser.add_argument("--socket", help="Socket path (default: $LOLLMSENV_SOCKET or <home>/run/lollmsenv.sock)")
+    parser.add_argument("--workers", type=int, help="Pool size of batch calls (create_envs, install_packages)")
+    args = parser.parse_args(argv)
+    if not hasattr(socket, "AF_UNIX"):
+        parser.error("lollmsenv serve needs Unix domain sockets")
+    daemon = Daemon(args.home, args.socket, args.workers)
+    # SIGTERM unwinds serve_forever like Ctrl-C, so the socket is removed either way
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"lollmsenv daemon {os.getpid()} serving {daemon.api.engine.home} on {daemon.path}", flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import glob
+import json
+import os
+import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .catalog import version_key
+from .utils import IS_WINDOWS, atomic_write_text
+
+# Printed by every candidate interpreter; anything that cannot run it (Python 2, broken installs) is cached as unusable
+_PROBE = ("import json, platform, sys, sysconfig\n"
+          "print(json.dumps({'version': '%d.%d.%d' % sys.version_info[:3], 'implementation': sys.implementation.name,"
+          " 'abi': sysconfig.get_config_var('SOABI') or sys.implementation.cache_tag, 'arch': platform.machine(),"
+          " 'executable': sys.executable, 'prefix': sys.base_prefix, 'venv': sys.prefix != sys.base_prefix}))")
+_PATH_NAME = re.compile(r"^python(3)?\.exe$" if IS_WINDOWS else r"^python3(\.\d+)?$")
+_CLAUSE = re.compile(r"^\s*(~=|===?|!=|<=|>=|<|>)?\s*(\d+(?:\.\d+)*)(\.\*)?\s*$")
+# Tie-break between equal versions: explicit roots first, the bare PATH last
+SOURCES = ("custom", "pyenv", "asdf", "conda", "path")
+
+
+def _compare(version, op, target, wildcard):
+    v, t = version_key(version), version_key(target)
+    if not op or wildcard:
+        # "3.11" and "==3.11.*" both mean any 3.11.x
+        matched = v[:len(t)] == t
+        return not matched if op == "!=" else matched and op in ("", "==", "===")
+    width = max(len(v), len(t))
+    v, t = v + (0,) * (width - len(v)), t + (0,) * (width - len(t))
+    if op == "~=":
+        # ~=3.10 is >=3.10 with the same 3.x
+        head = version_key(target)[:-1]
+        return v >= t and v[:len(head)] == head
+    return {"==": v == t, "===": v == t, "!=": v != t, "<": v < t, "<=": v <= t, ">": v > t, ">=": v >= t}[op]
+
+
+def version_matches(version, spec):
+    # spec: "3.11", "3.11.7", or comma-separated clauses such as ">=3.10,<3.12", "~=3.10", "!=3.11.2"
+    if not version:
+        return False
+    for clause in str(spec).split(","):
+        match = _CLAUSE.match(clause)
+        if match is None or not _compare(version, match.group(1) or "", match.group(2), match.group(3)):
+            return False
+    return True
+
+
+def _interpreter_in(prefix):
+    return os.path.join(prefix, "python.exe") if IS_WINDOWS else os.path.join(prefix, "bin", "python3")
+
+
+def _home_dir(variable, default):
+    return os.environ.get(variable) or os.path.join(os.path.expanduser("~"), default)
+
+
+def candidate_interpreters(roots=()):
+    # -> {real path: (source, path)} for every interpreter binary the known layouts put on this machine
+    prefixes = [("custom", p) for root in roots for p in [root] + sorted(glob.glob(os.path.join(root, "*")))]
+    pyenv = _home_dir("PYENV_ROOT", ".pyenv")
+    prefixes += [("pyenv", p) for p in sorted(glob.glob(os.path.join(pyenv, "pyenv-win" if IS_WINDOWS else "",
+                                                                     "versions", "*")))]
+    asdf = _home_dir("ASDF_DATA_DIR", ".asdf")
+    prefixes += [("asdf", p) for p in sorted(glob.glob(os.path.join(asdf, "installs", "python", "*")))]
+    conda_roots = [os.path.join(os.path.expanduser("~"), d) for d in ("anaconda3", "miniconda3", "miniforge3",
+                                                                         "mambaforge")]
+    conda_roots.append("/opt/conda")
+    if os.environ.get("CONDA_EXE"):
+        conda_roots.insert(0, str(Path(os.environ["CONDA_EXE"]).parent.parent))
+    for root in dict.fromkeys(conda_roots):
+        prefixes += [("conda", p) for p in [root] + sorted(glob.glob(os.path.join(root, "envs", "*")))]
+    paths = [(source, _interpreter_in(prefix)) for source, prefix in prefixes]
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        # pyenv/asdf shims are scripts that pick a version at run time; their targets are found above
+        if not directory or os.path.basename(directory.rstrip("/\\")) == "shims" or "WindowsApps" in directory:
+            continue
+        try:
+            with os.scandir(directory) as it:
+                paths += [("path", entry.path) for entry in it if _PATH_NAME.match(entry.name)]
+        except OSError:
+            continue
+    candidates = {}
+    for source, path in paths:
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            candidates.setdefault(os.path.realpath(path), (source, path))
+    return candidates
+
+
+def probe(path, timeout=15):
+    try:
+        result = subprocess.run([path, "-c", _PROBE], capture_output=True, text=True, timeout=timeout)
+        return json.loads(result.stdout) if result.returncode == 0 else None
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+
+class InterpreterIndex:
+    # Interpreters already on this machine (PATH, pyenv, asdf, conda, LOLLMSENV_PYTHON_ROOTS), so create_env can
+    # use them instead of downloading a build. Each binary is probed once; the result is kept in
+    # cache/interpreters.json keyed on its real path and reused while its mtime and inode are unchanged, so
+    # version-spec queries are answered from the index and only new or replaced binaries are run (in parallel).
+
+    def __init__(self, home, roots=None, max_workers=8):
+        self.path = Path(home) / "cache" / "interpreters.json"
+        if roots is None:
+            roots = [r for r in os.environ.get("LOLLMSENV_PYTHON_ROOTS", "").split(os.pathsep) if r]
+        self.roots = list(roots)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def scan(self):
+        # -> usable interpreters, newest version first
+        candidates = candidate_interpreters(self.roots)
+        with self._lock:
+            cached = self._load()
+            entries, stale = {}, []
+            for real, (source, path) in candidates.items():
+                try:
+                    st = os.stat(real)
+                except OSError:
+                    continue
+                stamp = [st.st_mtime_ns, st.st_ino]
+                previous = cached.get(real)
+                if previous is not None and previous["stamp"] == stamp:
+                    entries[real] = dict(previous, source=source, path=path)
+                else:
+                    stale.append((real, source, path, stamp))
+            if stale:
+                with ThreadPoolExecutor(min(self.max_workers, len(stale))) as pool:
+                    for (real, source, path, stamp), info in zip(stale, pool.map(probe, [s[0] for s in stale])):
+                        entries[real] = dict(info or {"version": None}, source=source, path=path, stamp=stamp)
+            if entries != cached:
+                try:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    atomic_write_text(self.path, json.dumps(entries, indent=1))
+                except OSError:
+                    pass
+        # Virtual envs (the user's or ours) are excluded: a new env should be based on the real interpreter
+        usable = [e for e in entries.values() if e.get("version") and not e.get("venv")]
+        usable.sort(key=lambda e: SOURCES.index(e["source"]))
+        usable.sort(key=lambda e: version_key(e["version"]), reverse=True)
+        return usable
+
+    def find(self, spec):
+        for entry in self.scan():
+            if version_matches(entry["version"], spec):
+                return entry
+        return None
+
+    def invalidate(self):
+        with self._lock:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
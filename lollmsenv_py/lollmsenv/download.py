@@ -0,0 +1,344 @@
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from .exceptions import LollmsEnvError
+
+DEFAULT_CONNECTIONS = 8
+MIN_CHUNK_SIZE = 4 * 1024 * 1024
+BLOCK_SIZE = 256 * 1024
+
+
+def print_progress(name):
+    # Aggregate progress on stderr, "<name>: 42% (12.3/29.1 MB)"; the UI job runner parses the percentage
+    last = [-1]
+    def report(done, total):
+        if not total:
+            return
+        percent = done * 100 // total
+        if percent != last[0]:
+            last[0] = percent
+            sys.stderr.write(f"\r{name}: {percent}% ({done / 1e6:.1f}/{total / 1e6:.1f} MB)")
+            if done >= total:
+                sys.stderr.write("\n")
+            sys.stderr.flush()
+    return report
+
+
+def probe(url, timeout=30):
+    # Follow redirects once and learn the final URL, size and whether byte ranges are honored
+    request = urllib.request.Request(url, headers={"Range": "bytes=0-0"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            final_url = response.geturl()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                return final_url, int(total) if total.isdigit() else None, True
+            length = response.headers.get("Content-Length")
+            return final_url, int(length) if length else None, False
+    except urllib.error.HTTPError as e:
+        raise LollmsEnvError(f"Failed to download {url}: HTTP {e.code}")
+    except (urllib.error.URLError, OSError) as e:
+        raise LollmsEnvError(f"Failed to download {url}: {e}")
+
+
+class _ConnectionPool:
+    # One keep-alive connection per worker thread to the (already redirected) host
+    def __init__(self, url, timeout):
+        self.parts = urllib.parse.urlsplit(url)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def path(self):
+        return self.parts.path + (f"?{self.parts.query}" if self.parts.query else "")
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.parts.scheme == "https" else http.client.HTTPConnection
+            conn = cls(self.parts.netloc, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+
+
+class Transfer:
+    # A running download. Workers report bytes per chunk; readers can follow the contiguous prefix
+    # written so far, which is what lets extraction run while later chunks are still in flight.
+
+    def __init__(self, dest, total, chunks, done):
+        self.dest = dest
+        self.total = total
+        self.chunks = chunks
+        self.done = done
+        self.cond = threading.Condition()
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self.thread = None
+
+    def _chunk_size(self, index):
+        start, end = self.chunks[index]
+        return end - start + 1
+
+    def contiguous(self):
+        # Bytes available from offset 0 without holes
+        available = 0
+        for index in range(len(self.chunks)):
+            got = self.done.get(index, 0)
+            available += got
+            if got < self._chunk_size(index):
+                break
+        return available
+
+    def update(self, index, nbytes):
+        with self.cond:
+            self.done[index] = nbytes
+            self.cond.notify_all()
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+        if self.cancelled:
+            raise LollmsEnvError(f"Download of {self.dest} was cancelled")
+        return self.dest
+
+    def reader(self):
+        return FollowReader(self)
+
+
+class FollowReader:
+    # Sequential file-like view of a Transfer; hashes everything it hands out
+    def __init__(self, transfer):
+        self.transfer = transfer
+        self.position = 0
+        self.digest = hashlib.sha256()
+        self._file = open(transfer.dest, "rb")
+
+    def read(self, size=-1):
+        transfer = self.transfer
+        with transfer.cond:
+            while True:
+                if transfer.error is not None:
+                    raise transfer.error
+                if transfer.cancelled:
+                    raise LollmsEnvError(f"Download of {transfer.dest} was cancelled")
+                available = transfer.contiguous() - self.position
+                if available > 0 or transfer.finished:
+                    break
+                transfer.cond.wait()
+        if size is None or size < 0 or size > available:
+            size = available
+        if size <= 0:
+            return b""
+        self._file.seek(self.position)
+        data = self._file.read(size)
+        self.position += len(data)
+        self.digest.update(data)
+        return data
+
+    def drain(self):
+        # Hash the trailer tar stops reading before (padding after the end-of-archive marker)
+        while self.read(BLOCK_SIZE):
+            pass
+        return self.digest.hexdigest()
+
+    def close(self):
+        self._file.close()
+
+
+class ChunkedDownloader:
+    # Parallel byte-range download over a small connection pool.
+    # Completed chunks are recorded in "<dest>.chunks" so an interrupted download resumes where it stopped;
+    # servers without Range support get a single stream.
+
+    def __init__(self, connections=None, chunk_size=None, retries=3, timeout=60):
+        self.connections = connections or int(os.environ.get("LOLLMSENV_DOWNLOAD_CONNECTIONS", DEFAULT_CONNECTIONS))
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+
+    def _plan(self, total):
+        size = self.chunk_size or max(MIN_CHUNK_SIZE, -(-total // (self.connections * 2)))
+        return [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+    def _state_path(self, dest):
+        return f"{dest}.chunks"
+
+    def _load_state(self, dest, total, chunks):
+        try:
+            with open(self._state_path(dest)) as f:
+                state = json.load(f)
+            if state.get("total") == total and state.get("chunks") == [list(c) for c in chunks]:
+                return {int(k): v for k, v in state.get("done", {}).items()}
+        except (FileNotFoundError, ValueError):
+            pass
+        return {}
+
+    def _save_state(self, transfer):
+        tmp = f"{self._state_path(transfer.dest)}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"total": transfer.total, "chunks": [list(c) for c in transfer.chunks], "done": transfer.done}, f)
+        os.replace(tmp, self._state_path(transfer.dest))
+
+    def _report(self, transfer, progress):
+        if progress:
+            progress(sum(transfer.done.values()), transfer.total)
+
+    def _fetch_chunk(self, pool, transfer, index, progress):
+        start, end = transfer.chunks[index]
+        position = start + transfer.done.get(index, 0)
+        attempt = 0
+        while position <= end:
+            if transfer.cancelled:
+                return
+            try:
+                conn = pool.get()
+                conn.request("GET", pool.path(), headers={"Range": f"bytes={position}-{end}"})
+                response = conn.getresponse()
+                if response.status != 206:
+                    response.read()
+                    raise LollmsEnvError(f"Server answered HTTP {response.status} to a range request")
+                with open(transfer.dest, "r+b") as f:
+                    f.seek(position)
+                    while not transfer.cancelled:
+                        block = response.read(min(BLOCK_SIZE, end - position + 1))
+                        if not block:
+                            break
+                        f.write(block)
+                        f.flush()
+                        position += len(block)
+                        transfer.update(index, position - start)
+                        self._report(transfer, progress)
+                if transfer.cancelled:
+                    pool.reset()
+                    return
+                if position <= end:
+                    raise LollmsEnvError(f"Connection closed with {end - position + 1} bytes left in chunk {index}")
+            except (OSError, http.client.HTTPException, LollmsEnvError) as e:
+                pool.reset()
+                attempt += 1
+                if attempt > self.retries:
+                    raise LollmsEnvError(f"Chunk {index} failed after {self.retries} retries: {e}")
+                time.sleep(min(2 ** attempt * 0.1, 2))
+        with transfer.cond:
+            self._save_state(transfer)
+
+    def _run_chunked(self, final_url, transfer, progress):
+        pool = _ConnectionPool(final_url, self.timeout)
+        try:
+            with ThreadPoolExecutor(max_workers=self.connections) as executor:
+                futures = [
+                    executor.submit(self._fetch_chunk, pool, transfer, index, progress)
+                    for index in range(len(transfer.chunks))
+                    if transfer.done.get(index, 0) < transfer._chunk_size(index)
+                ]
+                for future in futures:
+                    try:
+                        future.result()
+                    except LollmsEnvError:
+                        transfer.cancel()
+                        raise
+        finally:
+            pool.close()
+            with transfer.cond:
+                self._save_state(transfer)
+        if not transfer.cancelled:
+            os.remove(self._state_path(transfer.dest))
+
+    def _run_single(self, final_url, transfer, progress, ranges):
+        # Retried like _fetch_chunk. A retry resumes with a Range request when the server honors them; otherwise
+        # the file is fetched again from the start and the bytes already written (a reader may have them) skipped.
+        done = 0
+        attempt = 0
+        with open(transfer.dest, "r+b") as f:
+            while not transfer.cancelled:
+                try:
+                    headers = {"Range": f"bytes={done}-"} if ranges and done else {}
+                    request = urllib.request.Request(final_url, headers=headers)
+                    with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                        offset = done if response.status == 206 else 0
+                        while not transfer.cancelled:
+                            block = response.read(BLOCK_SIZE)
+                            if not block:
+                                break
+                            offset += len(block)
+                            if offset <= done:
+                                continue
+                            f.seek(done)
+                            f.write(block[len(block) - (offset - done):])
+                            f.flush()
+                            done = offset
+                            transfer.update(0, done)
+                            if progress:
+                                progress(done, transfer.total)
+                    if transfer.cancelled or not transfer.total or done >= transfer.total:
+                        return
+                    raise LollmsEnvError(f"Connection closed with {transfer.total - done} bytes left")
+                except (OSError, http.client.HTTPException, LollmsEnvError) as e:
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise LollmsEnvError(f"Failed to download {final_url} after {self.retries} retries: {e}")
+                    time.sleep(min(2 ** attempt * 0.1, 2))
+
+    def start(self, url, dest, progress=None):
+        final_url, total, ranges = probe(url, self.timeout)
+        if not ranges or not total or total < 2 * MIN_CHUNK_SIZE or self.connections < 2:
+            # Single chunk of unknown size: contiguous() is simply the bytes written
+            transfer = Transfer(dest, total, [(0, float("inf"))], {})
+            open(dest, "wb").close()
+            run = lambda final_url, transfer, progress: self._run_single(final_url, transfer, progress, ranges)
+        else:
+            chunks = self._plan(total)
+            done = self._load_state(dest, total, chunks) if os.path.exists(dest) else {}
+            if not done:
+                with open(dest, "wb") as f:
+                    f.truncate(total)
+            transfer = Transfer(dest, total, chunks, done)
+            run = self._run_chunked
+
+        def worker():
+            try:
+                run(final_url, transfer, progress)
+            except BaseException as e:
+                transfer.error = e if isinstance(e, LollmsEnvError) else LollmsEnvError(str(e))
+            finally:
+                with transfer.cond:
+                    transfer.finished = True
+                    transfer.cond.notify_all()
+
+        transfer.thread = threading.Thread(target=worker, daemon=True)
+        transfer.thread.start()
+        return transfer
+
+    def download(self, url, dest, progress=None):
+        return self.start(url, dest, progress).wait()
@@ -0,0 +1,373 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from .exceptions import LollmsEnvError
+from .utils import IS_WINDOWS, home_dir, run_command
+from .registry import Registry
+from .catalog import ReleaseCatalog, version_key
+from .archives import ArchiveCache, asset_name
+from .download import print_progress
+from .bundles import link_tree
+from .packing import pack, unpack
+from .usage import disk_usage
+from .templates import VenvTemplates
+from .packages import PackageInventory
+from .wheelhouse import Wheelhouse
+from .sync import read_lockfile, plan_sync, apply_sync
+from .activation import ActivationCache, venv_home
+from .discovery import InterpreterIndex, version_matches
+from .cleanup import GarbageCollector
+from .telemetry import Telemetry, phase, traced
+
+
+def default_home():
+    return Path(home_dir())
+
+
+class _TimedReader:
+    # Counts the time a streaming consumer spends blocked on the download rather than working
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.waited = 0.0
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        try:
+            return self.fileobj.read(size)
+        finally:
+            self.waited += time.perf_counter() - start
+
+
+class Engine:
+    def __init__(self, home=None):
+        self.home = Path(home) if home else default_home()
+        self.python_dir = self.home / "pythons"
+        self.envs_dir = self.home / "envs"
+        self.bundles_dir = self.home / "bundles"
+        self.registry = Registry(self.home)
+        self.catalog = ReleaseCatalog(self.home)
+        self.archives = ArchiveCache(self.home)
+        self.wheelhouse = Wheelhouse(self.home)
+        self.templates = VenvTemplates(self.home, wheelhouse=self.wheelhouse)
+        self.packages = PackageInventory(self.home)
+        self.activations = ActivationCache(self)
+        self.interpreters = InterpreterIndex(self.home)
+        self.garbage = GarbageCollector(self)
+        self.telemetry = Telemetry(self.home)
+
+    def ensure_dirs(self):
+        for directory in (self.python_dir, self.envs_dir, self.bundles_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    # Registries
+
+    def pythons(self):
+        return self.registry.pythons()
+
+    def envs(self):
+        return self.registry.envs()
+
+    def register_python(self, version, path):
+        self.registry.add_python(version, path)
+
+    def register_env(self, name, path, python_version):
+        self.registry.add_env(name, path, python_version)
+
+    def unregister_python(self, version):
+        return self.registry.remove_python(version)
+
+    def unregister_env(self, name):
+        return self.registry.remove_env(name)
+
+    # Interpreter resolution
+
+    @staticmethod
+    def interpreter_path(prefix):
+        prefix = Path(prefix)
+        if IS_WINDOWS:
+            return prefix / "python.exe"
+        return prefix / "bin" / "python3"
+
+    @staticmethod
+    def env_interpreter_path(env_path):
+        env_path = Path(env_path)
+        if IS_WINDOWS:
+            return env_path / "Scripts" / "python.exe"
+        return env_path / "bin" / "python"
+
+    def resolve_python(self, version):
+        prefix = self.registry.get_python(version)
+        if prefix is not None:
+            return version, prefix
+        pythons = self.pythons()
+        # "3.11" picks the newest registered 3.11.x, ">=3.10,<3.12" the newest in range
+        candidates = [v for v in pythons if version_matches(v, version)]
+        if not candidates:
+            return None, None
+        best = max(candidates, key=version_key)
+        return best, pythons[best]
+
+    def locate_python(self, version):
+        # -> (value for the env registry, interpreter): a managed install first, then one discovered on this machine
+        actual, prefix = self.resolve_python(version)
+        interpreter = self.interpreter_path(prefix) if prefix is not None else None
+        if interpreter is not None and interpreter.exists():
+            return actual, interpreter
+        found = self.interpreters.find(version)
+        if found is not None:
+            # Recorded by prefix, like bundle interpreters, so nothing under pythons/ claims (or deletes) it
+            return found["prefix"], Path(found["path"])
+        if interpreter is not None:
+            raise LollmsEnvError(f"Python {version} is registered but {interpreter} does not exist")
+        raise LollmsEnvError(f"Python {version} is not installed")
+
+    def resolve_interpreter(self, version):
+        return self.locate_python(version)[1]
+
+    # Operations
+
+    @staticmethod
+    def _extract(fileobj, target_dir):
+        # tar -xzf - -C TARGET --strip-components=1, reading the archive as a stream
+        reader = _TimedReader(fileobj)
+        with phase("extract") as span, tarfile.open(fileobj=reader, mode="r|gz") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extraction_filter = tarfile.data_filter
+            for member in tar:
+                parts = member.name.split("/", 1)
+                if len(parts) < 2 or not parts[1]:
+                    continue
+                member.name = parts[1]
+                if member.islnk():
+                    member.linkname = member.linkname.split("/", 1)[-1]
+                tar.extract(member, target_dir)
+            # Extraction overlaps the download: this part of the span was spent waiting for bytes
+            span.attrs["download_wait_seconds"] = round(reader.waited, 6)
+
+    @traced("install_python", "version")
+    def install_python(self, version, custom_dir=None):
+        with phase("catalog"):
+            entry = self.catalog.find(version)
+        actual = entry["version"]
+        target_dir = Path(custom_dir or self.python_dir) / actual
+        if self.interpreter_path(target_dir).exists():
+            return self._adopt_python(actual, target_dir)
+        # Extract into a staging directory while downloading, then move it into place. Unique per call (pid and a
+        # random suffix): threads of one process installing the same version must not share it.
+        target_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{actual}.partial-{os.getpid()}-", dir=target_dir.parent))
+        name = asset_name(entry["url"])
+        try:
+            with phase("download", url=entry["url"]):
+                self.archives.fetch_streaming(entry["url"], lambda f: self._extract(f, staging),
+                                              progress=print_progress(name))
+            if not self.interpreter_path(staging).exists():
+                raise LollmsEnvError("Python binary not found after extraction. Installation failed.")
+            try:
+                os.rename(staging, target_dir)
+            except OSError:
+                # Another thread or process installed the same version first
+                if not self.interpreter_path(target_dir).exists():
+                    raise LollmsEnvError(f"{target_dir} already exists but holds no Python installation")
+                shutil.rmtree(staging, ignore_errors=True)
+                return self._adopt_python(actual, target_dir)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        interpreter = self.interpreter_path(target_dir)
+        try:
+            with phase("ensurepip"):
+                run_command([str(interpreter), "-m", "ensurepip", "--upgrade"])
+            try:
+                self.wheelhouse.install(interpreter, ["--upgrade", "pip"])
+                self.wheelhouse.install(interpreter, ["virtualenv"])
+            except LollmsEnvError:
+                # Offline with a cold wheelhouse: the ensurepip-bundled pip is good enough
+                if not self.wheelhouse.offline:
+                    raise
+        except BaseException:
+            shutil.rmtree(target_dir, ignore_errors=True)
+            raise
+        self.register_python(actual, target_dir)
+        return target_dir
+
+    def _adopt_python(self, version, prefix):
+        # Already extracted (an install interrupted after the rename, a custom_dir install, a concurrent
+        # install): registered if it is not yet, so it is found and collected like any other
+        if self.registry.get_python(version) != str(prefix):
+            self.register_python(version, prefix)
+        return prefix
+
+    def _create_venv(self, interpreter, env_path):
+        if Path(env_path).exists():
+            raise LollmsEnvError(f"{env_path} already exists")
+        # Cloned from the interpreter's golden venv, built on first use
+        self.templates.create(interpreter, env_path)
+
+    @traced("create_env", "name", "python")
+    def create_env(self, name, python_version, custom_dir=None, interpreter=None):
+        if self.registry.get_env(name) is not None:
+            raise LollmsEnvError(f"Environment '{name}' already exists")
+        if interpreter is None:
+            with phase("resolve"):
+                python_version, interpreter = self.locate_python(python_version)
+        env_path = Path(custom_dir or self.envs_dir) / name
+        self._create_venv(interpreter, env_path)
+        self.register_env(name, env_path, python_version)
+        return env_path
+
+    @traced("create_bundle", "name", "python", "env")
+    def create_bundle(self, name, python_version, env_name, link_mode=None):
+        # The bundle's interpreter is linked from the shared store instead of being downloaded and extracted again
+        bundle_dir = self.bundles_dir / name
+        if bundle_dir.exists():
+            raise LollmsEnvError(f"Bundle '{name}' already exists")
+        if self.registry.get_env(env_name) is not None:
+            raise LollmsEnvError(f"Environment '{env_name}' already exists")
+        actual, prefix = self.resolve_python(python_version)
+        if prefix is None or not self.interpreter_path(prefix).exists():
+            prefix = self.install_python(python_version)
+            actual = prefix.name
+        bundle_python = bundle_dir / actual
+        self.bundles_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            # Claimed atomically: a bundle created meanwhile by another process is refused, never reused
+            bundle_dir.mkdir()
+        except FileExistsError:
+            raise LollmsEnvError(f"Bundle '{name}' already exists")
+        # From here on the directory is ours alone, so a failure removes it whole
+        try:
+            with phase("link") as span:
+                span.attrs.update(link_tree(prefix, bundle_python, link_mode))
+            self.create_env(env_name, actual, bundle_dir, interpreter=self.interpreter_path(bundle_python))
+        except BaseException:
+            shutil.rmtree(bundle_dir, ignore_errors=True)
+            raise
+        return bundle_dir
+
+    @traced("export_bundle", "name", "output")
+    def export_bundle(self, name, output, compression=None, level=None):
+        bundle_dir = self.bundles_dir / name
+        if not bundle_dir.is_dir():
+            raise LollmsEnvError(f"Bundle '{name}' not found")
+        root = os.path.abspath(bundle_dir)
+        envs, python = {}, None
+        for env_name, env in self.envs().items():
+            env_path = os.path.abspath(env["path"])
+            if env_path.startswith(root + os.sep):
+                envs[env_name] = os.path.relpath(env_path, root)
+                home = venv_home(env_path)
+                if home and os.path.abspath(home).startswith(root + os.sep):
+                    python = os.path.relpath(os.path.dirname(os.path.abspath(home)), root)
+        return pack(root, output, name, python, envs, compression, level)
+
+    @traced("import_bundle", "archive")
+    def import_bundle(self, archive, name=None):
+        # Unpacked under bundles/ with every embedded path pointing at the new location, envs registered against
+        # the bundle's own interpreter
+        self.ensure_dirs()
+        def validate(manifest):
+            for env_name in manifest["envs"]:
+                if self.registry.get_env(env_name) is not None:
+                    raise LollmsEnvError(f"Environment '{env_name}' already exists")
+
+        bundle_dir, manifest = unpack(archive, self.bundles_dir, name, validate=validate)
+        for env_name, rel in manifest["envs"].items():
+            if manifest["python"]:
+                python = str(bundle_dir / manifest["python"])
+            else:
+                python = os.path.dirname(venv_home(bundle_dir / rel) or "")
+            self.register_env(env_name, bundle_dir / rel, python)
+        return bundle_dir
+
+    def disk_usage(self):
+        return disk_usage({"pythons": self.python_dir, "bundles": self.bundles_dir, "envs": self.envs_dir})
+
+    def du(self):
+        return self.garbage.du()
+
+    @traced("gc", "dry_run")
+    def gc(self, dry_run=False, max_age=None, max_bytes=None):
+        return self.garbage.collect(dry_run, max_age, max_bytes)
+
+    @traced("delete_env", "name")
+    def delete_env(self, name):
+        env = self.registry.get_env(name)
+        if env is None:
+            raise LollmsEnvError(f"Environment '{name}' not found")
+        env_path = Path(env["path"])
+        shutil.rmtree(env_path, ignore_errors=True)
+        self.packages.invalidate(env["path"])
+        self.activations.invalidate(name)
+        # Activation record precomputed by lollmsenv.sh
+        (self.home / "cache" / "activation" / name).unlink(missing_ok=True)
+        self.unregister_env(name)
+        # A bundle holds its envs and a copy of the interpreter; the copy is useless once its last env is gone
+        bundle = self._bundle_of(env_path)
+        if bundle is not None and not any(self._bundle_of(e["path"]) == bundle for e in self.envs().values()):
+            shutil.rmtree(bundle, ignore_errors=True)
+
+    def _bundle_of(self, path):
+        # bundles/<name> holding path, or None outside the bundles
+        rel = os.path.relpath(os.path.realpath(path), os.path.realpath(self.bundles_dir))
+        if rel == "." or rel.split(os.sep, 1)[0] == "..":
+            return None
+        return self.bundles_dir / rel.split(os.sep, 1)[0]
+
+    @traced("delete_python", "version")
+    def delete_python(self, version):
+        prefix = self.registry.get_python(version)
+        if prefix is None:
+            raise LollmsEnvError(f"Python {version} is not installed")
+        shutil.rmtree(prefix, ignore_errors=True)
+        self.templates.invalidate(self.interpreter_path(prefix))
+        self.unregister_python(version)
+
+    def run_in_env(self, env_name, command, **kwargs):
+        return self.activations.run(env_name, command, **kwargs)
+
+    def list_packages(self, env_name):
+        env = self.registry.get_env(env_name)
+        if env is None:
+            raise LollmsEnvError(f"Environment '{env_name}' not found")
+        return self.packages.packages(env["path"])
+
+    @traced("sync_env", "env", "lockfile")
+    def sync_env(self, env_name, lockfile, remove=True, dry_run=False):
+        # Make the env match a pinned lockfile, touching only the distributions that differ
+        env = self.registry.get_env(env_name)
+        if env is None:
+            raise LollmsEnvError(f"Environment '{env_name}' not found")
+        pins, options = read_lockfile(lockfile)
+        env_python = self.env_interpreter_path(env["path"])
+        with phase("plan"):
+            plan = plan_sync(self.packages.packages(env["path"]), pins, remove, env_python)
+        if not dry_run:
+            with phase("apply"):
+                apply_sync(env_python, plan, pins, options, self.wheelhouse)
+        return plan
+
+    @traced("install_packages", "env")
+    def install_packages(self, env_name, packages):
+        env = self.registry.get_env(env_name)
+        if env is None:
+            raise LollmsEnvError(f"Environment '{env_name}' not found")
+        return self.wheelhouse.install(self.env_interpreter_path(env["path"]), list(packages))
+
+    @traced("prefetch", "requirements")
+    def prefetch(self, requirements_file, python_version=None):
+        # Warm the wheelhouse for one interpreter (wheels are per Python version and platform)
+        if python_version:
+            interpreter = self.resolve_interpreter(python_version)
+        else:
+            pythons = self.pythons()
+            if not pythons:
+                raise LollmsEnvError("No Python installed to resolve wheels for")
+            interpreter = self.resolve_interpreter(max(pythons, key=version_key))
+        return self.wheelhouse.prefetch(interpreter, requirements_file)
+
+    def install_package(self, env_name, package):
+        return self.install_packages(env_name, [package])
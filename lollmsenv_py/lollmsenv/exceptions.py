@@ -1,2 +1,14 @@
 class LollmsEnvError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class CommandError(LollmsEnvError):
+    # A subprocess that failed: the message keeps the old "Command failed: ...\nError: <stderr>" text, the
+    # attributes carry the details
+    def __init__(self, cmd, returncode, stdout="", stderr="", duration=0.0, message=None):
+        super().__init__(message or f"Command failed: {cmd}\nError: {stderr}")
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
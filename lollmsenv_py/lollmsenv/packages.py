@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from .utils import IS_WINDOWS, atomic_write_text
+
+
+def site_packages_dirs(env_path):
+    env_path = Path(env_path)
+    if IS_WINDOWS:
+        candidates = [env_path / "Lib" / "site-packages"]
+    else:
+        lib = env_path / "lib"
+        candidates = sorted(lib.glob("python*/site-packages")) if lib.is_dir() else []
+    return [str(p) for p in candidates if p.is_dir()]
+
+
+def _read_headers(path):
+    # Name/Version from the RFC 822 header block of METADATA / PKG-INFO, stopping at the first blank line
+    name = version = None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    break
+                if line.startswith("Name:"):
+                    name = line[5:].strip()
+                elif line.startswith("Version:"):
+                    version = line[8:].strip()
+                if name and version:
+                    break
+    except OSError:
+        pass
+    return name, version
+
+
+def read_distribution(site_dir, entry):
+    # entry is a "<name>-<version>.dist-info" / ".egg-info" directory (or a legacy .egg-info file)
+    path = os.path.join(site_dir, entry)
+    if entry.endswith(".dist-info"):
+        name, version = _read_headers(os.path.join(path, "METADATA"))
+    elif os.path.isdir(path):
+        name, version = _read_headers(os.path.join(path, "PKG-INFO"))
+    else:
+        name, version = _read_headers(path)
+    if not name or not version:
+        stem = entry.rsplit(".", 1)[0]
+        guessed_name, _, guessed_version = stem.partition("-")
+        name = name or guessed_name
+        version = version or guessed_version.split("-")[0]
+    return {"name": name, "version": version}
+
+
+def normalize_name(name):
+    # PEP 503
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class PackageInventory:
+    # Installed distributions per environment, read straight from *.dist-info / *.egg-info metadata.
+    # A site-packages directory's mtime changes whenever pip adds or removes a distribution, so an
+    # unchanged mtime means the cached rows are current; on change only new metadata entries are read.
+    # The cache is kept in memory and mirrored to cache/packages/ so a fresh process (the UI) starts warm.
+
+    def __init__(self, home):
+        self.dir = Path(home) / "cache" / "packages"
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, env_path):
+        return self.dir / f"{hashlib.sha256(str(env_path).encode()).hexdigest()[:16]}.json"
+
+    def _load(self, env_path):
+        key = str(env_path)
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None:
+            return cached
+        try:
+            with open(self._cache_path(env_path)) as f:
+                cached = json.load(f)
+            if cached.get("env") != key:
+                cached = None
+        except (FileNotFoundError, ValueError):
+            cached = None
+        return cached or {"env": key, "sites": {}}
+
+    def _save(self, env_path, cached):
+        with self._lock:
+            self._memory[str(env_path)] = cached
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self._cache_path(env_path), json.dumps(cached))
+        except OSError:
+            pass
+
+    def scan(self, env_path):
+        # -> (rows sorted by name, whether anything had to be re-read)
+        cached = self._load(env_path)
+        sites = {}
+        changed = False
+        for site_dir in site_packages_dirs(env_path):
+            mtime = os.stat(site_dir).st_mtime_ns
+            previous = cached["sites"].get(site_dir)
+            if previous is not None and previous["mtime"] == mtime:
+                sites[site_dir] = previous
+                continue
+            changed = True
+            known = previous["entries"] if previous else {}
+            entries = {}
+            with os.scandir(site_dir) as it:
+                for entry in it:
+                    if entry.name.endswith((".dist-info", ".egg-info")):
+                        entries[entry.name] = known.get(entry.name) or read_distribution(site_dir, entry.name)
+            sites[site_dir] = {"mtime": mtime, "entries": entries}
+        if changed or set(sites) != set(cached["sites"]):
+            cached = {"env": str(env_path), "sites": sites}
+            self._save(env_path, cached)
+            changed = True
+        elif str(env_path) not in self._memory:
+            with self._lock:
+                self._memory[str(env_path)] = cached
+        rows = {}
+        for site in sites.values():
+            for row in site["entries"].values():
+                rows.setdefault(normalize_name(row["name"]), row)
+        return sorted(rows.values(), key=lambda r: normalize_name(r["name"])), changed
+
+    def packages(self, env_path):
+        return self.scan(env_path)[0]
+
+    def invalidate(self, env_path):
+        with self._lock:
+            self._memory.pop(str(env_path), None)
+        try:
+            os.unlink(self._cache_path(env_path))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,354 @@
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .bundles import LINK_MODES, place_file
+from .exceptions import LollmsEnvError
+from .telemetry import phase
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Archive layout, shared with lollmsenv.sh: manifest.txt first, then objects/<sha256>, one per distinct file content.
+# manifest.txt is tab-separated:
+#   lollmsenv-bundle  1
+#   root     <absolute bundle path on the exporting host>
+#   name     <bundle name>
+#   python   <interpreter prefix, relative>
+#   env      <env name>  <env path, relative>
+#   dir      <mode>  <path>
+#   file     <sha256>  <mode>  <size>  <rewrite 0|1>  <path>
+#   link     <path>  <target>
+# Text files that embed the bundle path (venv scripts, pyvenv.cfg) are flagged for rewrite and get the new location
+# on import, as do symlink targets under the old root; __pycache__ is left out since bytecode records the old paths.
+MANIFEST = "manifest.txt"
+FORMAT_VERSION = "1"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+# Objects up to this size are handed to the writer pool whole; larger ones are streamed to disk by the reader
+STREAM_THRESHOLD = 32 * 1024 * 1024
+# Upper bound on object data waiting in memory for a writer
+IN_FLIGHT_BYTES = 256 * 1024 * 1024
+DEFAULT_WORKERS = 8
+
+
+def _digest(path, needle):
+    # -> (sha256, whether a text file contains needle); one read per file, needle may straddle chunks
+    sha = hashlib.sha256()
+    found = binary = False
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            sha.update(chunk)
+            if not binary and b"\0" in chunk:
+                binary = True
+            if not found:
+                found = needle in tail + chunk
+                tail = chunk[-(len(needle) - 1):] if len(needle) > 1 else b""
+    return sha.hexdigest(), found and not binary
+
+
+def scan_bundle(root, workers=None):
+    # -> manifest rows for everything under root, files hashed in parallel
+    root = str(root)
+    dirs, files, links = [], [], []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        for name in list(dirnames):
+            path = os.path.join(dirpath, name)
+            rel = os.path.normpath(os.path.join(rel_dir, name))
+            if name == "__pycache__":
+                dirnames.remove(name)
+            elif os.path.islink(path):
+                dirnames.remove(name)
+                links.append((rel, os.readlink(path)))
+            else:
+                dirs.append((rel, os.stat(path).st_mode & 0o7777))
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.normpath(os.path.join(rel_dir, name))
+            if os.path.islink(path):
+                links.append((rel, os.readlink(path)))
+            else:
+                st = os.stat(path)
+                files.append([rel, st.st_mode & 0o7777, st.st_size])
+    needle = root.encode()
+    with ThreadPoolExecutor(workers or DEFAULT_WORKERS) as pool:
+        digests = list(pool.map(lambda row: _digest(os.path.join(root, row[0]), needle), files))
+    files = [(rel, mode, size, sha, rewrite) for (rel, mode, size), (sha, rewrite) in zip(files, digests)]
+    return dirs, files, links
+
+
+def format_manifest(root, name, python, envs, dirs, files, links):
+    lines = [f"lollmsenv-bundle\t{FORMAT_VERSION}", f"root\t{root}", f"name\t{name}"]
+    if python:
+        lines.append(f"python\t{python}")
+    lines += [f"env\t{env}\t{rel}" for env, rel in envs.items()]
+    lines += [f"dir\t{mode:o}\t{rel}" for rel, mode in dirs]
+    lines += [f"file\t{sha}\t{mode:o}\t{size}\t{int(rewrite)}\t{rel}" for rel, mode, size, sha, rewrite in files]
+    lines += [f"link\t{rel}\t{target}" for rel, target in links]
+    paths = [rel for rel, _ in dirs] + [row[0] for row in files] + [p for link in links for p in link]
+    bad = next((p for p in paths if "\n" in p or "\t" in p), None)
+    if bad is not None:
+        raise LollmsEnvError(f"Cannot archive a path containing a tab or newline: {bad!r}")
+    return "".join(f"{line}\n" for line in lines).encode()
+
+
+def _check_rel(rel, what):
+    # Manifest paths come from the archive: relative and without "..", so nothing can land outside the bundle
+    parts = rel.replace("\\", "/").split("/")
+    if not rel or os.path.isabs(rel) or parts[0] == "" or ":" in parts[0] or ".." in parts:
+        raise LollmsEnvError(f"Unsafe {what} path in bundle archive: {rel!r}")
+    return rel
+
+
+def check_bundle_name(name):
+    if not name or name in (".", "..") or "/" in name or "\\" in name or os.sep in name:
+        raise LollmsEnvError(f"Invalid bundle name: {name!r}")
+    return name
+
+
+def _inside(staging, rel):
+    # staging/rel, refusing anything that resolves elsewhere (through a symlink created earlier in the import)
+    path = os.path.join(staging, rel)
+    base = os.path.realpath(staging)
+    parent = os.path.realpath(os.path.dirname(path))
+    if os.path.commonpath([base, parent]) != base:
+        raise LollmsEnvError(f"Unsafe path in bundle archive: {rel!r} resolves outside the bundle")
+    return path
+
+
+def parse_manifest(data):
+    manifest = {"python": None, "envs": {}, "dirs": [], "files": [], "links": []}
+    lines = data.decode().splitlines()
+    if not lines or lines[0].split("\t") != ["lollmsenv-bundle", FORMAT_VERSION]:
+        raise LollmsEnvError("Not a lollmsenv bundle archive (or an unsupported format version)")
+    for line in lines[1:]:
+        kind, _, rest = line.partition("\t")
+        if kind == "root":
+            manifest[kind] = rest
+        elif kind == "name":
+            manifest[kind] = check_bundle_name(rest)
+        elif kind == "python":
+            manifest[kind] = _check_rel(rest, "interpreter")
+        elif kind == "env":
+            env, rel = rest.split("\t", 1)
+            manifest["envs"][env] = _check_rel(rel, "environment")
+        elif kind == "dir":
+            mode, rel = rest.split("\t", 1)
+            manifest["dirs"].append((_check_rel(rel, "directory"), int(mode, 8)))
+        elif kind == "file":
+            sha, mode, size, rewrite, rel = rest.split("\t", 4)
+            manifest["files"].append((_check_rel(rel, "file"), int(mode, 8), int(size), sha, rewrite == "1"))
+        elif kind == "link":
+            rel, target = rest.split("\t", 1)
+            manifest["links"].append((_check_rel(rel, "link"), target))
+    return manifest
+
+
+def default_compression():
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _open_writer(output, compression, level):
+    if compression == "zstd":
+        if zstandard is None:
+            raise LollmsEnvError("zstd compression needs the zstandard package; use gzip instead")
+        return zstandard.ZstdCompressor(level=level or 3, threads=-1).stream_writer(open(output, "wb"))
+    if compression == "gzip":
+        return gzip.open(output, "wb", compresslevel=level or 6)
+    raise LollmsEnvError(f"Unknown compression '{compression}', expected zstd or gzip")
+
+
+def _open_reader(archive):
+    with open(archive, "rb") as f:
+        magic = f.read(4)
+    if magic == ZSTD_MAGIC:
+        if zstandard is not None:
+            return zstandard.ZstdDecompressor().stream_reader(open(archive, "rb"), read_size=1024 * 1024)
+        if shutil.which("zstd"):
+            # No zstandard module: let the zstd tool decompress into a pipe
+            process = subprocess.Popen(["zstd", "-dc", str(archive)], stdout=subprocess.PIPE)
+            return process.stdout
+        raise LollmsEnvError("This bundle is zstd-compressed; install the zstandard package or the zstd tool")
+    if magic[:2] == GZIP_MAGIC:
+        return gzip.open(archive, "rb")
+    raise LollmsEnvError(f"{archive} is not a bundle archive")
+
+
+def pack(root, output, name, python=None, envs=None, compression=None, level=None, workers=None):
+    # -> {"files", "objects", "input_bytes", "output_bytes", "compression"}
+    # Not realpath: venv scripts embed the path as it was spelled when the bundle was created
+    root = os.path.abspath(root)
+    compression = compression or default_compression()
+    with phase("scan"):
+        dirs, files, links = scan_bundle(root, workers)
+    manifest = format_manifest(root, name, python, envs or {}, dirs, files, links)
+    objects = {}
+    for rel, _, size, sha, _ in files:
+        objects.setdefault(sha, (rel, size))
+    tmp = f"{output}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with phase("write", compression=compression), _open_writer(tmp, compression, level) as stream, \
+                tarfile.open(fileobj=stream, mode="w|") as tar:
+            info = tarfile.TarInfo(MANIFEST)
+            info.size = len(manifest)
+            tar.addfile(info, io.BytesIO(manifest))
+            for sha, (rel, size) in objects.items():
+                info = tarfile.TarInfo(f"objects/{sha}")
+                info.size = size
+                with open(os.path.join(root, rel), "rb") as f:
+                    tar.addfile(info, f)
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return {"files": len(files), "objects": len(objects), "input_bytes": sum(size for _, size in objects.values()),
+            "output_bytes": os.path.getsize(output), "compression": compression}
+
+
+class _Budget:
+    # Bytes of object data allowed to wait for a writer at once
+    def __init__(self, limit):
+        self.available = limit
+        self.limit = limit
+        self._cond = threading.Condition()
+
+    def acquire(self, n):
+        n = min(n, self.limit)
+        with self._cond:
+            self._cond.wait_for(lambda: self.available >= n)
+            self.available -= n
+        return n
+
+    def release(self, n):
+        with self._cond:
+            self.available += n
+            self._cond.notify_all()
+
+
+def _place_all(staging, targets, data, first, old_root, new_root, link_mode):
+    # targets: [(rel, mode, rewrite)] sharing one content. One file is written per distinct (rewrite, mode); the
+    # remaining ones are reflinked, hardlinked or copied from it like link_tree does.
+    written = {}
+    stats = {"reflink": 0, "hardlink": 0, "copy": 0}
+    mode_state = link_mode
+    for rel, mode, rewrite in targets:
+        path = _inside(staging, rel)
+        source = written.get((rewrite, mode))
+        if source is not None:
+            mode_state = place_file(source, path, mode_state, stats)
+            continue
+        if data is None:
+            # Streamed object: already on disk at `first`
+            if path != first:
+                shutil.copyfile(first, path)
+            if rewrite:
+                with open(path, "rb") as f:
+                    content = f.read()
+                with open(path, "wb") as f:
+                    f.write(content.replace(old_root, new_root))
+        else:
+            with open(path, "wb") as f:
+                f.write(data.replace(old_root, new_root) if rewrite else data)
+        os.chmod(path, mode)
+        written[(rewrite, mode)] = path
+
+
+def unpack(archive, bundles_dir, name=None, workers=None, link_mode=None, validate=None):
+    # -> (bundle dir, manifest). The archive is read as one stream; object contents are verified and written by a
+    # pool of threads while the next members are decompressed, then the tree is moved into place in one rename.
+    link_mode = link_mode or os.environ.get("LOLLMSENV_BUNDLE_LINK", "auto")
+    if link_mode not in LINK_MODES:
+        raise LollmsEnvError(f"Unknown link mode '{link_mode}', expected one of {', '.join(LINK_MODES)}")
+    stream = _open_reader(archive)
+    pool = ThreadPoolExecutor(workers or DEFAULT_WORKERS)
+    budget = _Budget(IN_FLIGHT_BYTES)
+    staging = None
+    try:
+        with phase("extract"), tarfile.open(fileobj=stream, mode="r|") as tar:
+            members = iter(tar)
+            first = next(members, None)
+            if first is None or first.name != MANIFEST:
+                raise LollmsEnvError(f"{archive} does not start with a bundle manifest")
+            manifest = parse_manifest(tar.extractfile(first).read())
+            if validate is not None:
+                validate(manifest)
+            dest = Path(bundles_dir) / check_bundle_name(name or manifest["name"])
+            if dest.exists():
+                raise LollmsEnvError(f"Bundle directory {dest} already exists")
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            staging = Path(tempfile.mkdtemp(prefix=f".{dest.name}.partial-{os.getpid()}-", dir=dest.parent))
+            for rel, _ in sorted(manifest["dirs"]):
+                os.makedirs(_inside(staging, rel), exist_ok=True)
+            old_root, new_root = manifest["root"].encode(), str(dest).encode()
+            by_sha = {}
+            for rel, mode, _, sha, rewrite in manifest["files"]:
+                by_sha.setdefault(sha, []).append((rel, mode, rewrite))
+            futures = []
+
+            def write(data, sha, targets, reserved):
+                try:
+                    if hashlib.sha256(data).hexdigest() != sha:
+                        raise LollmsEnvError(f"Corrupted bundle archive: {targets[0][0]} does not match its hash")
+                    _place_all(staging, targets, data, None, old_root, new_root, link_mode)
+                finally:
+                    budget.release(reserved)
+
+            for member in members:
+                sha = member.name.rpartition("/")[2]
+                targets = by_sha.pop(sha, None)
+                if targets is None:
+                    continue
+                source = tar.extractfile(member)
+                if member.size <= STREAM_THRESHOLD:
+                    reserved = budget.acquire(member.size)
+                    futures.append(pool.submit(write, source.read(), sha, targets, reserved))
+                    continue
+                first_path = _inside(staging, targets[0][0])
+                digest = hashlib.sha256()
+                with open(first_path, "wb") as f:
+                    while True:
+                        chunk = source.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        f.write(chunk)
+                if digest.hexdigest() != sha:
+                    raise LollmsEnvError(f"Corrupted bundle archive: {targets[0][0]} does not match its hash")
+                futures.append(pool.submit(_place_all, str(staging), targets, None, first_path, old_root, new_root,
+                                           link_mode))
+            for future in futures:
+                future.result()
+            if by_sha:
+                raise LollmsEnvError(f"Bundle archive is truncated: {len(by_sha)} objects are missing")
+        old_prefix = manifest["root"] + os.sep
+        for rel, target in manifest["links"]:
+            if target == manifest["root"] or target.startswith(old_prefix):
+                target = str(dest) + target[len(manifest["root"]):]
+            os.symlink(target, _inside(staging, rel))
+        # Directory modes last, deepest first, so read-only directories do not block the writes above
+        for rel, mode in sorted(manifest["dirs"], reverse=True):
+            os.chmod(_inside(staging, rel), mode)
+        os.rename(staging, dest)
+        return dest, manifest
+    except BaseException:
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        stream.close()
@@ -0,0 +1,195 @@
+import os
+import sqlite3
+import threading
+from .exceptions import LollmsEnvError
+from .utils import IS_WINDOWS, FileLock, atomic_write_text
+
+SEP = "," if IS_WINDOWS else ":"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pythons (version TEXT PRIMARY KEY, path TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS envs (name TEXT PRIMARY KEY, path TEXT NOT NULL, python TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def split_entry(line):
+    # lollmsenv.sh writes "a:b:c", lollmsenv.bat writes "a,b,c" (paths may contain a drive colon)
+    if "," in line:
+        return [part.strip() for part in line.split(",")]
+    return [part.strip() for part in line.split(":")]
+
+
+def format_pythons(pythons):
+    # The text lollmsenv.sh list-pythons / list-envs print
+    return "\n".join(["Installed Python versions:"] + [f"{v}:{path}" for v, path in pythons.items()]) + "\n"
+
+
+def format_envs(envs):
+    lines = [f"{name}:{env['path']}:{env['python']}" for name, env in envs.items()]
+    return "\n".join(["Installed environments:"] + lines) + "\n"
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "missing"
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+class Registry:
+    # SQLite index over installed pythons and envs.
+    # installed_pythons.txt / installed_envs.txt stay the on-disk format the shell front-ends read and write;
+    # a mutation here edits them the way the shell does (append a line, or drop one key's lines), and edits made
+    # by the shell scripts are re-imported the next time the registry notices the file signature changed.
+
+    def __init__(self, home):
+        # Plain strings: `python -m lollmsenv list-envs` reads the registry without importing pathlib
+        self.home = os.fspath(home)
+        self.pythons_file = os.path.join(self.home, "pythons", "installed_pythons.txt")
+        self.envs_file = os.path.join(self.home, "envs", "installed_envs.txt")
+        self.db_path = os.path.join(self.home, "registry.db")
+        self.lock_path = os.path.join(self.home, "registry.lock")
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(self.home, exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._local.db = db
+        return db
+
+    def _meta(self, db, key):
+        row = db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _expand(self, path):
+        # lollmsenv.bat registers envs relative to a literal %LOLLMS_HOME% prefix
+        return path.replace("%LOLLMS_HOME%", self.home)
+
+    def _parse(self, path, fields):
+        rows = {}
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    parts = split_entry(line.strip())
+                    if len(parts) < 2 or not parts[0]:
+                        continue
+                    parts += [""] * (fields - len(parts))
+                    parts[1] = self._expand(parts[1])
+                    rows[parts[0]] = tuple(parts[:fields])
+        except FileNotFoundError:
+            pass
+        return list(rows.values())
+
+    _TABLES = {"pythons": 2, "envs": 3}
+    _KEYS = {"pythons": "version", "envs": "name"}
+
+    def _import(self, db, table, path):
+        fields = self._TABLES[table]
+        db.execute(f"DELETE FROM {table}")
+        db.executemany(f"INSERT INTO {table} VALUES ({','.join('?' * fields)})", self._parse(path, fields))
+        db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"{table}_sig", _signature(path)))
+
+    def _sync(self):
+        # Cheap on the read path: two stat() calls, re-import only when a text file changed behind our back
+        db = self._db()
+        stale = [
+            (table, path)
+            for table, path in (("pythons", self.pythons_file), ("envs", self.envs_file))
+            if _signature(path) != self._meta(db, f"{table}_sig")
+        ]
+        if not stale:
+            return db
+        with FileLock(self.lock_path):
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for table, path in stale:
+                    if _signature(path) != self._meta(db, f"{table}_sig"):
+                        self._import(db, table, path)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return db
+
+    def _append(self, path, row):
+        # registry_append: one line at the end, so adding an entry costs the same however many there are
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        line = SEP.join(map(str, row)) + "\n"
+        with open(path, "ab+") as f:
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+            f.write(line.encode())
+
+    def _drop(self, path, key):
+        # registry_remove: every other line is kept as written, whichever front-end wrote it
+        with open(path, "r") as f:
+            lines = f.readlines()
+        atomic_write_text(path, "".join(line for line in lines if split_entry(line.strip())[0] != key))
+
+    def _mutate(self, table, path, key, row=None, replace=True):
+        # Removes key when row is None, otherwise inserts row (over an existing key only if replace is set).
+        # Returns whether key was there before.
+        db = self._db()
+        column = self._KEYS[table]
+        with FileLock(self.lock_path):
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have written the mirror between our _sync and taking the lock
+                if _signature(path) != self._meta(db, f"{table}_sig"):
+                    self._import(db, table, path)
+                existed = db.execute(f"SELECT 1 FROM {table} WHERE {column}=?", (key,)).fetchone() is not None
+                if existed and (row is None or replace):
+                    db.execute(f"DELETE FROM {table} WHERE {column}=?", (key,))
+                    self._drop(path, key)
+                if row is not None:
+                    db.execute(f"INSERT INTO {table} VALUES ({','.join('?' * len(row))})", row)
+                    self._append(path, row)
+                db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"{table}_sig", _signature(path)))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return existed
+
+    # Pythons
+
+    def pythons(self):
+        return dict(self._sync().execute("SELECT version, path FROM pythons ORDER BY rowid"))
+
+    def get_python(self, version):
+        row = self._sync().execute("SELECT path FROM pythons WHERE version=?", (version,)).fetchone()
+        return row[0] if row else None
+
+    def add_python(self, version, path):
+        self._mutate("pythons", self.pythons_file, version, (version, str(path)))
+
+    def remove_python(self, version):
+        return self._mutate("pythons", self.pythons_file, version)
+
+    # Envs
+
+    def envs(self):
+        rows = self._sync().execute("SELECT name, path, python FROM envs ORDER BY rowid")
+        return {name: {"path": path, "python": python} for name, path, python in rows}
+
+    def get_env(self, name):
+        row = self._sync().execute("SELECT path, python FROM envs WHERE name=?", (name,)).fetchone()
+        return {"path": row[0], "python": row[1]} if row else None
+
+    def add_env(self, name, path, python_version):
+        try:
+            self._mutate("envs", self.envs_file, name, (name, str(path), python_version), replace=False)
+        except sqlite3.IntegrityError:
+            raise LollmsEnvError(f"Environment '{name}' already exists")
+
+    def remove_env(self, name):
+        return self._mutate("envs", self.envs_file, name)
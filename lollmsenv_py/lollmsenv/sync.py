@@ -0,0 +1,117 @@
+import json
+import os
+import re
+import subprocess
+import tempfile
+from .exceptions import LollmsEnvError
+from .packages import normalize_name
+from .utils import run_command
+
+# Installed by venv/templates rather than by the user; only touched when the lockfile pins them
+TOOLING = {"pip", "setuptools", "wheel", "packaging"}
+# Options a requirements file may carry that must stay with the requirements we hand to pip
+_PASSTHROUGH = ("--index-url", "-i", "--extra-index-url", "--find-links", "-f", "--no-index", "--trusted-host",
+                "--pre", "--prefer-binary")
+_PIN_RE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?\s*===?\s*([^\s;\\]+)")
+
+
+def canonical_version(version):
+    # "v1.2.0" == "1.2": enough of PEP 440 normalization to avoid reinstalling equal pins
+    version = version.strip().lower().lstrip("v")
+    release, rest = re.match(r"^([0-9.]*)(.*)$", version).group(1, 2)
+    parts = release.split(".") if release else []
+    while len(parts) > 1 and parts[-1] == "0":
+        parts.pop()
+    return ".".join(str(int(p)) if p.isdigit() else p for p in parts) + rest
+
+
+def read_lockfile(path):
+    # -> ({normalized name: (requirement, version, marker)}, [pip options]) from a pinned requirements file
+    pins = {}
+    options = []
+    try:
+        with open(path) as f:
+            text = f.read()
+    except OSError as e:
+        raise LollmsEnvError(f"Cannot read lockfile {path}: {e}")
+    for line in text.replace("\\\n", " ").splitlines():
+        line = line.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("-"):
+            if line.split("=", 1)[0].split()[0] in _PASSTHROUGH:
+                options.append(line)
+                continue
+            raise LollmsEnvError(f"Unsupported lockfile line (only pinned requirements are synced): {line}")
+        match = _PIN_RE.match(line)
+        if match is None:
+            raise LollmsEnvError(f"Lockfile entry is not pinned with ==: {line}")
+        name, _, version = match.groups()
+        requirement = line.split("--hash", 1)[0].strip()
+        marker = requirement.split(";", 1)[1].strip() if ";" in requirement else None
+        pins[normalize_name(name)] = (requirement, version, marker)
+    return pins, options
+
+
+def markers_apply(env_python, markers):
+    # Evaluated by the env's own interpreter (with pip's vendored packaging), in a single process
+    script = ("import json,sys\nfrom pip._vendor.packaging.markers import Marker\n"
+              "print(json.dumps([Marker(m).evaluate() for m in json.load(sys.stdin)]))")
+    try:
+        result = subprocess.run([str(env_python), "-c", script], input=json.dumps(markers),
+                                capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        return [True] * len(markers)
+
+
+def plan_sync(installed, pins, remove=True, env_python=None):
+    # installed: rows from the package inventory; returns what differs between the env and the lockfile
+    current = {normalize_name(row["name"]): row["version"] for row in installed}
+    # Absent pins guarded by a marker may simply not apply to this env
+    guarded = [n for n, (_, _, marker) in pins.items() if marker and n not in current]
+    if guarded and env_python is not None:
+        applies = markers_apply(env_python, [pins[n][2] for n in guarded])
+        skipped = {n for n, ok in zip(guarded, applies) if not ok}
+    else:
+        skipped = set()
+    install, upgrade, remove_list = [], [], []
+    for name, (requirement, version, marker) in pins.items():
+        have = current.get(name)
+        if name in skipped:
+            continue
+        if have is None:
+            install.append((name, requirement, None, version))
+        elif canonical_version(have) != canonical_version(version):
+            upgrade.append((name, requirement, have, version))
+    if remove:
+        remove_list = sorted(n for n in current if n not in pins and n not in TOOLING)
+    return {"install": install, "upgrade": upgrade, "remove": remove_list,
+            "unchanged": sum(1 for n in pins if n in current) - len(upgrade)}
+
+
+def _write_temp(lines):
+    fd, path = tempfile.mkstemp(prefix="lollmsenv-sync-", suffix=".txt")
+    with os.fdopen(fd, "w") as f:
+        f.write("".join(f"{line}\n" for line in lines))
+    return path
+
+
+def apply_sync(env_python, plan, pins, options, wheelhouse=None):
+    changes = plan["install"] + plan["upgrade"]
+    if changes:
+        # One resolver pass over everything that differs, every other pin acting as a constraint for dependencies
+        # (constraints may not carry extras, so they are rebuilt from name, version and marker)
+        requirements = _write_temp(options + [requirement for _, requirement, _, _ in changes])
+        constraints = _write_temp([f"{n}=={v}" + (f"; {m}" if m else "") for n, (_, v, m) in pins.items()])
+        try:
+            args = ["-r", requirements, "-c", constraints]
+            if wheelhouse is None:
+                run_command([str(env_python), "-m", "pip", "install", *args])
+            else:
+                wheelhouse.install(env_python, args)
+        finally:
+            os.unlink(requirements)
+            os.unlink(constraints)
+    if plan["remove"]:
+        run_command([str(env_python), "-m", "pip", "uninstall", "-y", *plan["remove"]])
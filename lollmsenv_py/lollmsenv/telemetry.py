@@ -0,0 +1,289 @@
+import functools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Event log shared with lollmsenv.sh: one JSON object per line, compact separators so both sides (and awk) agree.
+#   {"ts":<start, epoch s>,"pid":..,"event":"span","name":"install_python/download","id":"<pid>.<n>","parent":..,
+#    "duration":<s>,"status":"ok"|"error","attrs":{..}}
+#   {"ts":..,"pid":..,"event":"log","level":"info"|"error","msg":".."}
+# Span names are the path from the outermost span, so install_python/pip and create_env/pip are told apart.
+DEFAULT_MAX_MB = 16
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+_HELP = {
+    "lollmsenv_span_duration_seconds": ("histogram", "Duration of lollmsenv operations and of their phases"),
+    "lollmsenv_spans_total": ("counter", "Operations and phases run, by outcome"),
+    "lollmsenv_log_messages_total": ("counter", "Log messages, by level"),
+}
+_local = threading.local()
+_ids = iter(range(1, 1 << 62))
+_ids_lock = threading.Lock()
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _next_id():
+    with _ids_lock:
+        return f"{os.getpid()}.{next(_ids)}"
+
+
+class Span:
+    def __init__(self, telemetry, name, attrs):
+        self.telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+        self.id = None
+        self.parent = None
+        self.start = None
+        self.duration = 0.0
+        self.status = "ok"
+        self.children = []
+        self._captures = []
+
+    def __enter__(self):
+        stack = _stack()
+        for entry in reversed(stack):
+            if isinstance(entry, _Capture):
+                self._captures.append(entry)
+            else:
+                self.parent = entry
+                self.name = f"{entry.name}/{self.name}"
+                break
+        self.id = _next_id()
+        self.start = time.time()
+        self._clock = time.perf_counter()
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._clock
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.status = "error"
+            self.attrs["error"] = str(exc)[:500] or exc_type.__name__
+        if self.parent is not None:
+            self.parent.children.append(self)
+        # Only the innermost capture sees the span: outer ones get it through its parent
+        if self._captures:
+            self._captures[0].spans.append(self)
+        if self.telemetry is not None:
+            self.telemetry.record(self)
+        return False
+
+    def phases(self):
+        # {relative path: seconds} over every nested span, repeated phases (several pip runs) summed
+        totals = {}
+        prefix = len(self.name) + 1
+        pending = list(self.children)
+        while pending:
+            child = pending.pop(0)
+            key = child.name[prefix:]
+            totals[key] = totals.get(key, 0.0) + child.duration
+            pending.extend(child.children)
+        return totals
+
+    def to_event(self):
+        return {"ts": round(self.start, 6), "pid": os.getpid(), "event": "span", "name": self.name, "id": self.id,
+                "parent": self.parent.id if self.parent is not None else None, "duration": round(self.duration, 6),
+                "status": self.status, "attrs": self.attrs}
+
+
+class _Capture:
+    def __init__(self):
+        self.spans = []
+
+    def __enter__(self):
+        _stack().append(self)
+        return self.spans
+
+    def __exit__(self, *exc):
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        return False
+
+
+def phase(name, /, **attrs):
+    # A span under whatever span is open on this thread (templates, wheelhouse and packing have no engine handle);
+    # outside of any, it still times itself but records nothing
+    stack = [entry for entry in _stack() if isinstance(entry, Span)]
+    return Span(stack[-1].telemetry if stack else None, name, attrs)
+
+
+def traced(name, *fields):
+    # Runs an Engine method in a span of self.telemetry, attrs taken from its leading positional arguments
+    def wrap(method):
+        @functools.wraps(method)
+        def run(self, *args, **kwargs):
+            with self.telemetry.span(name, **{k: str(v) for k, v in zip(fields, args)}):
+                return method(self, *args, **kwargs)
+        return run
+    return wrap
+
+
+class Result(str):
+    # What the call has always returned as text, plus value (the object behind it, e.g. a Path), duration in seconds
+    # and phases, the time spent in each step ({"catalog": .., "download": .., "ensurepip": .., "pip": ..})
+
+    def __new__(cls, text, value=None, duration=0.0, phases=None, status="ok"):
+        self = super().__new__(cls, text)
+        self.value = text if value is None else value
+        self.duration = duration
+        self.phases = phases or {}
+        self.status = status
+        return self
+
+    @classmethod
+    def of(cls, span, text, value=None):
+        if span is None:
+            return cls(text, value)
+        return cls(text, value, span.duration, span.phases(), span.status)
+
+    def to_dict(self):
+        return {"text": str(self), "value": str(self.value), "duration": self.duration, "phases": self.phases,
+                "status": self.status}
+
+
+def _labels(pairs):
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    # Counters and histograms in the Prometheus text format. Fed by this process's spans, or rebuilt from the event
+    # log (from_events) to cover every process, shell included.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            key = (name, tuple(labels))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        with self._lock:
+            key = (name, tuple(labels))
+            buckets = self.histograms.get(key)
+            if buckets is None:
+                buckets = self.histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            buckets[-2] += value
+            buckets[-1] += 1
+
+    def add_event(self, event):
+        if event.get("event") == "span":
+            self.observe("lollmsenv_span_duration_seconds", event["duration"], (("span", event["name"]),))
+            self.inc("lollmsenv_spans_total", (("span", event["name"]), ("status", event["status"])))
+        elif event.get("event") == "log":
+            self.inc("lollmsenv_log_messages_total", (("level", event.get("level", "info")),))
+
+    @classmethod
+    def from_events(cls, events):
+        metrics = cls()
+        for event in events:
+            metrics.add_event(event)
+        return metrics
+
+    def render(self):
+        with self._lock:
+            series = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                series.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+            for (name, labels), buckets in sorted(self.histograms.items()):
+                lines = series.setdefault(name, [])
+                for bound, count in zip(BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {buckets[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(round(buckets[-2], 6))}")
+                lines.append(f"{name}_count{_labels(labels)} {buckets[-1]}")
+        out = []
+        for name, lines in series.items():
+            kind, text = _HELP.get(name, ("untyped", name))
+            out += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"] + lines
+        return "\n".join(out) + "\n" if out else ""
+
+
+class Telemetry:
+    # Spans and log events of one lollmsenv home, appended to logs/events.jsonl (LOLLMSENV_EVENT_LOG overrides the
+    # path, an empty value disables the file) and counted in metrics. The log is rotated to events.jsonl.1 past
+    # LOLLMSENV_EVENT_LOG_MB, so at most two files are kept.
+
+    def __init__(self, home, path=None, max_bytes=None):
+        if path is None:
+            path = os.environ.get("LOLLMSENV_EVENT_LOG", str(Path(home) / "logs" / "events.jsonl"))
+        self.path = Path(path) if path else None
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("LOLLMSENV_EVENT_LOG_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.metrics = Metrics()
+
+    def span(self, name, /, **attrs):
+        return Span(self, name, attrs)
+
+    def capture(self):
+        # with telemetry.capture() as spans: ... -> the outermost spans finished inside, for Result.of()
+        return _Capture()
+
+    def log(self, msg, level="info"):
+        self.emit({"ts": round(time.time(), 6), "pid": os.getpid(), "event": "log", "level": level, "msg": msg})
+
+    def record(self, span):
+        self.emit(span.to_event(), rotate=span.parent is None)
+
+    def emit(self, event, rotate=False):
+        self.metrics.add_event(event)
+        if self.path is None:
+            return
+        line = json.dumps(event, separators=(",", ":"), default=str) + "\n"
+        try:
+            if rotate and self.path.stat().st_size > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except OSError:
+            pass
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # One write on an O_APPEND descriptor: lines from concurrent processes do not interleave
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def events(self):
+        if self.path is None:
+            return
+        for path in (Path(f"{self.path}.1"), self.path):
+            try:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except OSError:
+                continue
+
+    def render_metrics(self):
+        # Every process that wrote to the log when there is one, otherwise this process only
+        if self.path is None:
+            return self.metrics.render()
+        return Metrics.from_events(self.events()).render()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from .bundles import place_file
+from .telemetry import phase
+from .utils import IS_WINDOWS, FileLock, run_command
+
+STAMP = ".lollmsenv-template"
+
+
+def template_key(interpreter):
+    # Same key lollmsenv.sh derives: first 16 hex digits of sha256(interpreter path)
+    return hashlib.sha256(str(interpreter).encode()).hexdigest()[:16]
+
+
+class VenvTemplates:
+    # One "golden" venv per interpreter (venv + upgraded pip + wheel/setuptools), built once and cloned.
+    # Clones hardlink (or reflink) every file except the few that embed the venv path - bin/ scripts and
+    # pyvenv.cfg - which are rewritten; __pycache__ is skipped so bytecode records the clone's own paths.
+
+    def __init__(self, home, enabled=None, wheelhouse=None):
+        self.dir = Path(home) / "templates"
+        self.wheelhouse = wheelhouse
+        if enabled is None:
+            enabled = os.environ.get("LOLLMSENV_VENV_TEMPLATES", "1") != "0"
+        # Windows launchers embed the interpreter path inside .exe files, so clones are POSIX only
+        self.enabled = enabled and not IS_WINDOWS
+
+    def path(self, interpreter):
+        return self.dir / template_key(interpreter)
+
+    @staticmethod
+    def build_venv(interpreter, env_path, wheelhouse=None):
+        with phase("venv"):
+            run_command([str(interpreter), "-m", "venv", str(env_path)])
+        env_python = str(Path(env_path) / ("Scripts/python.exe" if IS_WINDOWS else "bin/python"))
+        if wheelhouse is None:
+            run_command([env_python, "-m", "pip", "install", "--upgrade", "pip"])
+            run_command([env_python, "-m", "pip", "install", "wheel", "setuptools"])
+        else:
+            wheelhouse.install(env_python, ["--upgrade", "pip"])
+            wheelhouse.install(env_python, ["wheel", "setuptools"])
+
+    def ensure(self, interpreter):
+        template = self.path(interpreter)
+        stamp = template / STAMP
+        if stamp.exists():
+            return template
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.dir / f"{template.name}.lock"):
+            if stamp.exists():
+                return template
+            # A template without its stamp is a leftover from an interrupted build
+            shutil.rmtree(template, ignore_errors=True)
+            with phase("template", interpreter=str(interpreter)):
+                self.build_venv(interpreter, template, self.wheelhouse)
+            stamp.write_text(f"{interpreter}\n")
+        return template
+
+    def invalidate(self, interpreter):
+        shutil.rmtree(self.path(interpreter), ignore_errors=True)
+
+    @staticmethod
+    def _rewrite(src, dst, old, new):
+        with open(src, "rb") as f:
+            data = f.read()
+        if old not in data:
+            return False
+        with open(dst, "wb") as f:
+            f.write(data.replace(old, new))
+        shutil.copymode(src, dst)
+        return True
+
+    def clone(self, template, env_path):
+        template = Path(template)
+        env_path = Path(env_path)
+        old = str(template).encode()
+        new = str(env_path).encode()
+        mode = "auto"
+        stats = {"reflink": 0, "hardlink": 0, "copy": 0, "rewritten": 0}
+        for root, dirs, files in os.walk(template):
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+            rel = os.path.relpath(root, template)
+            target_root = env_path / rel if rel != "." else env_path
+            target_root.mkdir(parents=True, exist_ok=True)
+            for name in dirs:
+                if os.path.islink(os.path.join(root, name)):
+                    os.symlink(os.readlink(os.path.join(root, name)), target_root / name)
+            in_bin = rel == "bin"
+            for name in files:
+                if rel == "." and name == STAMP:
+                    continue
+                src = os.path.join(root, name)
+                dst = target_root / name
+                if os.path.islink(src):
+                    link = os.readlink(src)
+                    os.symlink(link.replace(str(template), str(env_path)), dst)
+                elif (in_bin or (rel == "." and name == "pyvenv.cfg")) and self._rewrite(src, dst, old, new):
+                    stats["rewritten"] += 1
+                else:
+                    mode = place_file(src, dst, mode, stats)
+        return stats
+
+    def create(self, interpreter, env_path):
+        if not self.enabled:
+            self.build_venv(interpreter, env_path, self.wheelhouse)
+            return None
+        template = self.ensure(interpreter)
+        try:
+            with phase("clone") as span:
+                stats = self.clone(template, env_path)
+                span.attrs.update(stats)
+            return stats
+        except BaseException:
+            shutil.rmtree(env_path, ignore_errors=True)
+            raise
@@ -0,0 +1,110 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
+_FIELDS = ("files", "apparent_bytes", "real_bytes", "exclusive_bytes")
+
+
+def _scan(root):
+    # -> (files, apparent bytes, {(dev, ino): [allocated bytes, st_nlink, links seen here]}) without following symlinks
+    files = 0
+    apparent = 0
+    inodes = {}
+    if os.path.islink(root) or not os.path.isdir(root):
+        try:
+            st = os.lstat(root)
+        except FileNotFoundError:
+            return files, apparent, inodes
+        blocks = st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+        return 1, st.st_size, {(st.st_dev, st.st_ino): [blocks, st.st_nlink, 1]}
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            entries = list(os.scandir(path))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        for entry in entries:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+                continue
+            files += 1
+            apparent += st.st_size
+            key = (st.st_dev, st.st_ino)
+            seen = inodes.get(key)
+            if seen is None:
+                inodes[key] = [st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size, st.st_nlink, 1]
+            else:
+                seen[2] += 1
+    return files, apparent, inodes
+
+
+def _units(path):
+    # A tree is scanned as its top-level entries so one large env/ or pythons/ still spreads over the pool
+    try:
+        with os.scandir(path) as it:
+            children = [entry.path for entry in it]
+    except NotADirectoryError:
+        return [path]
+    except (FileNotFoundError, PermissionError):
+        return []
+    return children
+
+
+def _merge(scans):
+    files = apparent = 0
+    inodes = {}
+    for unit_files, unit_apparent, unit_inodes in scans:
+        files += unit_files
+        apparent += unit_apparent
+        for key, (blocks, nlink, links) in unit_inodes.items():
+            seen = inodes.get(key)
+            if seen is None:
+                inodes[key] = [blocks, nlink, links]
+            else:
+                seen[2] += links
+    return files, apparent, inodes
+
+
+def scan_trees(trees, workers=None):
+    # trees: ordered {label: path} -> {label: (files, apparent, inodes)}, every top-level entry scanned in parallel
+    units = [(label, unit) for label, path in trees.items() for unit in _units(str(path))]
+    with ThreadPoolExecutor(workers or int(os.environ.get("LOLLMSENV_BATCH_WORKERS", DEFAULT_WORKERS))) as pool:
+        results = list(pool.map(_scan, [unit for _, unit in units]))
+    per_label = {label: [] for label in trees}
+    for (label, _), result in zip(units, results):
+        per_label[label].append(result)
+    return {label: _merge(scans) for label, scans in per_label.items()}
+
+
+def account(scans):
+    # A hardlinked file is charged (real_bytes) to the first tree it is seen in, so bundles built from the shared
+    # interpreter store only pay for what they do not share. exclusive_bytes is what deleting the tree frees: files
+    # with every link inside it. Reflinked extents cannot be told apart from copies and are counted in full.
+    owners = {}
+    for label, (_, _, inodes) in scans.items():
+        for key in inodes:
+            owners[key] = owners.get(key, 0) + 1
+    seen = set()
+    report = {}
+    for label, (files, apparent, inodes) in scans.items():
+        real = exclusive = 0
+        for key, (blocks, nlink, links) in inodes.items():
+            if key not in seen:
+                seen.add(key)
+                real += blocks
+            if owners[key] == 1 and links >= nlink:
+                exclusive += blocks
+        report[label] = {"files": files, "apparent_bytes": apparent, "real_bytes": real, "exclusive_bytes": exclusive}
+    return report
+
+
+def disk_usage(roots, workers=None):
+    # roots: ordered {label: path}
+    report = account(scan_trees(roots, workers))
+    report["total"] = {key: sum(item[key] for item in report.values()) for key in _FIELDS}
+    return report
@@ -1,8 +1,65 @@
-import subprocess
-from .exceptions import LollmsEnvError
+import os
+import sys
+import threading
+import time
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    import msvcrt
+from .exceptions import CommandError
+IS_WINDOWS = sys.platform.startswith("win")
+def home_dir():
+    # activate.sh / activate.bat export LOLLMSENV_DIR, otherwise use the default install location
+    return os.environ.get("LOLLMSENV_DIR") or os.path.join(os.path.expanduser("~"), ".lollmsenv")
 def run_command(cmd):
+    # stdout as a Result (str) with the run's duration; CommandError keeps returncode, stdout and stderr.
+    # Imported here: the registry, and so `python -m lollmsenv list-envs`, only needs the helpers below.
+    import subprocess
+    from .telemetry import Result
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    duration = time.perf_counter() - start
+    if result.returncode != 0:
+        raise CommandError(cmd, result.returncode, result.stdout, result.stderr, duration)
+    return Result(result.stdout, duration=duration)
+
+class FileLock:
+    # Exclusive cross-process lock; lollmsenv.sh takes the same lock with flock(1).
+    # shared=True takes it as a reader (flock -s): any number of readers, excluded only by an exclusive holder.
+    # msvcrt has no shared mode, so on Windows readers are exclusive too.
+    def __init__(self, path, shared=False):
+        self.path = str(path)
+        self.shared = shared
+        self._fd = None
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if msvcrt:
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(self._fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+    def __exit__(self, *exc):
+        if msvcrt:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+def atomic_write_text(path, text):
+    # Per process and thread: the daemon and batch pools write the same files from several threads
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        raise LollmsEnvError(f"Command failed: {e.cmd}\nError: {e.stderr}")
\ No newline at end of file
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
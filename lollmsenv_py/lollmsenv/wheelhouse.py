@@ -0,0 +1,183 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from .exceptions import CommandError, LollmsEnvError
+from .telemetry import phase
+from .utils import FileLock
+
+DEFAULT_MAX_MB = 4096
+# Seconds a loose requirement set stays resolved: within it the wheelhouse answers alone, like a pinned one
+DEFAULT_TTL = 3600
+# Install-only flags that `pip wheel` does not accept
+_INSTALL_ONLY = {"--upgrade", "-U", "--force-reinstall", "--no-deps", "--user"}
+# name[extras]==version[; marker]: one exact release, which a wheel in the wheelhouse either is or is not
+_PINNED = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*(\[[A-Za-z0-9,._ -]*\])?\s*===?\s*[^\s,;*]+\s*(;.*)?$")
+
+
+def _requirements(args):
+    # The requirements of pip install arguments, read through -r files (constraints are not requirements)
+    found = []
+    args = iter(args)
+    for arg in args:
+        if arg in ("-r", "--requirement"):
+            try:
+                with open(next(args, "")) as f:
+                    found += f.read().splitlines()
+            except OSError:
+                # Unreadable here: treated as a loose requirement, pip reports the error itself
+                found.append("-r")
+        elif arg in ("-c", "--constraint"):
+            next(args, None)
+        elif not arg.startswith("-"):
+            found.append(arg)
+    # Comments, trailing line continuations and --hash options of pip-compile output
+    lines = [re.sub(r"\s+--hash[=\s]+\S+", "", line.split(" #", 1)[0]).rstrip(" \t\\").strip() for line in found]
+    return [line for line in lines if line and not line.startswith("#") and (line == "-r" or not line.startswith("-"))]
+
+
+def pinned(args):
+    # True when every requirement names one exact version: only then can the wheelhouse answer without the index
+    requirements = _requirements(args)
+    return bool(requirements) and all(_PINNED.match(r) for r in requirements)
+
+
+class Wheelhouse:
+    # Wheels shared by every env and bundle, in cache/wheels/ (the same directory lollmsenv.sh uses).
+    # Exactly pinned installs (and every install offline) resolve with --no-index against the wheelhouse alone;
+    # only when that fails are the missing wheels fetched or built with `pip wheel`. Looser requirements are
+    # resolved against the index through `pip wheel` once per LOLLMSENV_WHEELHOUSE_TTL, which publishes the
+    # resolved set here, so newer releases are picked up and later installs of the same set stay offline.
+    # Installs hold cache/wheels.lock shared; publishing fetched wheels and evicting the least recently used ones
+    # past LOLLMSENV_WHEELHOUSE_MB hold it exclusively, so a wheel pip is reading never disappears.
+
+    def __init__(self, home, max_bytes=None, offline=None, ttl=None):
+        self.dir = Path(home) / "cache" / "wheels"
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("LOLLMSENV_WHEELHOUSE_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.offline = offline if offline is not None else bool(os.environ.get("LOLLMSENV_OFFLINE"))
+        self.ttl = ttl if ttl is not None else int(os.environ.get("LOLLMSENV_WHEELHOUSE_TTL", DEFAULT_TTL))
+
+    def _pip(self, python, args):
+        with phase("pip", action=args[0]) as span:
+            result = subprocess.run([str(python), "-m", "pip", *args], capture_output=True, text=True)
+            span.attrs["returncode"] = result.returncode
+            if result.returncode != 0:
+                span.status = "error"
+        return result
+
+    def _touch_used(self, output):
+        # pip reports "Processing <wheelhouse>/<file>.whl" for every wheel it installs from here
+        prefix = str(self.dir)
+        for line in output.splitlines():
+            line = line.strip()
+            if line.startswith("Processing ") and prefix in line:
+                path = line[len("Processing "):].split(" (from", 1)[0].strip()
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+    def _lock(self, shared=False):
+        # Shared with lollmsenv.sh (flock -s for installs)
+        return FileLock(self.dir.parent / "wheels.lock", shared)
+
+    def _resolved_path(self, python, args):
+        # One marker per interpreter (a venv's python resolves to its base) and requirement set, keyed like
+        # lollmsenv.sh: the real interpreter path and the arguments, each NUL-terminated, then the -r files
+        key = hashlib.sha256("".join(f"{part}\0" for part in [os.path.realpath(python), *args]).encode())
+        for i, arg in enumerate(args[:-1]):
+            if arg in ("-r", "--requirement"):
+                try:
+                    with open(args[i + 1], "rb") as f:
+                        key.update(f.read())
+                except OSError:
+                    pass
+        return self.dir.parent / "wheels-resolved" / key.hexdigest()[:32]
+
+    def _resolved(self, python, args):
+        try:
+            return time.time() - self._resolved_path(python, args).stat().st_mtime < self.ttl
+        except FileNotFoundError:
+            return False
+
+    def _install(self, python, args):
+        result = self._pip(python, args)
+        if result.returncode != 0:
+            raise CommandError(result.args, result.returncode, result.stdout, result.stderr,
+                               message=f"Command failed: pip {' '.join(args)}\nError: {result.stderr}")
+        self._touch_used(result.stdout)
+        return result.stdout
+
+    def install(self, python, args):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        local = ["install", "--no-index", "--find-links", str(self.dir), *args]
+        loose = not pinned(args)
+        if self.offline or not loose or self._resolved(python, args):
+            with self._lock(shared=True):
+                result = self._pip(python, local)
+            if result.returncode == 0:
+                self._touch_used(result.stdout)
+                return result.stdout
+            if self.offline:
+                raise LollmsEnvError(f"Offline mode and the wheelhouse cannot satisfy: {' '.join(args)}\n"
+                                     f"Error: {result.stderr}")
+        # Resolved against the index: the newest matching releases land in the wheelhouse and pip takes them there
+        self.fill(python, args)
+        if loose:
+            marker = self._resolved_path(python, args)
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+        with self._lock(shared=True):
+            return self._install(python, local)
+
+    def fill(self, python, args):
+        # Download or build wheels for the requirements and all their dependencies into a private staging directory
+        # (wheels already here are copied, not fetched), then publish the new ones and evict under the exclusive lock
+        args = [a for a in args if a not in _INSTALL_ONLY]
+        self.dir.mkdir(parents=True, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".wheels-", dir=self.dir.parent)
+        try:
+            with self._lock(shared=True):
+                result = self._pip(python, ["wheel", "--wheel-dir", staging, "--find-links", str(self.dir), *args])
+            if result.returncode != 0:
+                raise CommandError(result.args, result.returncode, result.stdout, result.stderr,
+                                   message=f"Command failed: pip wheel {' '.join(args)}\nError: {result.stderr}")
+            with self._lock():
+                for entry in os.scandir(staging):
+                    os.replace(entry.path, self.dir / entry.name)
+                    # Just used: the last candidates for eviction
+                    os.utime(self.dir / entry.name)
+                self.evict()
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return result.stdout
+
+    def prefetch(self, python, requirements_file):
+        if self.offline:
+            raise LollmsEnvError("Cannot prefetch wheels in offline mode")
+        return self.fill(python, ["-r", str(requirements_file)])
+
+    def usage(self):
+        if not self.dir.exists():
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.dir) if entry.is_file())
+
+    def evict(self):
+        if not self.dir.exists():
+            return []
+        entries = sorted((e for e in os.scandir(self.dir) if e.is_file()), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.unlink(entry.path)
+            removed.append(entry.name)
+        return removed
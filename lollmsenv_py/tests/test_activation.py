@@ -0,0 +1,45 @@
+import os
+import time
+
+import pytest
+
+from lollmsenv.activation import Activation
+from lollmsenv.utils import IS_WINDOWS
+
+pytestmark = pytest.mark.skipif(IS_WINDOWS, reason="POSIX venv layout")
+
+
+def program(path):
+    path.write_text("#!/bin/sh\nexit 0\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def activation(tmp_path):
+    (tmp_path / "env" / "bin").mkdir(parents=True)
+    (tmp_path / "base").mkdir()
+    # An env created a while ago
+    past = time.time() - 3600
+    os.utime(tmp_path / "env" / "bin", (past, past))
+    return Activation(tmp_path / "env", tmp_path / "base")
+
+
+def test_misses_are_looked_up_again(activation):
+    assert activation.resolve("lollmsenv-tool") == "lollmsenv-tool"
+    tool = program(activation.bin_dir / "lollmsenv-tool")
+    assert activation.resolve("lollmsenv-tool") == tool
+
+
+def test_hits_are_dropped_once_the_file_is_gone(activation, tmp_path):
+    tool = program(tmp_path / "base" / "lollmsenv-tool")
+    assert activation.resolve("lollmsenv-tool") == tool
+    os.remove(tool)
+    assert activation.resolve("lollmsenv-tool") == "lollmsenv-tool"
+
+
+def test_a_program_installed_into_the_env_takes_precedence(activation, tmp_path):
+    program(tmp_path / "base" / "lollmsenv-tool")
+    activation.resolve("lollmsenv-tool")
+    tool = program(activation.bin_dir / "lollmsenv-tool")
+    assert activation.resolve("lollmsenv-tool") == tool
@@ -0,0 +1,25 @@
+from lollmsenv.bench import compare, stress_registry, timings
+
+
+def suite(**medians):
+    return {"results": {"registry": {name: {"median_ms": ms} for name, ms in medians.items()}, "entries": 10}}
+
+
+def test_timings_flattens_every_median():
+    assert timings(suite(get_env=1.5, envs=3.0)["results"]) == {"registry.get_env": 1.5, "registry.envs": 3.0}
+
+
+def test_compare_flags_only_medians_slower_than_the_tolerance():
+    baseline = suite(get_env=10.0, envs=10.0, list_envs=0.2)
+    current = suite(get_env=11.0, envs=20.0, list_envs=0.6)
+    regressions = compare(current, baseline, tolerance=0.25)
+    # list_envs tripled, but by less than the 1 ms timer-noise floor
+    assert [r["metric"] for r in regressions] == ["registry.envs"]
+    assert regressions[0]["ratio"] == 2.0
+
+
+def test_stress_registry_loses_nothing():
+    result = stress_registry(workers=4, ops=20)
+    assert result["failed_workers"] == 0
+    assert result["lost"] == result["stale"] == 0
+    assert result["text_mirror_consistent"]
@@ -0,0 +1,77 @@
+import pytest
+
+from lollmsenv import engine as engine_module
+from lollmsenv.engine import Engine
+from lollmsenv.exceptions import LollmsEnvError
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = Engine(tmp_path / "home")
+    prefix = engine.python_dir / "3.11.9"
+    (prefix / "bin").mkdir(parents=True)
+    (prefix / "bin" / "python3").write_text("")
+    engine.register_python("3.11.9", prefix)
+    return engine
+
+
+def test_create_bundle_refuses_an_existing_bundle(engine):
+    bundle = engine.bundles_dir / "app"
+    (bundle / "3.11.9").mkdir(parents=True)
+    (bundle / "keep.txt").write_text("working bundle")
+    with pytest.raises(LollmsEnvError, match="Bundle 'app' already exists"):
+        engine.create_bundle("app", "3.11.9", "fresh")
+    assert (bundle / "keep.txt").read_text() == "working bundle"
+
+
+def test_create_bundle_refuses_a_registered_env_name(engine):
+    engine.register_env("taken", engine.envs_dir / "taken", "3.11.9")
+    with pytest.raises(LollmsEnvError, match="Environment 'taken' already exists"):
+        engine.create_bundle("app", "3.11.9", "taken")
+    assert not (engine.bundles_dir / "app").exists()
+
+
+def test_failed_link_removes_only_the_new_bundle(engine, monkeypatch):
+    (engine.bundles_dir / "other").mkdir(parents=True)
+
+    def broken(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(engine_module, "link_tree", broken)
+    with pytest.raises(OSError):
+        engine.create_bundle("app", "3.11.9", "env")
+    assert sorted(p.name for p in engine.bundles_dir.iterdir()) == ["other"]
+
+
+def test_failed_env_creation_removes_the_new_bundle(engine, monkeypatch):
+    def broken(*args, **kwargs):
+        raise LollmsEnvError("venv failed")
+
+    monkeypatch.setattr(engine, "create_env", broken)
+    with pytest.raises(LollmsEnvError, match="venv failed"):
+        engine.create_bundle("app", "3.11.9", "env")
+    assert not (engine.bundles_dir / "app").exists()
+
+
+def test_delete_env_keeps_a_bundle_other_envs_live_in(engine):
+    bundle = engine.bundles_dir / "app"
+    for name in ("api", "worker"):
+        (bundle / "envs" / name).mkdir(parents=True)
+        engine.register_env(name, bundle / "envs" / name, "3.11.9")
+    (bundle / "3.11.9" / "bin").mkdir(parents=True)
+    engine.delete_env("api")
+    assert not (bundle / "envs" / "api").exists()
+    assert (bundle / "envs" / "worker").is_dir() and (bundle / "3.11.9").is_dir()
+    assert set(engine.envs()) == {"worker"}
+    # The last env takes the bundle and its interpreter copy with it
+    engine.delete_env("worker")
+    assert not bundle.exists()
+
+
+def test_delete_env_outside_bundles_leaves_them_alone(engine):
+    (engine.bundles_dir / "app").mkdir(parents=True)
+    (engine.envs_dir / "plain").mkdir(parents=True)
+    engine.register_env("plain", engine.envs_dir / "plain", "3.11.9")
+    engine.delete_env("plain")
+    assert not (engine.envs_dir / "plain").exists()
+    assert (engine.bundles_dir / "app").is_dir()
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import time
+
+import pytest
+
+from lollmsenv.bench import StandInServer
+from lollmsenv.catalog import DEFAULT_TTL, RETRY_AFTER, ReleaseCatalog
+from lollmsenv.exceptions import LollmsEnvError
+
+TRIPLE = "x86_64-unknown-linux-gnu"
+RELEASES = [("3.9.19", "20240415"), ("3.10.14", "20240415"), ("3.11.8", "20240224"), ("3.11.9", "20240224"),
+            ("3.11.9", "20240415"), ("3.12.3", "20240415")]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = ReleaseCatalog(tmp_path, offline=True)
+    catalog.dir.mkdir(parents=True)
+    catalog.index_path.write_text("".join(f"{v}\t{b}\t{TRIPLE}\thttps://example.org/cpython-{v}+{b}.tar.gz\n"
+                                          for v, b in RELEASES))
+    return catalog
+
+
+@pytest.mark.parametrize("spec, version", [
+    ("3.11", "3.11.9"),
+    ("3.11.8", "3.11.8"),
+    ("3.1", None),
+    (">=3.10", "3.12.3"),
+    (">=3.10,<3.12", "3.11.9"),
+    ("~=3.10", "3.12.3"),
+    ("==3.10.*", "3.10.14"),
+    ("!=3.12.3", "3.11.9"),
+    ("<3.9", None),
+])
+def test_find_resolves_versions_and_specs_to_the_newest_match(catalog, spec, version):
+    if version is None:
+        with pytest.raises(LollmsEnvError, match="No compatible Python version"):
+            catalog.find(spec, re.compile(TRIPLE))
+        return
+    entry = catalog.find(spec, re.compile(TRIPLE))
+    assert entry["version"] == version
+    if version == "3.11.9":
+        assert entry["build"] == "20240415"
+
+
+LAST_MODIFIED = "Mon, 15 Apr 2024 00:00:00 GMT"
+
+
+def releases(*assets):
+    return json.dumps([{"assets": [{"browser_download_url": f"https://example.org/download/{asset}"}
+                                   for asset in assets]}]).encode()
+
+
+@pytest.fixture
+def server():
+    body = releases(f"cpython-3.11.9+20240224-{TRIPLE}-install_only.tar.gz",
+                    f"cpython-3.11.9+20240415-{TRIPLE}-install_only.tar.gz",
+                    f"cpython-3.12.3+20240415-{TRIPLE}-install_only.tar.gz",
+                    "cpython-3.12.3+20240415-aarch64-apple-darwin-install_only.tar.gz")
+    with StandInServer({"/releases": body}, last_modified=LAST_MODIFIED) as server:
+        yield server
+
+
+def expire(catalog):
+    past = time.time() - 2 * DEFAULT_TTL
+    os.utime(catalog.index_path, (past, past))
+
+
+def test_refresh_fetches_then_revalidates_with_the_stored_validators(tmp_path, server):
+    catalog = ReleaseCatalog(tmp_path, url=f"{server.url}/releases", offline=False)
+    assert catalog.refresh()
+    # Every build is kept, in the order lollmsenv.sh writes index.txt
+    assert [(e["version"], e["build"], e["triple"]) for e in catalog.entries()] == [
+        ("3.11.9", "20240224", TRIPLE), ("3.11.9", "20240415", TRIPLE),
+        ("3.12.3", "20240415", "aarch64-apple-darwin"), ("3.12.3", "20240415", TRIPLE)]
+    assert catalog.find("3.11", re.compile(TRIPLE))["build"] == "20240415"
+    assert (catalog.dir / "last-modified").read_text().strip() == LAST_MODIFIED
+
+    # Within the TTL nothing is requested
+    assert not catalog.refresh()
+    assert len(server.requests) == 1
+
+    # Once it expires, a conditional GET: 304 keeps the index and restarts the TTL
+    expire(catalog)
+    assert not catalog.refresh()
+    _, headers = server.requests[-1]
+    assert headers["If-None-Match"] == (catalog.dir / "etag").read_text().strip()
+    assert headers["If-Modified-Since"] == LAST_MODIFIED
+    assert time.time() - catalog.index_path.stat().st_mtime < 60
+    assert len(catalog.entries()) == 4
+
+    # A changed release list is fetched again in full
+    server.files["/releases"] = releases(f"cpython-3.13.0+20241008-{TRIPLE}-install_only.tar.gz")
+    server.last_modified = None
+    expire(catalog)
+    assert catalog.refresh()
+    assert [e["version"] for e in catalog.entries()] == ["3.13.0"]
+
+
+def test_failed_refresh_backs_off_on_the_cached_index(tmp_path, server):
+    catalog = ReleaseCatalog(tmp_path, url=f"{server.url}/releases", offline=False)
+    catalog.refresh()
+    expire(catalog)
+    del server.files["/releases"]
+    assert not catalog.refresh()
+    assert len(server.requests) == 2
+    # The failure is remembered: later calls use the stale index without going back to the network
+    for _ in range(3):
+        assert len(catalog.entries()) == 4
+    assert len(server.requests) == 2
+
+    # Past the retry delay the API is tried again, and a success clears the failure
+    past = time.time() - RETRY_AFTER - 1
+    os.utime(catalog.dir / "failed", (past, past))
+    server.files["/releases"] = releases(f"cpython-3.13.0+20241008-{TRIPLE}-install_only.tar.gz")
+    server.last_modified = None
+    assert catalog.refresh()
+    assert len(server.requests) == 3
+    assert not (catalog.dir / "failed").exists()
+
+
+def test_failed_first_fetch_raises(tmp_path, server):
+    catalog = ReleaseCatalog(tmp_path, url=f"{server.url}/missing", offline=False)
+    with pytest.raises(LollmsEnvError, match="HTTP 404"):
+        catalog.refresh()
+    with pytest.raises(LollmsEnvError, match="HTTP 404"):
+        catalog.refresh()
+    assert len(server.requests) == 2
+
+
+def test_offline_uses_the_cached_index_even_when_expired(tmp_path, server):
+    ReleaseCatalog(tmp_path, url=f"{server.url}/releases", offline=False).refresh()
+    catalog = ReleaseCatalog(tmp_path, url=f"{server.url}/releases", offline=True)
+    expire(catalog)
+    assert [e["version"] for e in catalog.for_platform(re.compile(TRIPLE))] == ["3.11.9", "3.11.9", "3.12.3"]
+    assert len(server.requests) == 1
+    with pytest.raises(LollmsEnvError, match="Offline mode"):
+        ReleaseCatalog(tmp_path / "empty", url=f"{server.url}/releases", offline=True).refresh()
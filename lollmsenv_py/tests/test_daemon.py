@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from lollmsenv.core import LollmsEnv
+from lollmsenv.daemon import MUTATIONS, READS, Daemon
+from lollmsenv.exceptions import LollmsEnvError
+
+# One call per method LollmsEnv sends to the daemon, with arguments that fail fast (or do nothing) on an empty home
+CALLS = {
+    "install_python": ("0.0.1",),
+    "create_env": ("missing", "0.0.1"),
+    "create_envs": ([],),
+    "install_packages": ("missing", ["requests"]),
+    "_install_package": ("requests", "missing"),
+    "list_pythons": (),
+    "list_envs": (),
+    "list_packages": ("missing",),
+    "sync_env": ("missing", "missing-lock.txt"),
+    "prefetch": ("missing-requirements.txt",),
+    "discover_pythons": ("0.0.1",),
+    "list_available_pythons": (),
+    "create_bundle": ("bundle", "0.0.1", "missing"),
+    "export_bundle": ("missing", "missing.tar.gz"),
+    "import_bundle": ("missing.tar.gz",),
+    "disk_usage": (),
+    "du": (),
+    "gc": (True,),
+    "metrics": (),
+    "delete_env": ("missing",),
+    "delete_python": ("0.0.1",),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.methods = []
+
+    def call(self, method, *args, **kwargs):
+        self.methods.append(method)
+
+
+def remote_methods():
+    return sorted(name for name, fn in vars(LollmsEnv).items() if hasattr(fn, "__wrapped__"))
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    # A real daemon on a short socket path (AF_UNIX paths are limited to ~100 bytes)
+    monkeypatch.setenv("LOLLMSENV_OFFLINE", "1")
+    run_dir = tempfile.mkdtemp(prefix="lollmsenv-", dir="/tmp")
+    monkeypatch.setenv("LOLLMSENV_SOCKET", os.path.join(run_dir, "s.sock"))
+    daemon = Daemon(tmp_path / "home")
+    daemon._bind()
+    thread = threading.Thread(target=daemon.server.serve_forever, daemon=True)
+    thread.start()
+    yield tmp_path / "home"
+    daemon.shutdown()
+    daemon.server.server_close()
+    shutil.rmtree(run_dir)
+
+
+def test_every_remote_method_is_covered():
+    assert sorted(CALLS) == remote_methods()
+
+
+def test_remote_names_are_served(tmp_path):
+    recorder = Recorder()
+    api = LollmsEnv(tmp_path / "home", daemon=recorder)
+    for name in remote_methods():
+        getattr(api, name)(*CALLS[name])
+    assert len(recorder.methods) == len(CALLS)
+    assert all(not method.startswith("_") for method in recorder.methods)
+    assert set(recorder.methods) <= set(READS) | set(MUTATIONS)
+
+
+@pytest.mark.parametrize("name", sorted(CALLS))
+def test_every_remote_method_reaches_the_daemon(served, name):
+    api = LollmsEnv(served)
+    assert api.daemon is not None
+    try:
+        getattr(api, name)(*CALLS[name])
+    except LollmsEnvError as e:
+        assert "Unknown daemon method" not in str(e)
+    # Still connected: the call was answered by the daemon, not run in-process after a fallback
+    assert api.daemon is not None
+
+
+def test_install_package_with_an_env_goes_through_the_daemon(served):
+    with pytest.raises(LollmsEnvError, match="Environment 'missing' not found"):
+        LollmsEnv(served).install_package("requests", "missing")
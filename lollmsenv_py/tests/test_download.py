@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from lollmsenv.bench import StandInServer
+from lollmsenv.download import MIN_CHUNK_SIZE, ChunkedDownloader
+from lollmsenv.exceptions import LollmsEnvError
+
+CHUNK = 1024 * 1024
+# Large enough for a chunked download (start() streams anything under two MIN_CHUNK_SIZE in one request)
+PAYLOAD = os.urandom(2 * MIN_CHUNK_SIZE + CHUNK // 2)
+
+
+def ranges(server):
+    # Ranges requested for the archive, the one-byte probe left out
+    found = []
+    for path, headers in server.requests:
+        value = headers.get("Range")
+        if path == "/archive.tar.gz" and value and value != "bytes=0-0":
+            start, end = value[len("bytes="):].split("-")
+            found.append((int(start), int(end) if end else len(PAYLOAD) - 1))
+    return found
+
+
+def test_chunk_cut_off_midway_is_retried_from_where_it_stopped(tmp_path):
+    with StandInServer({"/archive.tar.gz": PAYLOAD}) as server:
+        server.drop = {2: CHUNK // 2}
+        dest = tmp_path / "archive.tar.gz"
+        ChunkedDownloader(connections=4, chunk_size=CHUNK).download(f"{server.url}/archive.tar.gz", str(dest))
+    assert dest.read_bytes() == PAYLOAD
+    assert any(start % CHUNK == CHUNK // 2 for start, _ in ranges(server))
+    assert not os.path.exists(f"{dest}.chunks")
+
+
+def test_interrupted_download_resumes_from_the_chunks_file(tmp_path):
+    dest = tmp_path / "archive.tar.gz"
+    with StandInServer({"/archive.tar.gz": PAYLOAD}) as server:
+        server.drop = {2: CHUNK // 2}
+        with pytest.raises(LollmsEnvError, match="failed after 0 retries"):
+            ChunkedDownloader(connections=2, chunk_size=CHUNK, retries=0).download(
+                f"{server.url}/archive.tar.gz", str(dest))
+        assert os.path.exists(f"{dest}.chunks")
+
+        server.requests.clear()
+        server.drop.clear()
+        ChunkedDownloader(connections=2, chunk_size=CHUNK).download(f"{server.url}/archive.tar.gz", str(dest))
+    assert dest.read_bytes() == PAYLOAD
+    # Only what the first attempt had not written is fetched again
+    assert sum(end - start + 1 for start, end in ranges(server)) <= len(PAYLOAD) - CHUNK // 2
+    assert not os.path.exists(f"{dest}.chunks")
+
+
+def test_server_without_ranges_gets_one_stream_fetched_again_when_cut_off(tmp_path):
+    with StandInServer({"/archive.tar.gz": PAYLOAD}, ranges=False) as server:
+        server.drop = {2: 3 * CHUNK}
+        dest = tmp_path / "archive.tar.gz"
+        ChunkedDownloader(connections=4, chunk_size=CHUNK).download(f"{server.url}/archive.tar.gz", str(dest))
+    assert dest.read_bytes() == PAYLOAD
+    # The probe, the stream that was cut off and the full one that replaced it
+    assert len(server.requests) == 3
+    assert not os.path.exists(f"{dest}.chunks")
+
+
+def test_single_stream_resumes_with_a_range_request(tmp_path):
+    payload = PAYLOAD[:3 * CHUNK]
+    with StandInServer({"/archive.tar.gz": payload}) as server:
+        server.drop = {2: CHUNK}
+        dest = tmp_path / "archive.tar.gz"
+        ChunkedDownloader(connections=4).download(f"{server.url}/archive.tar.gz", str(dest))
+    assert dest.read_bytes() == payload
+    assert [headers.get("Range") for _, headers in server.requests] == ["bytes=0-0", None, f"bytes={CHUNK}-"]
+
+
+def test_single_stream_gives_up_after_its_retries(tmp_path):
+    with StandInServer({"/archive.tar.gz": PAYLOAD[:CHUNK]}, ranges=False) as server:
+        server.drop = {2: CHUNK // 2}
+        with pytest.raises(LollmsEnvError, match="after 0 retries"):
+            ChunkedDownloader(retries=0).download(f"{server.url}/archive.tar.gz", str(tmp_path / "archive.tar.gz"))
@@ -0,0 +1,66 @@
+import io
+import tarfile
+import threading
+
+from lollmsenv import engine as engine_module
+from lollmsenv.engine import Engine
+
+
+def python_archive():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for name, data in (("python/bin/python3", b"#!/bin/sh\n"), ("python/lib/os.py", b"x" * 4096)):
+            info = tarfile.TarInfo(name)
+            info.size, info.mode = len(data), 0o755
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def offline_engine(home, monkeypatch, barrier=None):
+    # Catalog, download and pip bootstrap stubbed out: only staging, rename and registration run for real
+    engine = Engine(home)
+    archive = python_archive()
+    engine.catalog.find = lambda version: {"version": "3.11.9", "url": "https://example.org/cpython-3.11.9.tar.gz"}
+
+    def fetch(url, consume, progress=None):
+        if barrier is not None:
+            barrier.wait()
+        consume(io.BytesIO(archive))
+
+    engine.archives.fetch_streaming = fetch
+    engine.wheelhouse.install = lambda python, args: ""
+    monkeypatch.setattr(engine_module, "run_command", lambda cmd: "")
+    return engine
+
+
+def test_concurrent_installs_of_one_version_do_not_share_a_staging_dir(tmp_path, monkeypatch):
+    engine = offline_engine(tmp_path / "home", monkeypatch, threading.Barrier(4))
+    results, errors = [], []
+
+    def install():
+        try:
+            results.append(engine.install_python("3.11"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=install) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    target = engine.python_dir / "3.11.9"
+    assert results == [target] * 4
+    assert (target / "bin" / "python3").read_bytes() == b"#!/bin/sh\n"
+    assert (target / "lib" / "os.py").stat().st_size == 4096
+    assert sorted(p.name for p in engine.python_dir.iterdir() if p.is_dir()) == ["3.11.9"]
+    assert engine.pythons() == {"3.11.9": str(target)}
+
+
+def test_an_extracted_but_unregistered_install_gets_registered(tmp_path, monkeypatch):
+    engine = offline_engine(tmp_path / "home", monkeypatch)
+    custom = tmp_path / "custom" / "3.11.9"
+    (custom / "bin").mkdir(parents=True)
+    (custom / "bin" / "python3").write_text("")
+    assert engine.install_python("3.11", tmp_path / "custom") == custom
+    assert engine.pythons() == {"3.11.9": str(custom)}
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import io
+import tarfile
+
+import pytest
+
+from lollmsenv.engine import Engine
+from lollmsenv.exceptions import LollmsEnvError
+from lollmsenv.packing import FORMAT_VERSION
+
+
+def make_archive(path, rows, objects=(), name="evil", root="/old/bundles/evil"):
+    manifest = [f"lollmsenv-bundle\t{FORMAT_VERSION}", f"root\t{root}", f"name\t{name}"] + rows
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for member, data in [("manifest.txt", "".join(f"{line}\n" for line in manifest).encode())] + \
+                [(f"objects/{hashlib.sha256(data).hexdigest()}", data) for data in objects]:
+            info = tarfile.TarInfo(member)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    path.write_bytes(gzip.compress(buf.getvalue()))
+    return path
+
+
+def file_row(rel, data):
+    return f"file\t{hashlib.sha256(data).hexdigest()}\t644\t{len(data)}\t0\t{rel}"
+
+
+@pytest.mark.parametrize("row", [
+    file_row("../../outside.txt", b"x"),
+    file_row("/tmp/absolute.txt", b"x"),
+    file_row("bin/../../../outside.txt", b"x"),
+    "dir\t755\t../escape",
+    "link\t../escape\t/etc",
+    "env\tevil-env\t../../envs/evil",
+    "python\t../python",
+])
+def test_import_rejects_paths_outside_the_bundle(tmp_path, row):
+    engine = Engine(tmp_path / "home")
+    archive = make_archive(tmp_path / "evil.tar.gz", [row], [b"x"])
+    with pytest.raises(LollmsEnvError, match="Unsafe"):
+        engine.import_bundle(archive)
+    assert not (tmp_path / "outside.txt").exists()
+    assert not (tmp_path / "home" / "outside.txt").exists()
+    assert not (tmp_path / "home" / "bundles" / "evil").exists()
+
+
+@pytest.mark.parametrize("name", ["..", "../evil", "a/b"])
+def test_import_rejects_bundle_names_that_are_paths(tmp_path, name):
+    engine = Engine(tmp_path / "home")
+    archive = make_archive(tmp_path / "evil.tar.gz", [], name=name)
+    with pytest.raises(LollmsEnvError, match="Invalid bundle name"):
+        engine.import_bundle(archive)
+    with pytest.raises(LollmsEnvError, match="Invalid bundle name"):
+        engine.import_bundle(make_archive(tmp_path / "ok.tar.gz", []), name=name)
+
+
+def test_import_refuses_to_write_through_a_symlink(tmp_path):
+    engine = Engine(tmp_path / "home")
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    rows = [f"link\tlib\t{outside}", "link\tlib/evil\t/etc"]
+    with pytest.raises(LollmsEnvError, match="outside the bundle"):
+        engine.import_bundle(make_archive(tmp_path / "evil.tar.gz", rows))
+    assert list(outside.iterdir()) == []
+
+
+def test_import_places_files_of_a_well_formed_archive(tmp_path):
+    engine = Engine(tmp_path / "home")
+    rows = ["dir\t755\tbin", file_row("bin/tool", b"hello")]
+    bundle = engine.import_bundle(make_archive(tmp_path / "ok.tar.gz", rows, [b"hello"]))
+    assert (bundle / "bin" / "tool").read_bytes() == b"hello"
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from lollmsenv.registry import Registry, split_entry
+
+REPO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKERS = 6
+SHELL_WORKERS = 3
+ROUNDS = 25
+
+
+def churn(home, worker):
+    # Adds ROUNDS envs and pythons, removing every other one again, from two threads of this process
+    registry = Registry(home)
+
+    def envs():
+        for i in range(ROUNDS):
+            registry.add_env(f"env-{worker}-{i}", os.path.join(home, "envs", f"env-{worker}-{i}"), "3.11.9")
+            if i % 2:
+                assert registry.remove_env(f"env-{worker}-{i}")
+
+    def pythons():
+        for i in range(ROUNDS):
+            registry.add_python(f"3.{worker}.{i}", os.path.join(home, "pythons", f"3.{worker}.{i}"))
+            if i % 2:
+                assert registry.remove_python(f"3.{worker}.{i}")
+
+    threads = [threading.Thread(target=envs), threading.Thread(target=pythons)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def mirror(path):
+    with open(path) as f:
+        return [split_entry(line.strip()) for line in f if line.strip()]
+
+
+def test_concurrent_writers_keep_sqlite_and_the_text_mirrors_in_agreement(tmp_path):
+    home = str(tmp_path)
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=churn, args=(home, worker)) for worker in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(120)
+    assert [process.exitcode for process in processes] == [0] * WORKERS
+
+    registry = Registry(home)
+    kept = range(0, ROUNDS, 2)
+    assert set(registry.envs()) == {f"env-{w}-{i}" for w in range(WORKERS) for i in kept}
+    assert set(registry.pythons()) == {f"3.{w}.{i}" for w in range(WORKERS) for i in kept}
+
+    # The mirrors the shell front-end reads hold exactly what SQLite holds
+    envs = mirror(registry.envs_file)
+    assert len(envs) == len({name for name, _, _ in envs})
+    assert {name: {"path": path, "python": python} for name, path, python in envs} == registry.envs()
+    assert dict(mirror(registry.pythons_file)) == registry.pythons()
+
+    # And a registry rebuilt from the mirrors alone sees the same entries
+    envs, pythons = registry.envs(), registry.pythons()
+    registry._local.db.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(registry.db_path + suffix):
+            os.remove(registry.db_path + suffix)
+    rebuilt = Registry(home)
+    assert rebuilt.envs() == envs
+    assert rebuilt.pythons() == pythons
+
+
+FAKE_PYTHON = """#!/bin/sh
+# Just enough of an interpreter for lollmsenv.sh create-env: venv copies itself, pip succeeds with nothing to do
+if [ "$1" = "-m" ] && [ "$2" = "venv" ]; then
+    mkdir -p "$3/bin" && cp "$0" "$3/bin/python"
+fi
+exit 0
+"""
+
+
+def shell_churn(home, worker):
+    # The same pattern as churn() for envs, through the shell front-end's create-env / delete-env
+    script = os.path.join(home, "src", "lollmsenv.sh")
+    env = dict(os.environ, LOLLMSENV_VENV_TEMPLATES="0", LOLLMSENV_EVENT_LOG="")
+    for i in range(ROUNDS // 2):
+        name = f"sh-{worker}-{i}"
+        subprocess.run(["bash", script, "create-env", name, "3.11.9"], env=env, check=True, capture_output=True)
+        if i % 2:
+            subprocess.run(["bash", script, "delete-env", name], env=env, check=True, capture_output=True)
+
+
+@pytest.mark.skipif(shutil.which("bash") is None or shutil.which("flock") is None, reason="needs bash and flock")
+def test_shell_and_python_writers_share_the_registry(tmp_path):
+    home = str(tmp_path)
+    os.makedirs(os.path.join(home, "src"))
+    shutil.copy(os.path.join(REPO, "src", "lollmsenv.sh"), os.path.join(home, "src", "lollmsenv.sh"))
+    prefix = os.path.join(home, "pythons", "3.11.9")
+    os.makedirs(os.path.join(prefix, "bin"))
+    with open(os.path.join(prefix, "bin", "python3"), "w") as f:
+        f.write(FAKE_PYTHON)
+    os.chmod(os.path.join(prefix, "bin", "python3"), 0o755)
+    Registry(home).add_python("3.11.9", prefix)
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=churn, args=(home, worker)) for worker in range(SHELL_WORKERS)]
+    threads = [threading.Thread(target=shell_churn, args=(home, worker)) for worker in range(SHELL_WORKERS)]
+    for worker in processes + threads:
+        worker.start()
+    for thread in threads:
+        thread.join(300)
+    for process in processes:
+        process.join(120)
+    assert [process.exitcode for process in processes] == [0] * SHELL_WORKERS
+    assert not any(thread.is_alive() for thread in threads)
+
+    registry = Registry(home)
+    kept = range(0, ROUNDS, 2)
+    assert set(registry.envs()) == (
+        {f"env-{w}-{i}" for w in range(SHELL_WORKERS) for i in kept}
+        | {f"sh-{w}-{i}" for w in range(SHELL_WORKERS) for i in range(0, ROUNDS // 2, 2)}
+    )
+    assert set(registry.pythons()) == {"3.11.9"} | {f"3.{w}.{i}" for w in range(SHELL_WORKERS) for i in kept}
+    envs = mirror(registry.envs_file)
+    assert {name: {"path": path, "python": python} for name, path, python in envs} == registry.envs()
+    assert len(envs) == len(registry.envs())
+    assert dict(mirror(registry.pythons_file)) == registry.pythons()
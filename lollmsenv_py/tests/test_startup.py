@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from lollmsenv.bench import EAGER, STARTUP_BUDGET_MS, make_home
+
+HEAVY = ("lollmsenv.daemon", "lollmsenv.packing", "lollmsenv.download") + EAGER
+ENV = dict(os.environ, LOLLMSENV_DAEMON="0",
+           PYTHONPATH=os.pathsep.join(filter(None, [str(Path(__file__).resolve().parents[1]),
+                                                    os.environ.get("PYTHONPATH")])))
+
+
+def run(*args, **env):
+    return subprocess.run([sys.executable, *args], env=dict(ENV, **env), check=True, capture_output=True, text=True)
+
+
+def loaded(code, **env):
+    return set(run("-c", f"{code}\nimport sys\nprint('\\n'.join(sys.modules))", **env).stdout.split())
+
+
+def test_bare_import_loads_nothing_heavy():
+    assert loaded("import lollmsenv") & set(HEAVY) == set()
+
+
+def test_list_envs_reads_the_registry_without_the_engine(tmp_path):
+    code = "from lollmsenv.cli import main\nmain(['list-envs'])"
+    assert loaded(code, LOLLMSENV_DIR=str(tmp_path)) & set(HEAVY) == set()
+
+
+def test_list_envs_runs_within_budget(tmp_path):
+    # End to end as a job launcher calls it: a fresh `python -m lollmsenv list-envs` over a populated home
+    home = str(make_home(tmp_path, 100))
+    # The first call imports the text registries into registry.db
+    assert "env99:" in run("-m", "lollmsenv", "list-envs", LOLLMSENV_DIR=home).stdout
+
+    # -X importtime lists every module the command imported, one "self | cumulative | name" line each
+    lines = run("-X", "importtime", "-m", "lollmsenv", "list-envs", LOLLMSENV_DIR=home).stderr.splitlines()
+    imported = {line.split("|")[-1].strip() for line in lines if line.startswith("import time:")}
+    assert "lollmsenv.registry" in imported
+    assert imported & {"lollmsenv.engine", "lollmsenv.catalog", *HEAVY} == set()
+
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        run("-m", "lollmsenv", "list-envs", LOLLMSENV_DIR=home)
+        samples.append((time.perf_counter() - start) * 1000)
+    assert min(samples) <= STARTUP_BUDGET_MS, f"list-envs took {min(samples):.1f} ms (budget {STARTUP_BUDGET_MS} ms)"
@@ -0,0 +1,25 @@
+import threading
+
+from lollmsenv.utils import atomic_write_text
+
+
+def test_atomic_write_text_from_many_threads(tmp_path):
+    path = tmp_path / "index.txt"
+    contents = [f"{i}\n" * (1000 + i) for i in range(8)]
+    errors = []
+
+    def write(text):
+        try:
+            for _ in range(100):
+                atomic_write_text(path, text)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(text,)) for text in contents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert path.read_text() in contents
+    assert [p.name for p in tmp_path.iterdir()] == ["index.txt"]
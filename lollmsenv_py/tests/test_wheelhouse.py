@@ -0,0 +1,138 @@
+import shutil
+import stat
+import threading
+
+import pytest
+
+from lollmsenv.exceptions import CommandError
+from lollmsenv.wheelhouse import Wheelhouse, pinned
+
+
+@pytest.mark.parametrize("args, expected", [
+    (["requests==2.31.0"], True),
+    (["requests[socks]==2.31.0", "--upgrade", "idna==3.6; python_version >= '3.8'"], True),
+    (["requests"], False),
+    (["--upgrade", "pip"], False),
+    (["requests>=2.31"], False),
+    (["requests==2.*"], False),
+    (["requests==2.31.0", "idna"], False),
+    ([], False),
+])
+def test_pinned(args, expected):
+    assert pinned(args) is expected
+
+
+def test_pinned_reads_requirement_files_but_not_constraints(tmp_path):
+    lock = tmp_path / "requirements.txt"
+    lock.write_text("# pip-compile output\n--extra-index-url https://example.org\n"
+                    "requests==2.31.0 \\\n    --hash=sha256:abc \\\n    --hash=sha256:def\nidna==3.6  # via requests\n")
+    loose = tmp_path / "constraints.txt"
+    loose.write_text("idna>=3\n")
+    assert pinned(["-r", str(lock), "-c", str(loose)])
+    assert not pinned(["-r", str(loose)])
+    assert not pinned(["-r", str(tmp_path / "missing.txt")])
+
+
+@pytest.fixture
+def fake_python(tmp_path):
+    # Records each pip command line (the staging directory of `pip wheel` as STAGING, where it drops a wheel);
+    # exits with the next status in statuses (0 once they run out). While pip "runs" it records whether the
+    # wheelhouse lock is free (unlocked) or held exclusively (exclusive) instead of shared.
+    def make(*statuses):
+        (tmp_path / "statuses").write_text("".join(f"{s}\n" for s in statuses))
+        python = tmp_path / "python"
+        python.write_text(f"""#!/bin/sh
+shift 2
+LOCK={tmp_path}/home/cache/wheels.lock
+if command -v flock > /dev/null; then
+    flock -n "$LOCK" true && echo unlocked >> {tmp_path}/calls
+    flock -n -s "$LOCK" true || echo exclusive >> {tmp_path}/calls
+fi
+if [ "$1" = wheel ]; then
+    touch "$3/requests-2.31.0-py3-none-any.whl"
+    echo "$*" | sed "s#$3#STAGING#" >> {tmp_path}/calls
+else
+    echo "$*" >> {tmp_path}/calls
+fi
+STATUS=$(head -n 1 {tmp_path}/statuses)
+sed -i 1d {tmp_path}/statuses
+exit ${{STATUS:-0}}
+""")
+        python.chmod(python.stat().st_mode | stat.S_IEXEC)
+        return python
+    return make
+
+
+def calls(tmp_path):
+    return (tmp_path / "calls").read_text().splitlines()
+
+
+def test_loose_requirements_are_resolved_against_the_index_once_per_ttl(tmp_path, fake_python):
+    wheelhouse = Wheelhouse(tmp_path / "home", offline=False)
+    python = fake_python()
+    wheelhouse.install(python, ["requests"])
+    local = f"install --no-index --find-links {wheelhouse.dir} requests"
+    assert calls(tmp_path) == [f"wheel --wheel-dir STAGING --find-links {wheelhouse.dir} requests", local]
+    # The resolved set was published to the wheelhouse, and the next install of it stays off the index
+    assert [p.name for p in wheelhouse.dir.iterdir()] == ["requests-2.31.0-py3-none-any.whl"]
+    wheelhouse.install(python, ["requests"])
+    assert calls(tmp_path)[2:] == [local]
+
+
+def test_loose_requirements_are_resolved_again_once_the_ttl_expires(tmp_path, fake_python):
+    wheelhouse = Wheelhouse(tmp_path / "home", offline=False, ttl=0)
+    python = fake_python()
+    wheelhouse.install(python, ["requests"])
+    wheelhouse.install(python, ["requests"])
+    assert [line.split()[0] for line in calls(tmp_path)] == ["wheel", "install", "wheel", "install"]
+
+
+def test_pinned_requirements_use_the_wheelhouse_alone(tmp_path, fake_python):
+    wheelhouse = Wheelhouse(tmp_path / "home", offline=False)
+    wheelhouse.install(fake_python(), ["requests==2.31.0"])
+    assert calls(tmp_path) == [f"install --no-index --find-links {wheelhouse.dir} requests==2.31.0"]
+
+
+def test_pinned_requirements_fill_the_wheelhouse_when_it_misses(tmp_path, fake_python):
+    wheelhouse = Wheelhouse(tmp_path / "home", offline=False)
+    wheelhouse.install(fake_python(1), ["requests==2.31.0"])
+    assert calls(tmp_path) == [
+        f"install --no-index --find-links {wheelhouse.dir} requests==2.31.0",
+        f"wheel --wheel-dir STAGING --find-links {wheelhouse.dir} requests==2.31.0",
+        f"install --no-index --find-links {wheelhouse.dir} requests==2.31.0",
+    ]
+
+
+def test_offline_installs_never_reach_the_index(tmp_path, fake_python):
+    wheelhouse = Wheelhouse(tmp_path / "home", offline=True)
+    wheelhouse.install(fake_python(), ["requests"])
+    assert calls(tmp_path) == [f"install --no-index --find-links {wheelhouse.dir} requests"]
+
+
+def test_failed_resolution_raises(tmp_path, fake_python):
+    with pytest.raises(CommandError):
+        Wheelhouse(tmp_path / "home", offline=False).install(fake_python(1), ["requests"])
+    assert not (tmp_path / "home" / "cache" / "wheels-resolved").exists()
+
+
+@pytest.mark.skipif(not shutil.which("flock"), reason="needs flock(1)")
+def test_installs_share_the_wheelhouse_lock(tmp_path, fake_python):
+    # Held by every pip run, but shared: installs in other envs and processes do not wait for each other
+    wheelhouse = Wheelhouse(tmp_path / "home", offline=False)
+    wheelhouse.install(fake_python(1), ["requests==2.31.0"])
+    wheelhouse.install(fake_python(), ["idna"])
+    assert "unlocked" not in calls(tmp_path)
+    assert "exclusive" not in calls(tmp_path)
+
+
+def test_installs_run_in_parallel(tmp_path):
+    python = tmp_path / "python"
+    python.write_text(f"#!/bin/sh\necho start >> {tmp_path}/calls\nsleep 0.3\necho end >> {tmp_path}/calls\n")
+    python.chmod(python.stat().st_mode | stat.S_IEXEC)
+    wheelhouse = Wheelhouse(tmp_path / "home", offline=True)
+    threads = [threading.Thread(target=wheelhouse.install, args=(python, [f"pkg{i}==1.0"])) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls(tmp_path) == ["start", "start", "end", "end"]
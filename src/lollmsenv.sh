@@ -4,23 +4,170 @@
 # Licensed under the Apache License, Version 2.0
 # Built by ParisNeo using Lollms
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" &> /dev/null && pwd)"
-LOLLMS_HOME="$(dirname "$SCRIPT_DIR")"
+LOLLMS_HOME="${SCRIPT_DIR%/*}"
 PYTHON_DIR="$LOLLMS_HOME/pythons"
 ENVS_DIR="$LOLLMS_HOME/envs"
 BUNDLES_DIR="$LOLLMS_HOME/bundles"
 TEMP_DIR="/tmp/lollmsenv"
-mkdir -p "$PYTHON_DIR" "$ENVS_DIR" "$BUNDLES_DIR" "$TEMP_DIR"
+# Test first: `run` is on the hot path of job launchers and should not fork mkdir every time
+[ -d "$PYTHON_DIR" ] && [ -d "$ENVS_DIR" ] && [ -d "$BUNDLES_DIR" ] && [ -d "$TEMP_DIR" ] ||
+    mkdir -p "$PYTHON_DIR" "$ENVS_DIR" "$BUNDLES_DIR" "$TEMP_DIR"
+# Structured event log shared with the Python package (lollmsenv/telemetry.py): one JSON object per line, a "span"
+# event when an operation or one of its phases ends and a "log" event per message. LOLLMSENV_EVENT_LOG="" disables
+# it; LOLLMSENV_LOG_FORMAT=json prints messages as the same JSON objects instead of text.
+EVENT_LOG="${LOLLMSENV_EVENT_LOG-$LOLLMS_HOME/logs/events.jsonl}"
+EVENT_LOG_MB=${LOLLMSENV_EVENT_LOG_MB:-16}
+[ -z "$EVENT_LOG" ] || [[ "$EVENT_LOG" != */* ]] || [ -d "${EVENT_LOG%/*}" ] || mkdir -p "${EVENT_LOG%/*}"
+SPAN_NAMES=() SPAN_IDS=() SPAN_STARTS=() SPAN_ATTRS=()
+SPAN_SEQ=0
+now_us() {
+    # Microseconds since the epoch in NOW_US, without forking on bash 5
+    if [ -n "$EPOCHREALTIME" ]; then
+        NOW_US=${EPOCHREALTIME/[.,]/}
+    else
+        NOW_US=$(date +%s%N)
+        case $NOW_US in *N) NOW_US=${NOW_US%N}000000000 ;; esac
+        NOW_US=$(( NOW_US / 1000 ))
+    fi
+}
+json_escape() {
+    JSON=${1//\\/\\\\}
+    JSON=${JSON//\"/\\\"}
+    JSON=${JSON//$'\t'/\\t}
+    JSON=${JSON//$'\r'/\\r}
+    JSON=${JSON//$'\n'/\\n}
+}
+emit_event() {
+    [ -n "$EVENT_LOG" ] && printf '%s\n' "$1" >> "$EVENT_LOG" 2>/dev/null
+    return 0
+}
+log_event() {
+    local LEVEL=$1 MSG=$2 EVENT
+    now_us
+    json_escape "$MSG"
+    printf -v EVENT '{"ts":%d.%06d,"pid":%d,"event":"log","level":"%s","msg":"%s"}' \
+        $(( NOW_US / 1000000 )) $(( NOW_US % 1000000 )) $$ "$LEVEL" "$JSON"
+    emit_event "$EVENT"
+    if [ "$LOLLMSENV_LOG_FORMAT" == "json" ]; then
+        echo "$EVENT"
+    elif [ "$LEVEL" == "error" ]; then
+        echo "[$(date +'%Y-%m-%d %H:%M:%S')] ERROR: $MSG"
+    else
+        echo "[$(date +'%Y-%m-%d %H:%M:%S')] $MSG"
+    fi
+}
+span_begin() {
+    # span_begin NAME [KEY VALUE]...: nested spans are named after their parents (install_python/download)
+    local NAME=$1 ATTRS=
+    shift
+    while [ $# -ge 2 ]; do
+        json_escape "$2"
+        ATTRS="$ATTRS${ATTRS:+,}\"$1\":\"$JSON\""
+        shift 2
+    done
+    local DEPTH=${#SPAN_NAMES[@]}
+    if [ $DEPTH -gt 0 ]; then
+        NAME="${SPAN_NAMES[$(( DEPTH - 1 ))]}/$NAME"
+    elif [ -n "$EVENT_LOG" ] && [ -f "$EVENT_LOG" ] && [ $(wc -c < "$EVENT_LOG") -gt $(( EVENT_LOG_MB * 1024 * 1024 )) ]; then
+        mv -f "$EVENT_LOG" "$EVENT_LOG.1"
+    fi
+    SPAN_SEQ=$(( SPAN_SEQ + 1 ))
+    now_us
+    SPAN_NAMES[$DEPTH]=$NAME
+    SPAN_IDS[$DEPTH]="${BASHPID:-$$}.$SPAN_SEQ"
+    SPAN_STARTS[$DEPTH]=$NOW_US
+    SPAN_ATTRS[$DEPTH]=$ATTRS
+}
+span_end() {
+    # span_end [ok|error|EXIT_STATUS]
+    local STATUS=${1:-ok} EVENT PARENT=null
+    case $STATUS in
+        0) STATUS=ok ;;
+        [1-9]*) STATUS=error ;;
+    esac
+    local I=$(( ${#SPAN_NAMES[@]} - 1 ))
+    [ $I -ge 0 ] || return 0
+    now_us
+    local START=${SPAN_STARTS[$I]}
+    local DURATION=$(( NOW_US - START ))
+    [ $I -gt 0 ] && PARENT="\"${SPAN_IDS[$(( I - 1 ))]}\""
+    printf -v EVENT '{"ts":%d.%06d,"pid":%d,"event":"span","name":"%s","id":"%s","parent":%s,"duration":%d.%06d,"status":"%s","attrs":{%s}}' \
+        $(( START / 1000000 )) $(( START % 1000000 )) $$ "${SPAN_NAMES[$I]}" "${SPAN_IDS[$I]}" "$PARENT" \
+        $(( DURATION / 1000000 )) $(( DURATION % 1000000 )) "$STATUS" "${SPAN_ATTRS[$I]}"
+    emit_event "$EVENT"
+    unset "SPAN_NAMES[$I]" "SPAN_IDS[$I]" "SPAN_STARTS[$I]" "SPAN_ATTRS[$I]"
+}
+traced() {
+    # traced NAME [KEY VALUE]... -- COMMAND...: run COMMAND in a span, its exit status deciding ok/error
+    local NAME=$1 STATUS
+    shift
+    local -a ATTRS=()
+    while [ $# -gt 0 ] && [ "$1" != "--" ]; do
+        ATTRS+=("$1")
+        shift
+    done
+    shift
+    span_begin "$NAME" "${ATTRS[@]}"
+    "$@"
+    STATUS=$?
+    span_end $STATUS
+    return $STATUS
+}
 log() {
-    echo "[$(date +'%Y-%m-%d %H:%M:%S')] $1"
+    log_event info "$1"
 }
 error() {
-    log "ERROR: $1" >&2
+    log_event error "$1" >&2
+    # Every span this shell still has open failed with this error. Spans a $(...) subshell inherited belong to
+    # the parent (their id starts with its pid), which closes them when it handles the failure.
+    while [ ${#SPAN_NAMES[@]} -gt 0 ] && [ "${SPAN_IDS[$(( ${#SPAN_NAMES[@]} - 1 ))]%%.*}" == "${BASHPID:-$$}" ]; do
+        span_end error
+    done
     exit 1
 }
 cleanup() {
     log "Cleaning up temporary files..."
     rm -rf "$TEMP_DIR"
 }
+# Registry helpers: exact key matches, mutations under the lock shared with the Python registry
+REGISTRY_LOCK="$LOLLMS_HOME/registry.lock"
+with_lock() {
+    local LOCK_FILE=$1
+    shift
+    if command -v flock &> /dev/null; then
+        ( flock 9; "$@" ) 9>"$LOCK_FILE"
+    else
+        "$@"
+    fi
+}
+with_shared_lock() {
+    # Any number of shared holders, excluded only by with_lock on the same file
+    local LOCK_FILE=$1
+    shift
+    if command -v flock &> /dev/null; then
+        ( flock -s 9; "$@" ) 9>"$LOCK_FILE"
+    else
+        "$@"
+    fi
+}
+with_registry_lock() {
+    with_lock "$REGISTRY_LOCK" "$@"
+}
+registry_get() {
+    local FILE=$1 KEY=$2 FIELD=$3
+    [ -f "$FILE" ] || return 0
+    awk -F: -v key="$KEY" -v field="$FIELD" '$1 == key { print $field; exit }' "$FILE"
+}
+registry_append() {
+    echo "$2" >> "$1"
+}
+registry_remove() {
+    local FILE=$1 KEY=$2
+    local TMP="$FILE.$$.tmp"
+    # Nothing to rewrite (and no new signature for the Python registry to re-import) when the key is absent
+    [ -n "$(registry_get "$FILE" "$KEY" 1)" ] || return 0
+    awk -F: -v key="$KEY" '$1 != key' "$FILE" > "$TMP" && mv "$TMP" "$FILE"
+}
 get_platform_info() {
     local OS=$(uname -s | tr '[:upper:]' '[:lower:]')
     local ARCH=$(uname -m)
@@ -41,15 +188,66 @@ get_platform_info() {
             ;;
     esac
 }
+RELEASE_URL="${LOLLMSENV_RELEASES_URL:-https://api.github.com/repos/indygreg/python-build-standalone/releases}"
+CATALOG_DIR="$LOLLMS_HOME/cache/releases"
+CATALOG_INDEX="$CATALOG_DIR/index.txt"
+CATALOG_TTL="${LOLLMSENV_CATALOG_TTL:-3600}"
+CATALOG_RETRY=300
+# Release catalog shared with the Python package: index.txt holds "version<TAB>build<TAB>triple<TAB>url"
+# lines, its mtime is the last fetch, etag/last-modified are the validators for conditional refreshes and the
+# mtime of "failed" the last refresh that fell back to the cached index (retried after min(TTL, CATALOG_RETRY)).
+refresh_catalog() {
+    mkdir -p "$CATALOG_DIR"
+    if [ -f "$CATALOG_INDEX" ]; then
+        [ -n "$LOLLMSENV_OFFLINE" ] && return 0
+        local MTIME=$(stat -c %Y "$CATALOG_INDEX" 2>/dev/null || stat -f %m "$CATALOG_INDEX")
+        local NOW=$(date +%s)
+        [ $(( NOW - MTIME )) -lt "$CATALOG_TTL" ] && return 0
+        if [ -f "$CATALOG_DIR/failed" ]; then
+            local FAILED=$(stat -c %Y "$CATALOG_DIR/failed" 2>/dev/null || stat -f %m "$CATALOG_DIR/failed")
+            local RETRY=$(( CATALOG_RETRY < CATALOG_TTL ? CATALOG_RETRY : CATALOG_TTL ))
+            [ $(( NOW - FAILED )) -lt "$RETRY" ] && return 0
+        fi
+    elif [ -n "$LOLLMSENV_OFFLINE" ]; then
+        error "Offline mode and no cached release catalog in $CATALOG_DIR"
+    fi
+    local BODY="$CATALOG_DIR/releases.$$.json"
+    local HEADERS="$CATALOG_DIR/headers.$$"
+    local CONDITIONAL=()
+    if [ -f "$CATALOG_INDEX" ]; then
+        [ -s "$CATALOG_DIR/etag" ] && CONDITIONAL+=(-H "If-None-Match: $(cat "$CATALOG_DIR/etag")")
+        [ -s "$CATALOG_DIR/last-modified" ] && CONDITIONAL+=(-H "If-Modified-Since: $(cat "$CATALOG_DIR/last-modified")")
+    fi
+    local SEPARATOR="?"
+    [[ "$RELEASE_URL" == *\?* ]] && SEPARATOR="&"
+    local STATUS=$(curl -s -D "$HEADERS" -o "$BODY" -w '%{http_code}' "${CONDITIONAL[@]}" "$RELEASE_URL${SEPARATOR}per_page=100")
+    case $STATUS in
+        304)
+            touch "$CATALOG_INDEX"
+            rm -f "$CATALOG_DIR/failed"
+            ;;
+        200)
+            grep -oP '"browser_download_url":\s*"\K[^"]+/cpython-[0-9.]+\+[0-9]+-[^"]+-install_only\.tar\.gz(?=")' "$BODY" |
+            sed -E 's#^.*/cpython-([0-9]+\.[0-9]+\.[0-9]+)\+([0-9]+)-(.+)-install_only\.tar\.gz$#\1\t\2\t\3\t&#' |
+            sort -u -t $'\t' -k1,1V -k3,3 -k2,2n > "$CATALOG_INDEX.$$.tmp" && mv "$CATALOG_INDEX.$$.tmp" "$CATALOG_INDEX"
+            grep -i '^etag:' "$HEADERS" | sed -E 's/^[^:]+:[[:space:]]*//' | tr -d '\r' > "$CATALOG_DIR/etag"
+            grep -i '^last-modified:' "$HEADERS" | sed -E 's/^[^:]+:[[:space:]]*//' | tr -d '\r' > "$CATALOG_DIR/last-modified"
+            rm -f "$CATALOG_DIR/failed"
+            ;;
+        *)
+            rm -f "$BODY" "$HEADERS"
+            [ -f "$CATALOG_INDEX" ] || error "Failed to fetch release catalog from $RELEASE_URL (HTTP $STATUS)"
+            touch "$CATALOG_DIR/failed"
+            log "Release catalog refresh failed (HTTP $STATUS), using cached index"
+            ;;
+    esac
+    rm -f "$BODY" "$HEADERS"
+}
 list_available_pythons() {
-    local RELEASE_URL="https://api.github.com/repos/indygreg/python-build-standalone/releases"
     local PLATFORM=$(get_platform_info)
     log "Fetching available Python versions for $PLATFORM..."
-    
-    curl -s "$RELEASE_URL" | 
-    grep -oP "cpython-\d+\.\d+\.\d+" | 
-    sed 's/cpython-//' | 
-    sort -u -V
+    refresh_catalog
+    awk -F'\t' -v plat="^$PLATFORM\$" '$3 ~ plat { print $1 }' "$CATALOG_INDEX" | sort -u -V
 }
 urlencode() {
     local string="${1}"
@@ -70,24 +268,22 @@ urlencode() {
 get_python_url() {
     local VERSION=$1
     local PLATFORM=$(get_platform_info)
-    local RELEASE_URL="https://api.github.com/repos/indygreg/python-build-standalone/releases"
     
     # Split the version into major, minor, and patch
     IFS='.' read -r MAJOR_VERSION MINOR_VERSION PATCH_VERSION <<< "$VERSION"
    
-    local VERSION_PATTERN="cpython-$MAJOR_VERSION\.$MINOR_VERSION"
+    local VERSION_PATTERN="^$MAJOR_VERSION\\.$MINOR_VERSION"
     if [ -n "$PATCH_VERSION" ]; then
-        VERSION_PATTERN="$VERSION_PATTERN\.$PATCH_VERSION"
+        VERSION_PATTERN="$VERSION_PATTERN\\.$PATCH_VERSION\$"
     else
-        VERSION_PATTERN="$VERSION_PATTERN\.[0-9]+"
+        VERSION_PATTERN="$VERSION_PATTERN\\.[0-9]+\$"
     fi
     
-    local ASSET_INFO=$(curl -s "$RELEASE_URL" | 
-                       grep -oP "\"browser_download_url\": \"https://github.com/indygreg/python-build-standalone/releases/download/[^\"]+/$VERSION_PATTERN[^\"]+${PLATFORM}[^\"]*\.tar\.gz\"" | 
-                       sort -V | 
-                       tail -n 1 | 
-                       sed 's/"browser_download_url": "//' | 
-                       sed 's/"//')
+    refresh_catalog >&2
+    local ASSET_INFO=$(awk -F'\t' -v ver="$VERSION_PATTERN" -v plat="^$PLATFORM\$" '$1 ~ ver && $3 ~ plat' "$CATALOG_INDEX" |
+                       sort -t $'\t' -k1,1V -k2,2n |
+                       tail -n 1 |
+                       cut -f4)
     
     if [ -z "$ASSET_INFO" ]; then
         log "No compatible Python version found for $MAJOR_VERSION.$MINOR_VERSION${PATCH_VERSION:+.$PATCH_VERSION} on $PLATFORM"
@@ -105,22 +301,57 @@ get_python_url() {
 
 
 
+# Interpreters already on this machine (PATH, pyenv, asdf, conda, LOLLMSENV_PYTHON_ROOTS), used by create-env before
+# giving up. Each binary is run once: cache/interpreters.txt keeps "path|mtime:inode|version|prefix" and an entry is
+# reused while the binary's mtime and inode are unchanged.
+INTERPRETER_CACHE="$LOLLMS_HOME/cache/interpreters.txt"
+file_stamp() {
+    stat -L -c '%Y:%i' "$1" 2>/dev/null || stat -L -f '%m:%i' "$1" 2>/dev/null
+}
+interpreter_candidates() {
+    local DIR ROOT EXE
+    local -a DIRS ROOTS
+    IFS=: read -ra DIRS <<< "${LOLLMSENV_PYTHON_ROOTS:-}"
+    for ROOT in "${DIRS[@]}"; do
+        ROOTS+=("$ROOT" "$ROOT"/*)
+    done
+    ROOTS+=("${PYENV_ROOT:-$HOME/.pyenv}"/versions/* "${ASDF_DATA_DIR:-$HOME/.asdf}"/installs/python/*)
+    for ROOT in "$HOME/anaconda3" "$HOME/miniconda3" "$HOME/miniforge3" "$HOME/mambaforge" /opt/conda; do
+        ROOTS+=("$ROOT" "$ROOT"/envs/*)
+    done
+    for ROOT in "${ROOTS[@]}"; do
+        [ -x "$ROOT/bin/python3" ] && echo "$ROOT/bin/python3"
+    done
+    IFS=: read -ra DIRS <<< "$PATH"
+    for DIR in "${DIRS[@]}"; do
+        # pyenv/asdf shims pick a version at run time; their targets are listed above
+        [ "${DIR##*/}" == "shims" ] && continue
+        for EXE in "$DIR"/python3 "$DIR"/python3.[0-9] "$DIR"/python3.[0-9][0-9]; do
+            [ -f "$EXE" ] && [ -x "$EXE" ] && echo "$EXE"
+        done
+    done
+}
+cache_interpreter() {
+    local TMP="$INTERPRETER_CACHE.$$.tmp"
+    { awk -F'|' -v exe="$1" '$1 != exe' "$INTERPRETER_CACHE" 2>/dev/null; echo "$1|$2|$3"; } > "$TMP" && mv "$TMP" "$INTERPRETER_CACHE"
+}
 scan_for_python() {
+    # -> "interpreter|prefix" of the newest discovered interpreter matching VERSION ("3.11" or "3.11.7")
     local VERSION=$1
-    local LOCATIONS=(
-        "/usr/bin/python$VERSION"
-        "/usr/local/bin/python$VERSION"
-        "$HOME/.pyenv/versions/$VERSION/bin/python"
-        "$HOME/anaconda3/envs/py$VERSION/bin/python"
-        "$HOME/miniconda3/envs/py$VERSION/bin/python"
-    )
-    for loc in "${LOCATIONS[@]}"; do
-        if [ -x "$loc" ]; then
-            echo "$loc"
-            return 0
+    local EXE STAMP INFO
+    mkdir -p "${INTERPRETER_CACHE%/*}"
+    while read -r EXE; do
+        STAMP=$(file_stamp "$EXE") || continue
+        INFO=$(awk -F'|' -v exe="$EXE" -v stamp="$STAMP" '$1 == exe && $2 == stamp { print $3 "|" $4; exit }' "$INTERPRETER_CACHE" 2>/dev/null)
+        if [ -z "$INFO" ]; then
+            # Virtual envs report no prefix and are skipped: new envs are based on the real interpreter
+            INFO=$("$EXE" -c 'import sys; print("%d.%d.%d|%s" % (sys.version_info[:3] + ("" if sys.prefix != sys.base_prefix else sys.base_prefix,)))' 2>/dev/null) || INFO="|"
+            with_lock "$INTERPRETER_CACHE.lock" cache_interpreter "$EXE" "$STAMP" "$INFO"
         fi
-    done
-    return 1
+        case "${INFO%%|*}" in
+            "$VERSION"|"$VERSION".*) [ -n "${INFO#*|}" ] && echo "${INFO%%|*}|$EXE|${INFO#*|}" ;;
+        esac
+    done < <(interpreter_candidates) | sort -t'|' -s -k1,1Vr | head -n 1 | cut -d'|' -f2-
 }
 
 urldecode() {
@@ -128,6 +359,206 @@ urldecode() {
     printf '%b' "${url_encoded//%/\\x}"
 }
 
+# Content-addressed archive cache shared with the Python package: objects/<sha256> are verified archives,
+# index.txt maps "asset name<TAB>sha256", partial/ keeps interrupted downloads for resuming.
+ARCHIVE_CACHE="$LOLLMS_HOME/cache/archives"
+ARCHIVE_CACHE_MB="${LOLLMSENV_ARCHIVE_CACHE_MB:-2048}"
+sha256_of() {
+    if command -v sha256sum &> /dev/null; then
+        sha256sum "$1" | cut -d' ' -f1
+    else
+        shasum -a 256 "$1" | cut -d' ' -f1
+    fi
+}
+archive_index_append() {
+    printf '%s\t%s\n' "$1" "$2" >> "$ARCHIVE_CACHE/index.txt"
+}
+evict_archives() {
+    local KEEP=$1
+    local LIMIT=$(( ARCHIVE_CACHE_MB * 1024 * 1024 ))
+    local TOTAL=0 OBJ
+    for OBJ in "$ARCHIVE_CACHE"/objects/*; do
+        [ -f "$OBJ" ] && TOTAL=$(( TOTAL + $(wc -c < "$OBJ") ))
+    done
+    # Least recently used first: hits touch the object
+    for OBJ in $(ls -tr "$ARCHIVE_CACHE/objects"); do
+        [ "$TOTAL" -le "$LIMIT" ] && break
+        [ "$ARCHIVE_CACHE/objects/$OBJ" == "$KEEP" ] && continue
+        TOTAL=$(( TOTAL - $(wc -c < "$ARCHIVE_CACHE/objects/$OBJ") ))
+        rm -f "$ARCHIVE_CACHE/objects/$OBJ"
+    done
+}
+fetch_archive() {
+    local URL=$1
+    local NAME=$(basename "$URL")
+    mkdir -p "$ARCHIVE_CACHE/objects" "$ARCHIVE_CACHE/partial"
+    local DIGEST=$(awk -F'\t' -v name="$NAME" '$1 == name { digest = $2 } END { print digest }' "$ARCHIVE_CACHE/index.txt" 2>/dev/null)
+    if [ -n "$DIGEST" ] && [ -f "$ARCHIVE_CACHE/objects/$DIGEST" ]; then
+        log "Using cached archive $NAME" >&2
+        touch "$ARCHIVE_CACHE/objects/$DIGEST"
+        echo "$ARCHIVE_CACHE/objects/$DIGEST"
+        return 0
+    fi
+    [ -n "$LOLLMSENV_OFFLINE" ] && error "Offline mode and $NAME is not in the archive cache"
+    
+    local PARTIAL="$ARCHIVE_CACHE/partial/$NAME"
+    local EXPECTED=$(curl -sfL "$URL.sha256" | awk '{ print $1 }')
+    [ -z "$EXPECTED" ] && log "No published checksum found for $NAME, caching it unverified" >&2
+    log "Attempting to download to: $PARTIAL" >&2
+    
+    wget --no-check-certificate -c -q --show-progress --progress=bar:force:noscroll "$URL" -O "$PARTIAL" >&2 || {
+        log "Wget failed. Trying curl..." >&2
+        curl -L -C - "$URL" -o "$PARTIAL" >&2 || error "Both wget and curl failed to download $NAME"
+    }
+    
+    DIGEST=$(sha256_of "$PARTIAL")
+    if [ -n "$EXPECTED" ] && [ "$DIGEST" != "$EXPECTED" ]; then
+        rm -f "$PARTIAL"
+        error "Checksum mismatch for $NAME: expected $EXPECTED, got $DIGEST"
+    fi
+    mv "$PARTIAL" "$ARCHIVE_CACHE/objects/$DIGEST"
+    with_lock "$ARCHIVE_CACHE/index.lock" archive_index_append "$NAME" "$DIGEST"
+    evict_archives "$ARCHIVE_CACHE/objects/$DIGEST"
+    echo "$ARCHIVE_CACHE/objects/$DIGEST"
+}
+
+# Shared wheelhouse (also used by the Python package): exactly pinned installs resolve against it alone first and
+# fill it only when that fails; looser ones are resolved against the index with `pip wheel` once per
+# LOLLMSENV_WHEELHOUSE_TTL seconds, which publishes the resolved set here for the installs that follow.
+# Installs hold wheels.lock shared, publishing and eviction exclusively.
+WHEELHOUSE="$LOLLMS_HOME/cache/wheels"
+WHEELHOUSE_LOCK="$LOLLMS_HOME/cache/wheels.lock"
+WHEELHOUSE_MB="${LOLLMSENV_WHEELHOUSE_MB:-4096}"
+WHEELHOUSE_TTL="${LOLLMSENV_WHEELHOUSE_TTL:-3600}"
+evict_wheels() {
+    local LIMIT=$(( WHEELHOUSE_MB * 1024 * 1024 ))
+    local TOTAL=0 WHL
+    for WHL in "$WHEELHOUSE"/*; do
+        [ -f "$WHL" ] && TOTAL=$(( TOTAL + $(wc -c < "$WHL") ))
+    done
+    for WHL in $(ls -tr "$WHEELHOUSE"); do
+        [ "$TOTAL" -le "$LIMIT" ] && break
+        TOTAL=$(( TOTAL - $(wc -c < "$WHEELHOUSE/$WHL") ))
+        rm -f "$WHEELHOUSE/$WHL"
+    done
+}
+publish_wheels() {
+    local WHL
+    for WHL in "$1"/*; do
+        [ -f "$WHL" ] || continue
+        # Just used: the last candidates for eviction
+        mv -f "$WHL" "$WHEELHOUSE/" && touch "$WHEELHOUSE/${WHL##*/}"
+    done
+    evict_wheels
+}
+fill_wheelhouse() {
+    # pip wheel into a private staging directory (wheels already here are copied, not fetched), then publish
+    local PY=$1
+    shift
+    local ARGS=() ARG STAGING STATUS
+    for ARG in "$@"; do
+        case $ARG in
+            --upgrade|-U|--force-reinstall|--no-deps|--user) ;;
+            *) ARGS+=("$ARG") ;;
+        esac
+    done
+    mkdir -p "$WHEELHOUSE"
+    STAGING=$(mktemp -d "$LOLLMS_HOME/cache/.wheels-XXXXXX") || return 1
+    with_shared_lock "$WHEELHOUSE_LOCK" traced pip action wheel -- \
+        "$PY" -m pip wheel --wheel-dir "$STAGING" --find-links "$WHEELHOUSE" "${ARGS[@]}" &&
+        with_lock "$WHEELHOUSE_LOCK" publish_wheels "$STAGING"
+    STATUS=$?
+    rm -rf "$STAGING"
+    return $STATUS
+}
+wheelhouse_pinned() {
+    # True when every requirement, -r files included, names one exact version (name==1.2.3): only then can the
+    # wheelhouse answer without the index. Constraints (-c) are not requirements.
+    local ARG NEXT= FILES=() REQS=()
+    for ARG in "$@"; do
+        case $NEXT in
+            r) FILES+=("$ARG"); NEXT=; continue ;;
+            c) NEXT=; continue ;;
+        esac
+        case $ARG in
+            -r|--requirement) NEXT=r ;;
+            -c|--constraint) NEXT=c ;;
+            -*) ;;
+            *) REQS+=("$ARG") ;;
+        esac
+    done
+    { printf '%s\n' "${REQS[@]}"; [ ${#FILES[@]} -eq 0 ] || cat "${FILES[@]}" || echo "-r"; } 2> /dev/null | awk '
+        { sub(/ #.*/, ""); gsub(/[ \t]+--hash[= ][^ \t]+/, ""); sub(/[ \t\\]+$/, ""); sub(/^[ \t]+/, "") }
+        $0 == "" || /^#/ || (/^-/ && $0 != "-r") { next }
+        { n++ }
+        !/^[A-Za-z0-9][A-Za-z0-9._-]*(\[[A-Za-z0-9,._ -]*\])?[ \t]*===?[ \t]*[^ \t,;*]+[ \t]*(;.*)?$/ { loose = 1; exit }
+        END { exit loose || !n }'
+}
+wheelhouse_marker() {
+    # Marker of a resolved loose requirement set, keyed like the Python package: the interpreter's real path and
+    # the arguments, each NUL-terminated, then the contents of the -r files
+    local PY=$1 ARG NEXT= FILES=()
+    shift
+    for ARG in "$@"; do
+        [ "$NEXT" == r ] && FILES+=("$ARG")
+        NEXT=
+        case $ARG in -r|--requirement) NEXT=r ;; esac
+    done
+    PY=$(canonical_path "$(command -v "$PY" || echo "$PY")")
+    local SHA="sha256sum"
+    command -v sha256sum &> /dev/null || SHA="shasum -a 256"
+    local KEY=$({ printf '%s\0' "$PY" "$@"; [ ${#FILES[@]} -eq 0 ] || cat "${FILES[@]}" 2> /dev/null; } | $SHA | cut -c1-32)
+    echo "$LOLLMS_HOME/cache/wheels-resolved/$KEY"
+}
+wheelhouse_install() {
+    local PY=$1
+    shift
+    mkdir -p "$WHEELHOUSE"
+    local MARK=
+    wheelhouse_pinned "$@" || MARK=$(wheelhouse_marker "$PY" "$@")
+    if [ -n "$LOLLMSENV_OFFLINE" ] || [ -z "$MARK" ] ||
+            [ -n "$(find "$MARK" -maxdepth 0 -mmin "-$(( (WHEELHOUSE_TTL + 59) / 60 ))" 2> /dev/null)" ]; then
+        with_shared_lock "$WHEELHOUSE_LOCK" pip_install "$PY" --no-index --find-links "$WHEELHOUSE" "$@" && return 0
+        if [ -n "$LOLLMSENV_OFFLINE" ]; then
+            log "Offline mode and the wheelhouse cannot satisfy: $*" >&2
+            return 1
+        fi
+    fi
+    # Resolved against the index: the newest matching releases land in the wheelhouse and pip takes them there
+    fill_wheelhouse "$PY" "$@" || return 1
+    [ -z "$MARK" ] || { mkdir -p "${MARK%/*}"; touch "$MARK"; }
+    with_shared_lock "$WHEELHOUSE_LOCK" pip_install "$PY" --no-index --find-links "$WHEELHOUSE" "$@"
+}
+pip_install() {
+    local PY=$1 STATUS
+    shift
+    span_begin pip action install
+    # pip reports "Processing <wheelhouse>/<file>.whl" per wheel it installs: touch those for the LRU order
+    ( set -o pipefail
+      "$PY" -m pip install "$@" | while IFS= read -r LINE; do
+          echo "$LINE"
+          case $LINE in
+              "Processing $WHEELHOUSE/"*) LINE=${LINE#Processing }; touch "${LINE%% (from*}" ;;
+          esac
+      done )
+    STATUS=$?
+    span_end $STATUS
+    return $STATUS
+}
+prefetch() {
+    local REQUIREMENTS=$1
+    local VERSION=$2
+    [ -f "$REQUIREMENTS" ] || error "Usage: prefetch <requirements-file> [python-version]"
+    [ -n "$LOLLMSENV_OFFLINE" ] && error "Cannot prefetch wheels in offline mode"
+    if [ -z "$VERSION" ]; then
+        VERSION=$(cut -d: -f1 "$PYTHON_DIR/installed_pythons.txt" 2> /dev/null | sort -V | tail -n 1)
+    fi
+    local PY="$(registry_get "$PYTHON_DIR/installed_pythons.txt" "$VERSION" 2)/bin/python3"
+    [ -n "$VERSION" ] && [ -f "$PY" ] || error "Python ${VERSION:-interpreter} is not installed"
+    log "Prefetching wheels for Python $VERSION from $REQUIREMENTS into $WHEELHOUSE"
+    fill_wheelhouse "$PY" -r "$REQUIREMENTS" || error "Failed to prefetch wheels"
+    log "Wheelhouse now holds $(ls "$WHEELHOUSE" | wc -l) files"
+}
 install_python() {
     local VERSION=$1
     local CUSTOM_DIR=$2
@@ -147,7 +578,9 @@ install_python() {
         error "TEMP_DIR ($TEMP_DIR) is not writable. Please check permissions."
     fi
     
+    span_begin catalog
     local ENCODED_URL=$(get_python_url "$VERSION")
+    span_end
 
     echo "$ENCODED_URL"
     
@@ -166,48 +599,108 @@ install_python() {
     
     if [ -d "$TARGET_DIR" ]; then
         log "Target directory $TARGET_DIR already exists. Skipping installation."
+        # Registered if an earlier install was interrupted before, or custom_dir put it outside the registry
+        if [ -x "$TARGET_DIR/bin/python3" ] &&
+                [ "$(registry_get "$PYTHON_DIR/installed_pythons.txt" "$ACTUAL_VERSION" 2)" != "$TARGET_DIR" ]; then
+            with_registry_lock registry_remove "$PYTHON_DIR/installed_pythons.txt" "$ACTUAL_VERSION"
+            with_registry_lock registry_append "$PYTHON_DIR/installed_pythons.txt" "$ACTUAL_VERSION:$TARGET_DIR"
+        fi
         return 0
     fi
     
     mkdir -p "$TARGET_DIR" || error "Failed to create directory $TARGET_DIR"
     
-    local ARCHIVE="$TEMP_DIR/python-$ACTUAL_VERSION.tar.gz"
-    log "Attempting to download to: $ARCHIVE"
-    
-    wget --no-check-certificate -q --show-progress --progress=bar:force:noscroll "$URL" -O "$ARCHIVE" || {
-        log "Wget failed. Trying curl..."
-        curl -L "$URL" -o "$ARCHIVE" || error "Both wget and curl failed to download Python $ACTUAL_VERSION"
-    }
+    local ARCHIVE
+    span_begin download url "$URL"
+    ARCHIVE=$(fetch_archive "$URL") || { rmdir "$TARGET_DIR"; error "Failed to download Python $ACTUAL_VERSION"; }
+    span_end
     
     log "Extracting Python $ACTUAL_VERSION to $TARGET_DIR"
+    span_begin extract
     tar -xzf "$ARCHIVE" -C "$TARGET_DIR" --strip-components=1 || error "Failed to extract Python $ACTUAL_VERSION"
+    span_end
     
     if [ ! -f "$TARGET_DIR/bin/python3" ]; then
         error "Python binary not found after extraction. Installation failed."
     fi
     
     log "Ensuring pip and venv are installed"
-    "$TARGET_DIR/bin/python3" -m ensurepip --upgrade || error "Failed to ensure pip is installed"
-    "$TARGET_DIR/bin/python3" -m pip install --upgrade pip || error "Failed to upgrade pip"
-    "$TARGET_DIR/bin/python3" -m pip install virtualenv || error "Failed to install virtualenv"
+    traced ensurepip -- "$TARGET_DIR/bin/python3" -m ensurepip --upgrade || error "Failed to ensure pip is installed"
+    # Offline with a cold wheelhouse, the ensurepip-bundled pip is good enough
+    wheelhouse_install "$TARGET_DIR/bin/python3" --upgrade pip || [ -n "$LOLLMSENV_OFFLINE" ] || error "Failed to upgrade pip"
+    wheelhouse_install "$TARGET_DIR/bin/python3" virtualenv || [ -n "$LOLLMSENV_OFFLINE" ] || error "Failed to install virtualenv"
     
-    echo "$ACTUAL_VERSION:$TARGET_DIR" >> "$PYTHON_DIR/installed_pythons.txt"
+    with_registry_lock registry_append "$PYTHON_DIR/installed_pythons.txt" "$ACTUAL_VERSION:$TARGET_DIR"
     log "Python $ACTUAL_VERSION installed successfully with pip and venv in $TARGET_DIR"
 }
 
 
+# Golden venv per interpreter, shared with the Python package: templates/<sha256(interpreter)[:16]>
+TEMPLATES_DIR="$LOLLMS_HOME/templates"
+template_dir() {
+    local KEY
+    if command -v sha256sum &> /dev/null; then
+        KEY=$(printf '%s' "$1" | sha256sum | cut -c1-16)
+    else
+        KEY=$(printf '%s' "$1" | shasum -a 256 | cut -c1-16)
+    fi
+    echo "$TEMPLATES_DIR/$KEY"
+}
+build_template() {
+    local PYTHON_PATH=$1 TEMPLATE=$2
+    [ -f "$TEMPLATE/.lollmsenv-template" ] && return 0
+    rm -rf "$TEMPLATE"
+    log "Building venv template for $PYTHON_PATH"
+    span_begin template interpreter "$PYTHON_PATH"
+    traced venv -- "$PYTHON_PATH" -m venv "$TEMPLATE" &&
+        wheelhouse_install "$TEMPLATE/bin/python" --upgrade pip &&
+        wheelhouse_install "$TEMPLATE/bin/python" wheel setuptools &&
+        echo "$PYTHON_PATH" > "$TEMPLATE/.lollmsenv-template"
+    local STATUS=$?
+    span_end $STATUS
+    return $STATUS
+}
+clone_template() {
+    local TEMPLATE=$1 ENV_PATH=$2
+    # Hardlink everything, then give the files that embed the venv path their own rewritten copy
+    cp -al "$TEMPLATE" "$ENV_PATH" 2>/dev/null || cp -a "$TEMPLATE" "$ENV_PATH" || return 1
+    rm -f "$ENV_PATH/.lollmsenv-template"
+    find "$ENV_PATH" -name __pycache__ -type d -prune -exec rm -rf {} +
+    local FILE
+    for FILE in "$ENV_PATH"/bin/* "$ENV_PATH/pyvenv.cfg"; do
+        if [ -f "$FILE" ] && [ ! -L "$FILE" ] && grep -qF "$TEMPLATE" "$FILE"; then
+            sed "s#$TEMPLATE#$ENV_PATH#g" "$FILE" > "$FILE.$$.tmp"
+            chmod "$(stat -c %a "$FILE" 2>/dev/null || stat -f %Lp "$FILE")" "$FILE.$$.tmp"
+            mv "$FILE.$$.tmp" "$FILE"
+        fi
+    done
+}
 create_env() {
     local ENV_NAME=$1
     local PYTHON_VERSION=$2
     local CUSTOM_DIR=$3
     
-    local PYTHON_PATH=$(grep "^$PYTHON_VERSION:" "$PYTHON_DIR/installed_pythons.txt" | cut -d':' -f2)/bin/python3
+    local PYTHON_PREFIX=$(registry_get "$PYTHON_DIR/installed_pythons.txt" "$PYTHON_VERSION" 2)
+    local PYTHON_PATH=${BUNDLE_PYTHON:-${PYTHON_PREFIX:+$PYTHON_PREFIX/bin/python3}}
+    local PYTHON_INFO=$PYTHON_VERSION
+
+    if [ -z "$BUNDLE_PYTHON" ] && [ ! -f "$PYTHON_PATH" ]; then
+        # Not managed by lollmsenv: use an interpreter already on this machine, recorded by its prefix like bundles
+        local FOUND=$(scan_for_python "$PYTHON_VERSION")
+        if [ -n "$FOUND" ]; then
+            PYTHON_PATH=${FOUND%%|*}
+            PYTHON_INFO=${FOUND#*|}
+        fi
+    fi
 
     echo "Using Python: $PYTHON_PATH"
     
     if [ ! -f "$PYTHON_PATH" ]; then
         error "Python $PYTHON_VERSION is not installed"
     fi
+    if [ -n "$(registry_get "$ENVS_DIR/installed_envs.txt" "$ENV_NAME" 1)" ]; then
+        error "Environment '$ENV_NAME' already exists"
+    fi
     
     if [ -z "$CUSTOM_DIR" ]; then
         ENV_PATH="$ENVS_DIR/$ENV_NAME"
@@ -216,57 +709,77 @@ create_env() {
     fi
     
     log "Creating virtual environment '$ENV_NAME' with Python $PYTHON_VERSION in $ENV_PATH"
-    "$PYTHON_PATH" -m venv "$ENV_PATH" || error "Failed to create virtual environment"
+    if [ "${LOLLMSENV_VENV_TEMPLATES:-1}" != "0" ]; then
+        local TEMPLATE=$(template_dir "$PYTHON_PATH")
+        mkdir -p "$TEMPLATES_DIR"
+        with_lock "$TEMPLATE.lock" build_template "$PYTHON_PATH" "$TEMPLATE" || error "Failed to build the venv template"
+        traced clone -- clone_template "$TEMPLATE" "$ENV_PATH" || { rm -rf "$ENV_PATH"; error "Failed to create virtual environment"; }
+    else
+        traced venv -- "$PYTHON_PATH" -m venv "$ENV_PATH" || error "Failed to create virtual environment"
+        wheelhouse_install "$ENV_PATH/bin/python" --upgrade pip
+        wheelhouse_install "$ENV_PATH/bin/python" wheel setuptools
+    fi
     
-    echo "$ENV_NAME:$ENV_PATH:$PYTHON_VERSION" >> "$ENVS_DIR/installed_envs.txt"
+    with_registry_lock registry_append "$ENVS_DIR/installed_envs.txt" "$ENV_NAME:$ENV_PATH:$PYTHON_INFO"
     log "Environment '$ENV_NAME' created successfully"
-    
-    # Activate the new environment and install basic packages
-    source "$ENV_PATH/bin/activate"
-    pip install --upgrade pip
-    pip install wheel setuptools
-    deactivate
+}
+# Activation record per env: line 1 the env path, line 2 the interpreter's bin dir.
+# Rebuilt only when a registry file is newer, so `run` resolves an env with two `read` builtins and no fork.
+ACTIVATION_DIR="$LOLLMS_HOME/cache/activation"
+resolve_activation() {
+    local ENV_NAME=$1
+    local RECORD="$ACTIVATION_DIR/$ENV_NAME"
+    if [ -f "$RECORD" ] && [ "$RECORD" -nt "$ENVS_DIR/installed_envs.txt" ] && [ ! "$PYTHON_DIR/installed_pythons.txt" -nt "$RECORD" ]; then
+        { read -r ACT_ENV_PATH; read -r ACT_PYTHON_BIN; } < "$RECORD"
+        return 0
+    fi
+    ACT_ENV_PATH=$(registry_get "$ENVS_DIR/installed_envs.txt" "$ENV_NAME" 2)
+    [ -n "$ACT_ENV_PATH" ] || return 1
+    local PYTHON_INFO=$(registry_get "$ENVS_DIR/installed_envs.txt" "$ENV_NAME" 3)
+    # The third field is a registered version, or a full interpreter path for bundles
+    if [[ "$PYTHON_INFO" == /* ]]; then
+        ACT_PYTHON_BIN="$PYTHON_INFO/bin"
+    else
+        local PREFIX=$(registry_get "$PYTHON_DIR/installed_pythons.txt" "$PYTHON_INFO" 2)
+        ACT_PYTHON_BIN="${PREFIX:-$PYTHON_DIR/$PYTHON_INFO}/bin"
+    fi
+    mkdir -p "$ACTIVATION_DIR"
+    printf '%s\n%s\n' "$ACT_ENV_PATH" "$ACT_PYTHON_BIN" > "$RECORD.$$" && mv "$RECORD.$$" "$RECORD"
+}
+run_in_env() {
+    local ENV_NAME=$1
+    shift
+    [ "$1" == "--" ] && shift
+    [ -n "$ENV_NAME" ] && [ $# -gt 0 ] || error "Usage: run <name> -- <command> [args...]"
+    resolve_activation "$ENV_NAME" || error "Environment '$ENV_NAME' not found"
+    [ -d "$ACT_ENV_PATH" ] || error "Environment directory '$ACT_ENV_PATH' does not exist"
+    # What bin/activate would do, applied straight to the exec'd process
+    unset PYTHONHOME
+    export VIRTUAL_ENV="$ACT_ENV_PATH"
+    export PATH="$ACT_ENV_PATH/bin:$ACT_PYTHON_BIN:$PATH"
+    exec "$@"
 }
 activate_env() {
     env_name=$1
     envs_file="$LOLLMS_HOME/envs/installed_envs.txt"
-    env_path=""
-    python_path=""
 
-    # Check if the environment exists in the installed_envs.txt file
-    if [ -f "$envs_file" ]; then
-        while IFS=: read -r name path python_info; do
-            if [ "$name" == "$env_name" ]; then
-                env_path="$path"
-                # Determine if python_info is a full path or a version
-                if [[ "$python_info" == /* ]]; then
-                    # Full path
-                    python_path="$python_info"
-                else
-                    # Version, construct the full path
-                    python_path="$LOLLMS_HOME/pythons/$python_info"
-                fi
-                break
-            fi
-        done < "$envs_file"
-    fi
-
-    # If the environment path is not found, return an error
-    if [ -z "$env_path" ]; then
+    if ! resolve_activation "$env_name"; then
         echo "[$(date +'%Y-%m-%d %H:%M:%S')] Error: Environment '$env_name' does not exist in $envs_file"
         return 1
     fi
+    env_path="$ACT_ENV_PATH"
+    python_bin="$ACT_PYTHON_BIN"
 
     # Check if the environment directory exists
     if [ -d "$env_path" ]; then
         echo "[$(date +'%Y-%m-%d %H:%M:%S')] Activating environment '$env_name'"
 
         # Add Python path to the PATH variable if it exists
-        if [ -n "$python_path" ] && [ -d "$python_path/bin" ]; then
-            export PATH="$python_path/bin:$PATH"
-            echo "[$(date +'%Y-%m-%d %H:%M:%S')] Added Python path '$python_path/bin' to PATH"
+        if [ -d "$python_bin" ]; then
+            export PATH="$python_bin:$PATH"
+            echo "[$(date +'%Y-%m-%d %H:%M:%S')] Added Python path '$python_bin' to PATH"
         else
-            echo "[$(date +'%Y-%m-%d %H:%M:%S')] Warning: Python path '$python_path/bin' does not exist or is invalid"
+            echo "[$(date +'%Y-%m-%d %H:%M:%S')] Warning: Python path '$python_bin' does not exist or is invalid"
         fi
 
         # Activate the environment
@@ -289,9 +802,71 @@ deactivate_env() {
 }
 install_package() {
     local PACKAGE=$1
-    pip install "$PACKAGE" || error "Failed to install package '$PACKAGE'"
+    wheelhouse_install python "$PACKAGE" || error "Failed to install package '$PACKAGE'"
     log "Package '$PACKAGE' installed in the current environment"
 }
+# "name==version<TAB>requirement" per pin, names normalized as in PEP 503; continuation lines and hashes dropped
+lock_pins() {
+    sed -e ':a' -e '/\\$/N; s/\\\n/ /; ta' "$1" | awk '
+        { sub(/(^| )#.*/, ""); sub(/[[:space:]]+--hash.*/, "") }
+        /^[[:space:]]*(-|$)/ { next }
+        {
+            split($0, parts, "==")
+            name = tolower(parts[1]); sub(/\[.*/, "", name); gsub(/[[:space:]]/, "", name); gsub(/[-_.]+/, "-", name)
+            version = parts[2]; sub(/^=/, "", version); sub(/[[:space:];].*/, "", version)
+            if (name != "" && version != "") print name "==" version "\t" $0
+        }'
+}
+installed_pins() {
+    local DIST
+    for DIST in "$1"/lib/python*/site-packages/*.dist-info; do
+        [ -d "$DIST" ] && basename "$DIST" .dist-info
+    done | awk '{ i = index($0, "-"); name = tolower(substr($0, 1, i - 1)); gsub(/[-_.]+/, "-", name); print name "==" substr($0, i + 1) }'
+}
+sync_env() {
+    local ENV_NAME=$1
+    local LOCKFILE=$2
+    [ -n "$ENV_NAME" ] && [ -f "$LOCKFILE" ] || error "Usage: sync-env <name> <lockfile>"
+    local ENV_PATH=$(registry_get "$ENVS_DIR/installed_envs.txt" "$ENV_NAME" 2)
+    [ -n "$ENV_PATH" ] || error "Environment '$ENV_NAME' not found"
+    local ENV_PY="$ENV_PATH/bin/python"
+    local WORK=$(mktemp -d "$TEMP_DIR/sync.XXXXXX")
+    lock_pins "$LOCKFILE" > "$WORK/lock"
+    installed_pins "$ENV_PATH" > "$WORK/installed"
+    # Pins whose exact name==version is not installed, and installed names the lockfile does not mention
+    awk -F'\t' 'NR == FNR { have[$1] = 1; next } !($1 in have) { print $2 }' "$WORK/installed" "$WORK/lock" > "$WORK/changes"
+    awk -F'\t' 'NR == FNR { split($1, p, "=="); want[p[1]] = 1; next }
+        { split($1, p, "=="); if (!(p[1] in want) && p[1] !~ /^(pip|setuptools|wheel|packaging)$/) print p[1] }' \
+        "$WORK/lock" "$WORK/installed" > "$WORK/remove"
+    # Missing pins behind an environment marker may not apply here: the env's interpreter decides
+    if grep -q ';' "$WORK/changes"; then
+        "$ENV_PY" -c 'import sys
+from pip._vendor.packaging.requirements import Requirement
+for line in sys.stdin:
+    marker = Requirement(line.strip()).marker
+    if marker is None or marker.evaluate():
+        print(line.strip())' < "$WORK/changes" > "$WORK/applicable" && mv "$WORK/applicable" "$WORK/changes"
+    fi
+    if [ ! -s "$WORK/changes" ] && [ ! -s "$WORK/remove" ]; then
+        rm -rf "$WORK"
+        log "Environment '$ENV_NAME' already matches $LOCKFILE"
+        return
+    fi
+    if [ -s "$WORK/changes" ]; then
+        # One resolver pass: options lines are kept, every pin constrains the dependencies
+        grep -E '^[[:space:]]*--?(index-url|extra-index-url|find-links|no-index|trusted-host|pre|prefer-binary|i|f)\b' "$LOCKFILE" > "$WORK/requirements"
+        cat "$WORK/changes" >> "$WORK/requirements"
+        cut -f2 "$WORK/lock" | sed -e 's/\[[^]]*\]//' > "$WORK/constraints"
+        log "Installing or upgrading $(wc -l < "$WORK/changes") package(s) in '$ENV_NAME'"
+        wheelhouse_install "$ENV_PY" -r "$WORK/requirements" -c "$WORK/constraints" || { rm -rf "$WORK"; error "Failed to sync environment '$ENV_NAME'"; }
+    fi
+    if [ -s "$WORK/remove" ]; then
+        log "Removing $(wc -l < "$WORK/remove") package(s) from '$ENV_NAME'"
+        "$ENV_PY" -m pip uninstall -y $(cat "$WORK/remove") || { rm -rf "$WORK"; error "Failed to sync environment '$ENV_NAME'"; }
+    fi
+    rm -rf "$WORK"
+    log "Environment '$ENV_NAME' synced with $LOCKFILE"
+}
 list_pythons() {
     echo "Installed Python versions:"
     cat "$PYTHON_DIR/installed_pythons.txt"
@@ -300,34 +875,353 @@ list_envs() {
     echo "Installed environments:"
     cat "$ENVS_DIR/installed_envs.txt"
 }
+# Materialize a store interpreter in a bundle: reflinks when the filesystem supports them,
+# then hardlinks, then a plain copy (LOLLMSENV_BUNDLE_LINK=auto|reflink|hardlink|copy)
+link_tree() {
+    local SRC=$1 DST=$2
+    local MODE="${LOLLMSENV_BUNDLE_LINK:-auto}"
+    mkdir -p "$(dirname "$DST")"
+    case $MODE in
+        reflink)
+            cp -a --reflink=always "$SRC" "$DST"
+            ;;
+        hardlink)
+            cp -al "$SRC" "$DST"
+            ;;
+        copy)
+            cp -a "$SRC" "$DST"
+            ;;
+        *)
+            cp -a --reflink=always "$SRC" "$DST" 2>/dev/null || { rm -rf "$DST"; cp -al "$SRC" "$DST" 2>/dev/null; } || { rm -rf "$DST"; cp -a "$SRC" "$DST"; }
+            ;;
+    esac
+}
 create_bundle() {
     local BUNDLE_NAME=$1
     local PYTHON_VERSION=$2
     local ENV_NAME=$3
     local BUNDLE_DIR="$BUNDLES_DIR/$BUNDLE_NAME"
+    [ -e "$BUNDLE_DIR" ] && error "Bundle '$BUNDLE_NAME' already exists"
+    [ -n "$(registry_get "$ENVS_DIR/installed_envs.txt" "$ENV_NAME" 1)" ] && error "Environment '$ENV_NAME' already exists"
+    
+    # Reuse the shared interpreter store instead of downloading and extracting into the bundle
+    local STORE_PATH=$(registry_get "$PYTHON_DIR/installed_pythons.txt" "$PYTHON_VERSION" 2)
+    if [ -z "$STORE_PATH" ] || [ ! -x "$STORE_PATH/bin/python3" ]; then
+        install_python "$PYTHON_VERSION"
+        STORE_PATH=$(registry_get "$PYTHON_DIR/installed_pythons.txt" "$PYTHON_VERSION" 2)
+        [ -z "$STORE_PATH" ] && error "Python $PYTHON_VERSION is not installed"
+    fi
     
-    mkdir -p "$BUNDLE_DIR"
-    install_python "$PYTHON_VERSION" "$BUNDLE_DIR"
-    create_env "$ENV_NAME" "$PYTHON_VERSION" "$BUNDLE_DIR"
+    # Claimed atomically (no -p): a bundle created meanwhile is refused, and on failure only what this run
+    # created is removed
+    mkdir -p "$BUNDLES_DIR" && mkdir "$BUNDLE_DIR" 2> /dev/null || error "Bundle '$BUNDLE_NAME' already exists"
+    log "Linking Python $PYTHON_VERSION from $STORE_PATH into $BUNDLE_DIR"
+    traced link -- link_tree "$STORE_PATH" "$BUNDLE_DIR/$(basename "$STORE_PATH")" ||
+        { rm -rf "$BUNDLE_DIR"; error "Failed to populate bundle '$BUNDLE_NAME'"; }
+    # In a subshell: create_env exits through error(), and the half-built bundle must still be removed
+    ( BUNDLE_PYTHON="$BUNDLE_DIR/$(basename "$STORE_PATH")/bin/python3" create_env "$ENV_NAME" "$PYTHON_VERSION" "$BUNDLE_DIR" ) ||
+        { rm -rf "$BUNDLE_DIR"; error "Failed to create bundle '$BUNDLE_NAME'"; }
     
     log "Bundle '$BUNDLE_NAME' created with Python $PYTHON_VERSION and environment '$ENV_NAME' in $BUNDLE_DIR"
 }
+disk_usage() {
+    echo "Apparent size (shared files counted in every tree):"
+    du -shl "$PYTHON_DIR" "$BUNDLES_DIR" "$ENVS_DIR"
+    echo
+    echo "Real disk usage (hardlinked files counted once):"
+    du -shc "$PYTHON_DIR" "$BUNDLES_DIR" "$ENVS_DIR"
+}
+# Portable bundle archives, same format as the Python package (lollmsenv/packing.py): a zstd (or gzip) tar holding
+# manifest.txt, then objects/<sha256> once per distinct file content. Text files embedding the bundle path are
+# flagged in the manifest and rewritten on import, so the bundle can be unpacked anywhere.
+BUNDLE_JOBS=${LOLLMSENV_BATCH_WORKERS:-8}
+export_bundle() {
+    local BUNDLE_NAME=$1 OUTPUT=$2
+    local BUNDLE_DIR="$BUNDLES_DIR/$BUNDLE_NAME"
+    [ -n "$BUNDLE_NAME" ] && [ -n "$OUTPUT" ] || error "Usage: export-bundle <name> <archive>"
+    [ -d "$BUNDLE_DIR" ] || error "Bundle '$BUNDLE_NAME' not found"
+    local WORK="$BUNDLES_DIR/.$BUNDLE_NAME.partial-$$"
+    rm -rf "$WORK" && mkdir -p "$WORK/objects" || error "Cannot create $WORK"
+    log "Hashing $BUNDLE_DIR"
+    (
+        cd "$BUNDLE_DIR" || exit 1
+        find . -name __pycache__ -prune -o -type f -printf '%m\t%s\t%P\n' > "$WORK/files"
+        cut -f3 "$WORK/files" | tr '\n' '\0' | xargs -0 -r -P "$BUNDLE_JOBS" -n 256 sha256sum > "$WORK/hashes"
+        grep -rlIF --exclude-dir=__pycache__ -- "$BUNDLE_DIR" . | sed 's#^\./##' > "$WORK/rewrite"
+        local HOME_LINE ENV_REL
+        {
+            printf 'lollmsenv-bundle\t1\nroot\t%s\nname\t%s\n' "$BUNDLE_DIR" "$BUNDLE_NAME"
+            while IFS=: read -r NAME ENV_PATH _; do
+                [[ "$ENV_PATH" == "$BUNDLE_DIR"/* ]] || continue
+                ENV_REL=${ENV_PATH#"$BUNDLE_DIR"/}
+                HOME_LINE=$(awk -F' = ' '$1 == "home" { print $2 }' "$ENV_PATH/pyvenv.cfg" 2>/dev/null)
+                [[ "$HOME_LINE" == "$BUNDLE_DIR"/* ]] && printf 'python\t%s\n' "$(dirname "${HOME_LINE#"$BUNDLE_DIR"/}")"
+                printf 'env\t%s\t%s\n' "$NAME" "$ENV_REL"
+            done < "$ENVS_DIR/installed_envs.txt"
+            find . -name __pycache__ -prune -o -type d ! -path . -printf 'dir\t%m\t%P\n'
+            awk -F'\t' -v hashes="$WORK/hashes" -v rewrite="$WORK/rewrite" '
+                BEGIN {
+                    while ((getline line < hashes) > 0) { sha[substr(line, 67)] = substr(line, 1, 64) }
+                    while ((getline line < rewrite) > 0) { rw[line] = 1 }
+                }
+                { print "file\t" sha[$3] "\t" $1 "\t" $2 "\t" ($3 in rw ? 1 : 0) "\t" $3 }' "$WORK/files"
+            find . -name __pycache__ -prune -o -type l -printf 'link\t%P\t%l\n'
+        } > "$WORK/manifest.txt"
+        # One hardlink (same filesystem) per distinct content, named by its hash
+        awk -F'\t' '$1 == "file" && !seen[$2]++ { print $6; print "'"$WORK"'/objects/" $2 }' "$WORK/manifest.txt" |
+            tr '\n' '\0' | xargs -0 -r -n 2 -P "$BUNDLE_JOBS" ln -f
+    ) || { rm -rf "$WORK"; error "Failed to scan bundle '$BUNDLE_NAME'"; }
+    log "Writing $OUTPUT"
+    if command -v zstd &> /dev/null; then
+        tar -C "$WORK" -cf - manifest.txt objects | zstd -q -T0 -f -o "$OUTPUT"
+    else
+        tar -C "$WORK" -cf - manifest.txt objects | gzip > "$OUTPUT"
+    fi
+    local STATUS=$?
+    rm -rf "$WORK"
+    [ $STATUS -eq 0 ] || error "Failed to write $OUTPUT"
+    log "Bundle '$BUNDLE_NAME' exported to $OUTPUT"
+}
+import_bundle() {
+    local ARCHIVE=$1 NAME=$2
+    [ -f "$ARCHIVE" ] || error "Usage: import-bundle <archive> [name]"
+    local DECOMPRESS
+    case $(head -c 4 "$ARCHIVE" | od -An -tx1 | tr -d ' \n') in
+        28b52ffd)
+            command -v zstd &> /dev/null || error "This bundle is zstd-compressed; install zstd"
+            DECOMPRESS="zstd -dc" ;;
+        1f8b*) DECOMPRESS="gzip -dc" ;;
+        *) error "$ARCHIVE is not a bundle archive" ;;
+    esac
+    local STAGING="$BUNDLES_DIR/.import.partial-$$"
+    rm -rf "$STAGING" && mkdir -p "$STAGING/root" || error "Cannot create $STAGING"
+    trap 'rm -rf "$STAGING"' EXIT
+    log "Extracting $ARCHIVE"
+    $DECOMPRESS "$ARCHIVE" | tar -C "$STAGING" -xf - || error "Failed to extract $ARCHIVE"
+    local MANIFEST="$STAGING/manifest.txt"
+    [ "$(head -n 1 "$MANIFEST" 2>/dev/null)" == $'lollmsenv-bundle\t1' ] || error "$ARCHIVE is not a lollmsenv bundle archive"
+    # Manifest paths come from the archive: relative and without "..", so nothing is written outside the bundle
+    awk -F'\t' '
+        function unsafe(p) { return p == "" || p ~ /^\// || p ~ /(^|\/)\.\.(\/|$)/ }
+        $1 == "dir" && unsafe($3) || $1 == "link" && unsafe($2) || $1 == "env" && unsafe($3) ||
+        $1 == "python" && unsafe($2) || $1 == "root" && $2 !~ /^\/./ ||
+        $1 == "file" && (unsafe($6) || length($2) != 64 || $2 ~ /[^0-9a-f]/) { bad = 1; exit }
+        END { exit bad }' "$MANIFEST" || error "Unsafe path in bundle archive $ARCHIVE"
+    local OLD_ROOT=$(awk -F'\t' '$1 == "root" { print $2; exit }' "$MANIFEST")
+    NAME=${NAME:-$(awk -F'\t' '$1 == "name" { print $2; exit }' "$MANIFEST")}
+    case $NAME in ""|.|..|*/*) error "Invalid bundle name: $NAME" ;; esac
+    local DEST="$BUNDLES_DIR/$NAME"
+    [ -e "$DEST" ] && error "Bundle directory $DEST already exists"
+    local ENV_NAME
+    for ENV_NAME in $(awk -F'\t' '$1 == "env" { print $2 }' "$MANIFEST"); do
+        [ -n "$(registry_get "$ENVS_DIR/installed_envs.txt" "$ENV_NAME" 1)" ] && error "Environment '$ENV_NAME' already exists"
+    done
+    log "Verifying and placing files"
+    (cd "$STAGING/objects" && find . -type f -printf '%f\0' | xargs -0 -r -P "$BUNDLE_JOBS" -n 256 sha256sum) |
+        awk '$1 != $2 { bad = 1 } END { exit bad }' || error "Corrupted bundle archive: an object does not match its hash"
+    local ROOT="$STAGING/root"
+    (
+        cd "$ROOT" || exit 1
+        REAL_ROOT=$(pwd -P)
+        inside_root() {
+            # Refuses a path whose parent resolves outside the bundle (through a symlink placed earlier)
+            local PARENT
+            PARENT=$(cd "$(dirname "$1")" 2> /dev/null && pwd -P) || return 1
+            case $PARENT/ in "$REAL_ROOT"/*) return 0 ;; esac
+            echo "Unsafe path in bundle archive: $1 resolves outside the bundle" >&2
+            return 1
+        }
+        awk -F'\t' '$1 == "dir" { print $3 }' "$MANIFEST" | tr '\n' '\0' | xargs -0 -r mkdir -p
+        # Identical files share one inode unless their modes differ or they need the path rewrite
+        awk -F'\t' -v work="$STAGING" '
+            $1 != "file" { next }
+            $5 == "1" { print "../objects/" $2 "\n" $6 > (work "/rewrite"); next }
+            ($2 in mode) && mode[$2] != $3 { print "../objects/" $2 "\n" $6 > (work "/copy"); next }
+            { mode[$2] = $3; print "../objects/" $2 "\n" $6 > (work "/link") }' "$MANIFEST"
+        [ -f "$STAGING/link" ] && tr '\n' '\0' < "$STAGING/link" | xargs -0 -r -n 2 -P "$BUNDLE_JOBS" ln -f
+        [ -f "$STAGING/copy" ] && tr '\n' '\0' < "$STAGING/copy" | xargs -0 -r -n 2 -P "$BUNDLE_JOBS" cp
+        if [ -f "$STAGING/rewrite" ]; then
+            # Literal replacement: the old root comes from the archive and must not be read as a pattern
+            while read -r OBJECT && read -r FILE; do
+                OLD="$OLD_ROOT" NEW="$DEST" awk '{
+                        line = $0; out = ""
+                        while ((i = index(line, ENVIRON["OLD"])) > 0) {
+                            out = out substr(line, 1, i - 1) ENVIRON["NEW"]
+                            line = substr(line, i + length(ENVIRON["OLD"]))
+                        }
+                        print out line }' "$OBJECT" > "$FILE" || exit 1
+            done < "$STAGING/rewrite"
+        fi
+        awk -F'\t' '$1 == "file" { print $3 "\t" $6 }' "$MANIFEST" | sort -t $'\t' -k1,1 |
+            awk -F'\t' '$1 != mode { if (mode != "") printf "\n"; mode = $1; printf "%s", mode } { printf "\t%s", $2 } END { printf "\n" }' |
+            while IFS=$'\t' read -r -a ITEMS; do
+                printf '%s\0' "${ITEMS[@]:1}" | xargs -0 -r chmod "${ITEMS[0]}"
+            done
+        OLD="$OLD_ROOT" NEW="$DEST" awk -F'\t' '$1 == "link" {
+                old = ENVIRON["OLD"]; target = $3
+                if (target == old || index(target, old "/") == 1) target = ENVIRON["NEW"] substr(target, length(old) + 1)
+                print target; print $2 }' "$MANIFEST" |
+            while read -r TARGET && read -r LINK; do
+                inside_root "$LINK" && ln -s "$TARGET" "$LINK" || exit 1
+            done || exit 1
+        awk -F'\t' '$1 == "dir" { print $2 "\t" $3 }' "$MANIFEST" | sort -t $'\t' -k2,2r |
+            while IFS=$'\t' read -r MODE DIR; do
+                inside_root "$DIR" && chmod "$MODE" "$DIR" || exit 1
+            done || exit 1
+    ) || error "Failed to unpack $ARCHIVE"
+    mv "$ROOT" "$DEST" || error "Cannot move the bundle to $DEST"
+    local PYTHON_REL=$(awk -F'\t' '$1 == "python" { print $2; exit }' "$MANIFEST")
+    local ENV_REL
+    while IFS=$'\t' read -r ENV_NAME ENV_REL; do
+        with_registry_lock registry_append "$ENVS_DIR/installed_envs.txt" "$ENV_NAME:$DEST/$ENV_REL:$DEST/$PYTHON_REL"
+    done < <(awk -F'\t' '$1 == "env" { print $2 "\t" $3 }' "$MANIFEST")
+    rm -rf "$STAGING"
+    trap - EXIT
+    log "Bundle imported to $DEST"
+}
+home_usage() {
+    # One du run over every tree, stores first: a hardlinked file is counted once, for the first tree it is found in
+    local -a TREES=()
+    local DIR ENV_PATH
+    for DIR in "$PYTHON_DIR"/*/ "$TEMPLATES_DIR"/*/ "$ENVS_DIR"/*/ "$BUNDLES_DIR"/*/ "$LOLLMS_HOME"/cache/*/; do
+        [ -d "$DIR" ] && TREES+=("${DIR%/}")
+    done
+    if [ -f "$ENVS_DIR/installed_envs.txt" ]; then
+        # Environments created in a custom directory
+        while IFS=: read -r _ ENV_PATH _; do
+            [ -d "$ENV_PATH" ] && [[ "$ENV_PATH" != "$ENVS_DIR"/* && "$ENV_PATH" != "$BUNDLES_DIR"/* ]] && TREES+=("$ENV_PATH")
+        done < "$ENVS_DIR/installed_envs.txt"
+    fi
+    [ ${#TREES[@]} -gt 0 ] || { echo "Nothing installed in $LOLLMS_HOME"; return 0; }
+    echo "Real disk usage per interpreter, template, environment, bundle and cache (hardlinked files counted once):"
+    du -shc "${TREES[@]}"
+}
+canonical_path() {
+    realpath -m "$1" 2> /dev/null || readlink -f "$1" 2> /dev/null || echo "$1"
+}
+registered_paths() {
+    # Canonical directory of every registry line: an entry registered through a symlink, a relative path or with a
+    # trailing slash must still match the directory found on disk
+    local _ DIR
+    [ -f "$1" ] || return 0
+    while IFS=: read -r _ DIR _; do
+        [ -n "$DIR" ] && canonical_path "$DIR"
+    done < "$1"
+}
+registered_path() {
+    # LIST DIR: LIST from registered_paths
+    grep -Fxq -- "$(canonical_path "$2")" <<< "$1"
+}
+older_than() {
+    # PATH MINUTES
+    [ -n "$(find "$1" -maxdepth 0 -mmin "+$2" 2>/dev/null)" ]
+}
+gc_remove() {
+    log "$1: $2 ($3)"
+    [ "$GC_DRY_RUN" == "1" ] || rm -rf "$2"
+}
+collect_garbage() {
+    local GC_DRY_RUN=0 MAX_AGE="" NAME ENV_PATH VERSION PREFIX DIR FILE
+    while [ $# -gt 0 ]; do
+        case $1 in
+            --dry-run) GC_DRY_RUN=1 ;;
+            --max-age) MAX_AGE=$2; shift ;;
+            *) error "Usage: gc [--dry-run] [--max-age days]" ;;
+        esac
+        shift
+    done
+    local ENVS_FILE="$ENVS_DIR/installed_envs.txt" PYTHONS_FILE="$PYTHON_DIR/installed_pythons.txt"
+    # Directories younger than GRACE minutes may belong to a create or install still in progress
+    local GRACE=60
+    touch "$ENVS_FILE" "$PYTHONS_FILE"
+    # Registry lines whose directory is gone
+    while IFS=: read -r NAME ENV_PATH _; do
+        [ -n "$NAME" ] && [ ! -d "$ENV_PATH" ] || continue
+        log "dangling-env: $NAME ($ENV_PATH is missing)"
+        [ "$GC_DRY_RUN" == "1" ] || { with_registry_lock registry_remove "$ENVS_FILE" "$NAME"; rm -f "$ACTIVATION_DIR/$NAME"; }
+    done < "$ENVS_FILE"
+    while IFS=: read -r VERSION PREFIX; do
+        [ -n "$VERSION" ] && [ ! -d "$PREFIX" ] || continue
+        log "dangling-python: $VERSION ($PREFIX is missing)"
+        [ "$GC_DRY_RUN" == "1" ] || with_registry_lock registry_remove "$PYTHONS_FILE" "$VERSION"
+    done < "$PYTHONS_FILE"
+    # Directories nothing refers to
+    local REGISTERED_ENVS=$(registered_paths "$ENVS_FILE") REGISTERED_PYTHONS=$(registered_paths "$PYTHONS_FILE")
+    for DIR in "$ENVS_DIR"/*/; do
+        DIR=${DIR%/}
+        [ -d "$DIR" ] && ! registered_path "$REGISTERED_ENVS" "$DIR" && older_than "$DIR" $GRACE && gc_remove orphan-env "$DIR" "not in the registry"
+    done
+    for DIR in "$PYTHON_DIR"/*/; do
+        DIR=${DIR%/}
+        [ -d "$DIR" ] && ! registered_path "$REGISTERED_PYTHONS" "$DIR" && older_than "$DIR" $GRACE && gc_remove orphan-python "$DIR" "not in the registry"
+    done
+    for DIR in "$BUNDLES_DIR"/*/; do
+        DIR=${DIR%/}
+        [ -d "$DIR" ] && ! awk -v dir="$(canonical_path "$DIR")/" 'index($0, dir) == 1 { found = 1; exit } END { exit !found }' <<< "$REGISTERED_ENVS" &&
+            older_than "$DIR" $GRACE && gc_remove orphan-bundle "$DIR" "no registered environment lives in it"
+    done
+    for DIR in "$TEMPLATES_DIR"/*/; do
+        DIR=${DIR%/}
+        if [ -f "$DIR/.lollmsenv-template" ]; then
+            read -r FILE < "$DIR/.lollmsenv-template"
+            [ -e "$FILE" ] || gc_remove orphan-template "$DIR" "interpreter $FILE no longer exists"
+        elif [ -d "$DIR" ] && older_than "$DIR" $GRACE; then
+            gc_remove orphan-template "$DIR" "interrupted template build"
+        fi
+    done
+    # Interrupted installs and downloads, temp files, activation records of deleted envs
+    for DIR in "$PYTHON_DIR"/.*.partial-* "$BUNDLES_DIR"/.*.partial-*; do
+        [ -d "$DIR" ] && older_than "$DIR" $GRACE && gc_remove partial "$DIR" "interrupted install, bundle export or import"
+    done
+    for DIR in "$LOLLMS_HOME"/cache/.wheels-*; do
+        [ -d "$DIR" ] && older_than "$DIR" $GRACE && gc_remove partial "$DIR" "interrupted wheelhouse fill"
+    done
+    for FILE in "$LOLLMS_HOME"/cache/archives/partial/*; do
+        [ -e "$FILE" ] && older_than "$FILE" $((7 * 24 * 60)) && gc_remove partial "$FILE" "download abandoned for more than a week"
+    done
+    while read -r FILE; do
+        gc_remove temp "$FILE" "leftover temporary file"
+    done < <(find "$LOLLMS_HOME" "$PYTHON_DIR" "$ENVS_DIR" "$LOLLMS_HOME"/cache "$LOLLMS_HOME"/cache/*/ -maxdepth 1 -type f \
+                  -name '*.[0-9]*.tmp' -mmin +$GRACE 2>/dev/null | sort -u)
+    for FILE in "$ACTIVATION_DIR"/*; do
+        [ -f "$FILE" ] && [ -z "$(registry_get "$ENVS_FILE" "${FILE##*/}" 1)" ] &&
+            gc_remove stale-cache "$FILE" "activation record of a deleted environment"
+    done
+    # Registered interpreters no environment uses, once unused for MAX_AGE days
+    [ -n "$MAX_AGE" ] || return 0
+    while IFS=: read -r VERSION PREFIX; do
+        [ -d "$PREFIX" ] || continue
+        awk -F: -v v="$VERSION" -v p="$PREFIX" '$3 == v || $3 == p { found = 1; exit } END { exit !found }' "$ENVS_FILE" && continue
+        [ -n "$(find "$PREFIX" -maxdepth 0 -mtime "+$MAX_AGE")" ] || continue
+        log "unused-python: $VERSION ($PREFIX, no environment uses it)"
+        [ "$GC_DRY_RUN" == "1" ] || delete_python "$VERSION"
+    done < <(cat "$PYTHONS_FILE")
+}
 delete_env() {
     local ENV_NAME=$1
-    local ENV_PATH=$(grep "^$ENV_NAME:" "$ENVS_DIR/installed_envs.txt" | cut -d':' -f2)
+    local ENV_PATH=$(registry_get "$ENVS_DIR/installed_envs.txt" "$ENV_NAME" 2)
     
     if [ -z "$ENV_PATH" ]; then
         error "Environment '$ENV_NAME' not found"
     fi
     
     log "Deleting environment '$ENV_NAME' from $ENV_PATH"
-    rm -rf "$ENV_PATH"
-    sed -i "/^$ENV_NAME:/d" "$ENVS_DIR/installed_envs.txt"
+    rm -rf "$ENV_PATH" "$ACTIVATION_DIR/$ENV_NAME"
+    with_registry_lock registry_remove "$ENVS_DIR/installed_envs.txt" "$ENV_NAME"
+    # A bundle holds its envs and a copy of the interpreter; the copy is useless once its last env is gone
+    case $ENV_PATH in
+        "$BUNDLES_DIR"/*/*)
+            local REL=${ENV_PATH#"$BUNDLES_DIR"/}
+            local BUNDLE="$BUNDLES_DIR/${REL%%/*}"
+            awk -F: -v dir="$BUNDLE/" 'index($2, dir) == 1 { found = 1; exit } END { exit !found }' \
+                "$ENVS_DIR/installed_envs.txt" || rm -rf "$BUNDLE"
+            ;;
+    esac
     log "Environment '$ENV_NAME' deleted successfully"
 }
 delete_python() {
     local VERSION=$1
-    local PYTHON_PATH=$(grep "^$VERSION:" "$PYTHON_DIR/installed_pythons.txt" | cut -d':' -f2)
+    local PYTHON_PATH=$(registry_get "$PYTHON_DIR/installed_pythons.txt" "$VERSION" 2)
     
     if [ -z "$PYTHON_PATH" ]; then
         error "Python $VERSION is not installed"
@@ -335,9 +1229,62 @@ delete_python() {
     
     log "Deleting Python $VERSION from $PYTHON_PATH"
     rm -rf "$PYTHON_PATH"
-    sed -i "/^$VERSION:/d" "$PYTHON_DIR/installed_pythons.txt"
+    with_registry_lock registry_remove "$PYTHON_DIR/installed_pythons.txt" "$VERSION"
     log "Python $VERSION deleted successfully"
 }
+show_metrics() {
+    # Prometheus text format over the event log (both rotations), as LollmsEnv.metrics() renders it
+    [ -n "$EVENT_LOG" ] || error "The event log is disabled (LOLLMSENV_EVENT_LOG is empty)"
+    local -a FILES=()
+    [ -f "$EVENT_LOG.1" ] && FILES+=("$EVENT_LOG.1")
+    [ -f "$EVENT_LOG" ] && FILES+=("$EVENT_LOG")
+    [ ${#FILES[@]} -gt 0 ] || return 0
+    awk -v bounds="0.01 0.05 0.1 0.25 0.5 1 2.5 5 10 30 60 120 300 900" '
+        # Top-level keys come before "attrs" in every event, so the first match is the right one
+        function text(key) {
+            if (!match($0, "\"" key "\":\"[^\"]*\"")) return ""
+            return substr($0, RSTART + length(key) + 4, RLENGTH - length(key) - 5)
+        }
+        function number(key) {
+            if (!match($0, "\"" key "\":[-+0-9.eE]+")) return 0
+            return substr($0, RSTART + length(key) + 3, RLENGTH - length(key) - 3) + 0
+        }
+        BEGIN { n = split(bounds, le, " ") }
+        index($0, "\"event\":\"span\"") {
+            name = text("name"); duration = number("duration")
+            spans[name "\t" text("status")]++; has_spans = 1
+            names[name] = 1; count[name]++; sum[name] += duration
+            for (i = 1; i <= n; i++) if (duration <= le[i] + 0) bucket[name, i]++
+            next
+        }
+        index($0, "\"event\":\"log\"") { levels[text("level")]++; has_logs = 1 }
+        END {
+            if (has_spans) {
+                print "# HELP lollmsenv_spans_total Operations and phases run, by outcome"
+                print "# TYPE lollmsenv_spans_total counter"
+                for (key in spans) {
+                    split(key, parts, "\t")
+                    printf "lollmsenv_spans_total{span=\"%s\",status=\"%s\"} %d\n", parts[1], parts[2], spans[key]
+                }
+            }
+            if (has_logs) {
+                print "# HELP lollmsenv_log_messages_total Log messages, by level"
+                print "# TYPE lollmsenv_log_messages_total counter"
+                for (level in levels) printf "lollmsenv_log_messages_total{level=\"%s\"} %d\n", level, levels[level]
+            }
+            if (has_spans) {
+                print "# HELP lollmsenv_span_duration_seconds Duration of lollmsenv operations and of their phases"
+                print "# TYPE lollmsenv_span_duration_seconds histogram"
+                for (name in names) {
+                    for (i = 1; i <= n; i++)
+                        printf "lollmsenv_span_duration_seconds_bucket{span=\"%s\",le=\"%s\"} %d\n", name, le[i], bucket[name, i]
+                    printf "lollmsenv_span_duration_seconds_bucket{span=\"%s\",le=\"+Inf\"} %d\n", name, count[name]
+                    printf "lollmsenv_span_duration_seconds_sum{span=\"%s\"} %.6f\n", name, sum[name]
+                    printf "lollmsenv_span_duration_seconds_count{span=\"%s\"} %d\n", name, count[name]
+                }
+            }
+        }' "${FILES[@]}"
+}
 show_help() {
     echo "lollmsenv - Python and Virtual Environment Management Tool"
     echo
@@ -348,13 +1295,24 @@ show_help() {
     echo "  create-env [name] [python-version] [custom_dir]  Create a new virtual environment"
     echo "  activate [name]                        Show command to activate an environment"
     echo "  deactivate                             Show command to deactivate the current environment"
+    echo "  run [name] -- [command]                Run a command inside an environment without activating it"
     echo "  install [package]                      Install a package in the current environment"
+    echo "  sync-env [name] [lockfile]             Install, upgrade or remove only what differs from a pinned lockfile"
+    echo "  prefetch [requirements] [python-version]  Fill the shared wheelhouse from a requirements file"
     echo "  list-pythons                           List installed Python versions"
     echo "  list-envs                              List installed virtual environments"
     echo "  list-available-pythons                 List available Python versions for installation"
+    echo "  find-python [version]                  Show the interpreter already on this machine create-env would use"
     echo "  create-bundle [name] [python-version] [env-name]  Create a bundle with Python and environment"
+    echo "  export-bundle [name] [archive]         Pack a bundle into a portable, deduplicated archive"
+    echo "  import-bundle [archive] [name]         Unpack a bundle archive and register its environments"
+    echo "  disk-usage                             Show apparent vs real disk usage of pythons, bundles and envs"
+    echo "  du                                     Show real disk usage per interpreter, env, bundle and cache"
+    echo "  gc [--dry-run] [--max-age days]        Remove orphaned directories, stale registry lines and leftovers"
     echo "  delete-env [name]                      Delete a virtual environment"
     echo "  delete-python [version]                Delete a Python installation"
+    echo "  metrics                                Print operation and phase timings from the event log (Prometheus format)"
+    echo "  serve [--socket path]                  Run the daemon the Python package and UI call instead of starting cold"
     echo "  --help, -h                             Show this help message"
     echo
     echo "Description:"
@@ -367,10 +1325,10 @@ show_help() {
 }
 case $1 in
     install-python)
-        install_python "$2" "$3"
+        traced install_python version "$2" -- install_python "$2" "$3"
         ;;
     create-env)
-        create_env "$2" "$3" "$4"
+        traced create_env name "$2" python "$3" -- create_env "$2" "$3" "$4"
         ;;
     activate)
         activate_env "$2"
@@ -378,8 +1336,18 @@ case $1 in
     deactivate)
         deactivate_env
         ;;
+    run)
+        shift
+        run_in_env "$@"
+        ;;
     install)
-        install_package "$2"
+        traced install_package package "$2" -- install_package "$2"
+        ;;
+    sync-env)
+        traced sync_env env "$2" lockfile "$3" -- sync_env "$2" "$3"
+        ;;
+    prefetch)
+        traced prefetch requirements "$2" -- prefetch "$2" "$3"
         ;;
     list-pythons)
         list_pythons
@@ -390,14 +1358,45 @@ case $1 in
     list-available-pythons)
         list_available_pythons
         ;;
+    find-python)
+        FOUND=$(scan_for_python "$2")
+        [ -n "$FOUND" ] || error "No Python $2 found on this machine"
+        echo "${FOUND%%|*}"
+        ;;
     create-bundle)
-        create_bundle "$2" "$3" "$4"
+        traced create_bundle name "$2" python "$3" env "$4" -- create_bundle "$2" "$3" "$4"
+        ;;
+    export-bundle)
+        traced export_bundle name "$2" output "$3" -- export_bundle "$2" "$3"
+        ;;
+    import-bundle)
+        traced import_bundle archive "$2" -- import_bundle "$2" "$3"
+        ;;
+    disk-usage)
+        disk_usage
+        ;;
+    du)
+        home_usage
+        ;;
+    gc)
+        shift
+        traced gc -- collect_garbage "$@"
         ;;
     delete-env)
-        delete_env "$2"
+        traced delete_env name "$2" -- delete_env "$2"
         ;;
     delete-python)
-        delete_python "$2"
+        traced delete_python version "$2" -- delete_python "$2"
+        ;;
+    metrics)
+        show_metrics
+        ;;
+    serve)
+        # The package installed next to this script (install.sh copies it to lib/)
+        shift
+        command -v python3 > /dev/null || error "python3 is required to run the daemon"
+        LOLLMSENV_DIR="$LOLLMS_HOME" PYTHONPATH="$LOLLMS_HOME/lib${PYTHONPATH:+:$PYTHONPATH}" \
+            exec python3 -m lollmsenv.daemon "$@"
         ;;
     --help|-h)
         show_help
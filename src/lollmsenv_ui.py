@@ -1,12 +1,30 @@
 import sys, os
+import re
+import shlex
 import subprocess
 import logging
+from collections import deque
 from pathlib import Path
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QListWidget, QPushButton, QStackedWidget, QInputDialog, 
-                             QMessageBox, QLabel, QLineEdit, QProgressBar)
+                             QListWidget, QListWidgetItem, QPushButton, QStackedWidget, QInputDialog, 
+                             QMessageBox, QLabel, QLineEdit, QProgressBar, QPlainTextEdit)
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
+from PyQt5.QtCore import Qt, QThread, QObject, QProcess, QFileSystemWatcher, pyqtSignal, QTimer
+
+# install.sh / install.bat copy the lollmsenv package to <lollmsenv home>/lib, next to bin/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lib"))
+try:
+    # Only the package and its registry module: the engine is loaded on the first api() call, after the window is up
+    import lollmsenv
+    from lollmsenv.registry import split_entry
+except ImportError:
+    lollmsenv = None
+
+    def split_entry(line):
+        # lollmsenv.sh writes "a:b:c", lollmsenv.bat writes "a,b,c" (paths may contain a drive colon)
+        if "," in line:
+            return [part.strip() for part in line.split(",")]
+        return [part.strip() for part in line.split(":")]
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -37,35 +55,313 @@ class Spinner(QProgressBar):
         self.setFixedSize(50, 50)
         self.hide()
 
+    def hideEvent(self, event):
+        # Back to indeterminate once a job that reported progress is over
+        self.setRange(0, 0)
+        super().hideEvent(event)
+
+class Job(QObject):
+    # One lollmsenv/pip process run through QProcess: output is streamed line by line as it arrives,
+    # "NN%" in a line (the downloader's progress, written with \r) updates the progress.
+    output = pyqtSignal(str, bool)
+    progress = pyqtSignal(int)
+    state_changed = pyqtSignal(str)
+    finished = pyqtSignal(bool)
+
+    PROGRESS_RE = re.compile(r"(\d{1,3})%")
+    MAX_LINES = 5000
+
+    def __init__(self, title, argv, key=None):
+        super().__init__()
+        self.title = title
+        self.argv = argv
+        self.key = key
+        self.state = "pending"
+        self.percent = None
+        self.lines = deque(maxlen=self.MAX_LINES)
+        self.process = None
+        self._buffers = {False: "", True: ""}
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_changed.emit(state)
+
+    def start(self):
+        logging.debug(f"Starting job {self.title}: {self.argv}")
+        self.process = QProcess(self)
+        self.process.readyReadStandardOutput.connect(lambda: self._read(False))
+        self.process.readyReadStandardError.connect(lambda: self._read(True))
+        self.process.finished.connect(self._on_finished)
+        self.process.errorOccurred.connect(self._on_error)
+        self._set_state("running")
+        self.process.start(self.argv[0], self.argv[1:])
+
+    def _read(self, is_stderr):
+        data = self.process.readAllStandardError() if is_stderr else self.process.readAllStandardOutput()
+        parts = re.split(r"[\r\n]", self._buffers[is_stderr] + bytes(data).decode(errors="replace"))
+        # The last part is an unterminated line: keep it for the next read, but it may already carry a percentage
+        self._buffers[is_stderr] = parts.pop()
+        for line in parts:
+            if line.strip():
+                self._line(line, is_stderr)
+        self._parse_progress(self._buffers[is_stderr])
+
+    def _line(self, line, is_stderr):
+        self.lines.append(line)
+        self.output.emit(line, is_stderr)
+        self._parse_progress(line)
+
+    def _parse_progress(self, text):
+        match = self.PROGRESS_RE.search(text)
+        if match and 0 <= int(match.group(1)) <= 100 and int(match.group(1)) != self.percent:
+            self.percent = int(match.group(1))
+            self.progress.emit(self.percent)
+
+    def _on_finished(self, exit_code, exit_status):
+        for is_stderr, rest in self._buffers.items():
+            if rest.strip():
+                self._line(rest, is_stderr)
+        if self.state == "cancelling":
+            self._set_state("cancelled")
+        else:
+            self._set_state("done" if exit_status == QProcess.NormalExit and exit_code == 0 else "failed")
+        self.finished.emit(self.state == "done")
+
+    def _on_error(self, error):
+        if error == QProcess.FailedToStart:
+            self._line(f"Failed to start {self.argv[0]}", True)
+            self._set_state("failed")
+            self.finished.emit(False)
+
+    def cancel(self):
+        if self.state == "pending":
+            self._set_state("cancelled")
+            self.finished.emit(False)
+        elif self.state == "running":
+            self._set_state("cancelling")
+            if sys.platform.startswith("win"):
+                self.process.kill()
+            else:
+                self.process.terminate()
+                QTimer.singleShot(5000, lambda: self.process.state() != QProcess.NotRunning and self.process.kill())
+
+class JobQueue(QObject):
+    # Central queue for every long-running operation: at most max_concurrent processes run at once,
+    # and jobs sharing a key (the same environment or Python version) never run concurrently.
+    job_added = pyqtSignal(object)
+
+    def __init__(self, max_concurrent=None):
+        super().__init__()
+        self.max_concurrent = max_concurrent or int(os.environ.get("LOLLMSENV_UI_JOBS", 2))
+        self.jobs = []
+        self.pending = deque()
+        self.running = []
+
+    def submit(self, title, argv, key=None):
+        job = Job(title, argv, key)
+        job.finished.connect(lambda ok, job=job: self._on_finished(job))
+        self.jobs.append(job)
+        self.pending.append(job)
+        self.job_added.emit(job)
+        self._pump()
+        return job
+
+    def _pump(self):
+        busy = {job.key for job in self.running if job.key is not None}
+        for job in list(self.pending):
+            if len(self.running) >= self.max_concurrent:
+                break
+            if job.state != "pending":
+                self.pending.remove(job)
+            elif job.key is None or job.key not in busy:
+                self.pending.remove(job)
+                self.running.append(job)
+                if job.key is not None:
+                    busy.add(job.key)
+                job.start()
+
+    def _on_finished(self, job):
+        if job in self.running:
+            self.running.remove(job)
+        elif job in self.pending:
+            self.pending.remove(job)
+        self._pump()
+
+    def cancel_all(self):
+        for job in list(self.pending) + list(self.running):
+            job.cancel()
+
+class RegistryModel(QObject):
+    # Parsed installed_pythons.txt / installed_envs.txt shared by every view. Loaded once, then kept current
+    # from QFileSystemWatcher events: new entries are appended in place (only the new tail is parsed) while
+    # removals replace the file atomically (the file is re-read and diffed). A line is parsed once its "\n" is
+    # written, so an append caught halfway is picked up whole on the next event. Directories are watched too,
+    # since a replaced or newly created file drops out of the file watch.
+    pythons_changed = pyqtSignal()
+    envs_changed = pyqtSignal()
+
+    def __init__(self, home):
+        super().__init__()
+        self.files = {"pythons": Path(home) / "pythons" / "installed_pythons.txt",
+                      "envs": Path(home) / "envs" / "installed_envs.txt"}
+        self.pythons = {}
+        self.envs = {}
+        self._state = {}
+        self._dirty = set()
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_event)
+        self.watcher.directoryChanged.connect(self._on_event)
+        # Coalesce bursts of events (a write is often several notifications)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(50)
+        self.timer.timeout.connect(self._apply)
+        self.home = Path(home)
+        if self.home.exists():
+            self.watcher.addPath(str(self.home))
+        self._watch_dirs()
+        for kind in self.files:
+            self._load(kind, full=True)
+
+    def _watch_dirs(self):
+        # pythons/ and envs/ only appear after the first lollmsenv run: the home is watched until they do
+        for path in self.files.values():
+            if path.parent.exists() and str(path.parent) not in self.watcher.directories():
+                self.watcher.addPath(str(path.parent))
+
+    def _entries(self, kind):
+        return self.pythons if kind == "pythons" else self.envs
+
+    def _parse(self, kind, lines):
+        entries = {}
+        for line in lines:
+            parts = split_entry(line.rstrip("\n"))
+            if kind == "pythons" and len(parts) >= 2 and parts[0]:
+                entries[parts[0]] = parts[1]
+            elif kind == "envs" and len(parts) >= 3 and parts[0]:
+                entries[parts[0]] = {"path": parts[1], "python": parts[2]}
+        return entries
+
+    def _load(self, kind, full=False):
+        path = self.files[kind]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            changed = bool(self._entries(kind))
+            self._entries(kind).clear()
+            self._state.pop(kind, None)
+            return changed
+        if str(path) not in self.watcher.files():
+            self.watcher.addPath(str(path))
+        previous = self._state.get(kind)
+        if previous and previous[:3] == (st.st_ino, st.st_mtime_ns, st.st_size):
+            return False
+        with open(path, "rb") as f:
+            if not full and previous and previous[0] == st.st_ino and st.st_size > previous[2]:
+                # Same file grown: an append, parse only the new lines
+                offset = previous[3]
+                f.seek(offset)
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                added = self._parse(kind, data[:end].decode(errors="replace").splitlines())
+                self._entries(kind).update(added)
+                changed = bool(added)
+            else:
+                offset = 0
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                entries = self._parse(kind, data[:end].decode(errors="replace").splitlines())
+                changed = entries != self._entries(kind)
+                self._entries(kind).clear()
+                self._entries(kind).update(entries)
+        # The size read, not st_size: the file may have grown since the stat
+        self._state[kind] = (st.st_ino, st.st_mtime_ns, offset + len(data), offset + end)
+        return changed
+
+    def _on_event(self, path):
+        if path == str(self.home):
+            self._watch_dirs()
+            self._dirty.update(self.files)
+        for kind, file in self.files.items():
+            if path in (str(file), str(file.parent)):
+                self._dirty.add(kind)
+        self.timer.start()
+
+    def _apply(self):
+        dirty, self._dirty = self._dirty, set()
+        for kind in dirty:
+            if self._load(kind):
+                (self.pythons_changed if kind == "pythons" else self.envs_changed).emit()
+
+    def reload(self):
+        for kind in self.files:
+            if self._load(kind, full=True):
+                (self.pythons_changed if kind == "pythons" else self.envs_changed).emit()
+
+    def python_labels(self):
+        return [f"{version}: {path}" for version, path in self.pythons.items()]
+
+    def env_labels(self):
+        return [f"{name}: {env['python']}" for name, env in self.envs.items()]
+
+
+def sync_list(widget, labels):
+    # Update a QListWidget in place so the current selection survives registry changes
+    wanted = set(labels)
+    for row in reversed(range(widget.count())):
+        if widget.item(row).text() not in wanted:
+            widget.takeItem(row)
+    present = {widget.item(row).text() for row in range(widget.count())}
+    for label in labels:
+        if label not in present:
+            widget.addItem(label)
+
+
 class LollmsEnvManager:
     SCRIPT_DIR = Path(__file__).resolve().parent
-    PYTHONS_FILE = SCRIPT_DIR.parent / "pythons" / "installed_pythons.txt"
-    ENVS_FILE = SCRIPT_DIR.parent / "envs" / "installed_envs.txt"
+    _api = None
 
     @staticmethod
-    def run_lollmsenv_command(command):
-        try:
-            full_command = f"lollmsenv.bat {' '.join(command)}"
-            logging.debug(f"Running command: {full_command}")
-            
-            process = subprocess.Popen(full_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, text=True, cwd=os.getcwd())
-            
-            stdout, stderr = process.communicate(timeout=30)
-            
-            if process.returncode != 0:
-                logging.error(f"Command failed with return code {process.returncode}")
-                logging.error(f"Error output: {stderr}")
-                return None
-
-            logging.debug(f"Command output: {stdout}")
-            return stdout.strip()
-        except subprocess.TimeoutExpired:
-            logging.error("Command timed out")
+    def api():
+        # In-process access to the lollmsenv home, None when the package is not installed next to the UI
+        if LollmsEnvManager._api is None and lollmsenv is not None:
+            LollmsEnvManager._api = lollmsenv.LollmsEnv(home=LollmsEnvManager.SCRIPT_DIR.parent)
+        return LollmsEnvManager._api
+
+    @staticmethod
+    def list_packages(env_name):
+        # [{"name", "version"}] read from dist-info metadata (cached per site-packages mtime), or None
+        api = LollmsEnvManager.api()
+        if api is None:
             return None
+        try:
+            return api.list_packages(env_name)
         except Exception as e:
-            logging.error(f"Error running command: {str(e)}")
+            logging.error(f"Package inventory failed for {env_name}: {str(e)}")
             return None
 
+    @staticmethod
+    def lollmsenv_argv(command):
+        # Argument vector for the front-end script, no shell involved
+        if sys.platform.startswith("win"):
+            return ["cmd", "/c", str(LollmsEnvManager.SCRIPT_DIR / "lollmsenv.bat"), *command]
+        script = LollmsEnvManager.SCRIPT_DIR / "lollmsenv"
+        return [str(script) if script.exists() else "lollmsenv", *command]
+
+    @staticmethod
+    def env_pip_argv(env_name, args):
+        # pip of the environment itself; the shared wheelhouse is offered as an extra source
+        api = LollmsEnvManager.api()
+        env = api.engine.registry.get_env(env_name) if api is not None else None
+        if env is not None:
+            python = api.engine.env_interpreter_path(env["path"])
+            links = ["--find-links", str(api.engine.wheelhouse.dir)] if args[0] == "install" else []
+            return [str(python), "-m", "pip", *args[:1], *links, *args[1:]]
+        if sys.platform.startswith("win"):
+            return ["cmd", "/c", f"lollmsenv.bat activate {env_name} && pip {' '.join(args)}"]
+        script = shlex.quote(LollmsEnvManager.lollmsenv_argv([])[0])
+        return ["bash", "-c", f"source {script} activate {shlex.quote(env_name)} && pip {shlex.join(args)}"]
+
     @staticmethod
     def is_env_active(env_name):
         # Get the path of the Python interpreter
@@ -84,83 +380,41 @@ class LollmsEnvManager:
             return False
 
 
-    @staticmethod
-    def get_installed_pythons():
-        if LollmsEnvManager.PYTHONS_FILE.exists():
-            with LollmsEnvManager.PYTHONS_FILE.open("r") as f:
-                return [f"{line.split(',')[0]}: {line.split(',')[1]}" for line in f]
-        return []
+    # Long-running operations: argument vectors handed to the JobQueue. The scripts update the registries themselves.
 
     @staticmethod
-    def get_installed_envs():
-        if LollmsEnvManager.ENVS_FILE.exists():
-            with LollmsEnvManager.ENVS_FILE.open("r") as f:
-                return [f"{line.split(',')[0]}: {line.split(',')[2]}" for line in f]
-        return []
+    def install_python_command(version):
+        return LollmsEnvManager.lollmsenv_argv(['install-python', version])
 
     @staticmethod
-    def install_python(version):
-        result = LollmsEnvManager.run_lollmsenv_command(['install-python', version])
-        if result:
-            LollmsEnvManager.update_pythons_file(version, result)
-        return result is not None
+    def remove_python_command(version):
+        return LollmsEnvManager.lollmsenv_argv(['delete-python', version])
 
     @staticmethod
-    def remove_python(version):
-        result = LollmsEnvManager.run_lollmsenv_command(['delete-python', version])
-        if result:
-            LollmsEnvManager.remove_from_pythons_file(version)
-        return result is not None
+    def create_env_command(name, python_version):
+        return LollmsEnvManager.lollmsenv_argv(['create-env', name, python_version])
 
     @staticmethod
-    def create_env(name, python_version):
-        result = LollmsEnvManager.run_lollmsenv_command(['create-env', name, python_version])
-        if result:
-            LollmsEnvManager.update_envs_file(name, result, python_version)
-        return result is not None
+    def remove_env_command(name):
+        return LollmsEnvManager.lollmsenv_argv(['delete-env', name])
 
     @staticmethod
-    def remove_env(name):
-        result = LollmsEnvManager.run_lollmsenv_command(['delete-env', name])
-        if result:
-            LollmsEnvManager.remove_from_envs_file(name)
-        return result is not None
+    def install_package_command(env_name, package_name):
+        return LollmsEnvManager.env_pip_argv(env_name, ['install', package_name])
 
     @staticmethod
-    def update_pythons_file(version, path):
-        with LollmsEnvManager.PYTHONS_FILE.open("a") as f:
-            f.write(f"{version},{path}\n")
+    def remove_package_command(env_name, package_name):
+        return LollmsEnvManager.env_pip_argv(env_name, ['uninstall', '-y', package_name])
 
     @staticmethod
-    def remove_from_pythons_file(version):
-        lines = LollmsEnvManager.PYTHONS_FILE.read_text().splitlines()
-        LollmsEnvManager.PYTHONS_FILE.write_text("\n".join(line for line in lines if not line.startswith(f"{version},")))
-
-    @staticmethod
-    def update_envs_file(name, path, python_version):
-        with LollmsEnvManager.ENVS_FILE.open("a") as f:
-            f.write(f"{name},{path},{python_version}\n")
-
-    @staticmethod
-    def remove_from_envs_file(name):
-        lines = LollmsEnvManager.ENVS_FILE.read_text().splitlines()
-        LollmsEnvManager.ENVS_FILE.write_text("\n".join(line for line in lines if not line.startswith(f"{name},")))
-
-    @staticmethod
-    def install_package(env_name, package_name):
-        return LollmsEnvManager.run_lollmsenv_command(['activate', env_name, '&&', 'install', package_name]) is not None
-
-    @staticmethod
-    def remove_package(env_name, package_name):
-        return LollmsEnvManager.run_lollmsenv_command(['activate', env_name, '&&', 'pip', 'uninstall', '-y', package_name]) is not None
-
-    @staticmethod
-    def update_package(env_name, package_name):
-        return LollmsEnvManager.run_lollmsenv_command(['activate', env_name, '&&', 'pip', 'install', '--upgrade', package_name]) is not None
+    def update_package_command(env_name, package_name):
+        return LollmsEnvManager.env_pip_argv(env_name, ['install', '--upgrade', package_name])
 
 class PythonsView(QWidget):
-    def __init__(self):
+    def __init__(self, jobs, registry):
         super().__init__()
+        self.jobs = jobs
+        self.registry = registry
         self.layout = QVBoxLayout()
         self.pythons_list = QListWidget()
         self.refresh_button = QPushButton("Refresh")
@@ -174,25 +428,27 @@ class PythonsView(QWidget):
 
         self.setLayout(self.layout)
 
-        self.refresh_button.clicked.connect(self.refresh_pythons)
+        self.refresh_button.clicked.connect(self.registry.reload)
         self.install_button.clicked.connect(self.install_python)
         self.remove_button.clicked.connect(self.remove_python)
+        self.registry.pythons_changed.connect(self.refresh_pythons)
 
         self.refresh_pythons()
 
     def refresh_pythons(self):
-        self.pythons_list.clear()
-        pythons = LollmsEnvManager.get_installed_pythons()
-        self.pythons_list.addItems(pythons)
+        sync_list(self.pythons_list, self.registry.python_labels())
 
     def install_python(self):
         version, ok = QInputDialog.getText(self, "Install Python", "Enter Python version:")
         if ok and version:
-            success = LollmsEnvManager.install_python(version)
-            if success:
-                self.refresh_pythons()
-            else:
-                QMessageBox.warning(self, "Installation Failed", "Failed to install Python " + version)
+            job = self.jobs.submit(f"Install Python {version}", LollmsEnvManager.install_python_command(version), f"python:{version}")
+            job.finished.connect(lambda success: self.on_python_installed(success, version))
+
+    def on_python_installed(self, success, version):
+        if success:
+            self.registry.reload()
+        else:
+            QMessageBox.warning(self, "Installation Failed", "Failed to install Python " + version)
 
     def remove_python(self):
         current_item = self.pythons_list.currentItem()
@@ -201,17 +457,22 @@ class PythonsView(QWidget):
             reply = QMessageBox.question(self, "Remove Python", f"Are you sure you want to remove Python {version}?",
                                          QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.Yes:
-                success = LollmsEnvManager.remove_python(version)
-                if success:
-                    self.refresh_pythons()
-                else:
-                    QMessageBox.warning(self, "Removal Failed", f"Failed to remove Python {version}")
+                job = self.jobs.submit(f"Remove Python {version}", LollmsEnvManager.remove_python_command(version), f"python:{version}")
+                job.finished.connect(lambda success: self.on_python_removed(success, version))
         else:
             QMessageBox.warning(self, "No Selection", "Please select a Python version to remove")
 
+    def on_python_removed(self, success, version):
+        if success:
+            self.registry.reload()
+        else:
+            QMessageBox.warning(self, "Removal Failed", f"Failed to remove Python {version}")
+
 class EnvironmentsView(QWidget):
-    def __init__(self):
+    def __init__(self, jobs, registry):
         super().__init__()
+        self.jobs = jobs
+        self.registry = registry
         self.layout = QVBoxLayout()
         self.envs_list = QListWidget()
         self.refresh_button = QPushButton("Refresh")
@@ -225,27 +486,29 @@ class EnvironmentsView(QWidget):
 
         self.setLayout(self.layout)
 
-        self.refresh_button.clicked.connect(self.refresh_envs)
+        self.refresh_button.clicked.connect(self.registry.reload)
         self.create_button.clicked.connect(self.create_env)
         self.remove_button.clicked.connect(self.remove_env)
+        self.registry.envs_changed.connect(self.refresh_envs)
 
         self.refresh_envs()
 
     def refresh_envs(self):
-        self.envs_list.clear()
-        envs = LollmsEnvManager.get_installed_envs()
-        self.envs_list.addItems(envs)
+        sync_list(self.envs_list, self.registry.env_labels())
 
     def create_env(self):
         name, ok1 = QInputDialog.getText(self, "Create Environment", "Enter environment name:")
         if ok1 and name:
             version, ok2 = QInputDialog.getText(self, "Create Environment", "Enter Python version:")
             if ok2 and version:
-                success = LollmsEnvManager.create_env(name, version)
-                if success:
-                    self.refresh_envs()
-                else:
-                    QMessageBox.warning(self, "Creation Failed", f"Failed to create environment {name}")
+                job = self.jobs.submit(f"Create environment {name}", LollmsEnvManager.create_env_command(name, version), f"env:{name}")
+                job.finished.connect(lambda success: self.on_env_created(success, name))
+
+    def on_env_created(self, success, name):
+        if success:
+            self.registry.reload()
+        else:
+            QMessageBox.warning(self, "Creation Failed", f"Failed to create environment {name}")
 
     def remove_env(self):
         current_item = self.envs_list.currentItem()
@@ -254,17 +517,22 @@ class EnvironmentsView(QWidget):
             reply = QMessageBox.question(self, "Remove Environment", f"Are you sure you want to remove environment {name}?",
                                          QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.Yes:
-                success = LollmsEnvManager.remove_env(name)
-                if success:
-                    self.refresh_envs()
-                else:
-                    QMessageBox.warning(self, "Removal Failed", f"Failed to remove environment {name}")
+                job = self.jobs.submit(f"Remove environment {name}", LollmsEnvManager.remove_env_command(name), f"env:{name}")
+                job.finished.connect(lambda success: self.on_env_removed(success, name))
         else:
             QMessageBox.warning(self, "No Selection", "Please select an environment to remove")
 
+    def on_env_removed(self, success, name):
+        if success:
+            self.registry.reload()
+        else:
+            QMessageBox.warning(self, "Removal Failed", f"Failed to remove environment {name}")
+
 class PackagesView(QWidget):
-    def __init__(self):
+    def __init__(self, jobs, registry):
         super().__init__()
+        self.jobs = jobs
+        self.registry = registry
         self.layout = QVBoxLayout()
         self.env_selector = QListWidget()
         self.packages_list = QListWidget()
@@ -290,19 +558,22 @@ class PackagesView(QWidget):
         self.install_button.clicked.connect(self.install_package)
         self.remove_button.clicked.connect(self.remove_package)
         self.update_button.clicked.connect(self.update_package)
+        self.registry.envs_changed.connect(self.refresh_envs)
 
         self.refresh_envs()
 
     def refresh_envs(self):
-        self.env_selector.clear()
-        envs = LollmsEnvManager.get_installed_envs()
-        self.env_selector.addItems(envs)
+        sync_list(self.env_selector, self.registry.env_labels())
 
     def refresh_packages(self):
         self.packages_list.clear()
         current_env = self.env_selector.currentItem()
         if current_env:
             env_name = current_env.text().split(':')[0]
+            packages = LollmsEnvManager.list_packages(env_name)
+            if packages is not None:
+                self.on_packages_loaded(packages)
+                return
             self.spinner.show()
             self.worker = Worker(self.get_packages, env_name)
             self.worker.finished.connect(self.on_packages_loaded)
@@ -310,29 +581,26 @@ class PackagesView(QWidget):
             self.worker.start()
 
     def get_packages(self, env_name):
-        # Check if the environment is already active
-        if not LollmsEnvManager.is_env_active(env_name):
-            # Activate the environment only if it's not already active
-            activate_result = LollmsEnvManager.run_lollmsenv_command(['activate', env_name])
-            logging.debug(f"Activate result: {activate_result}")
-            if activate_result is None:
-                raise Exception(f"Failed to activate environment {env_name}")
-
-        # List the packages
-        packages_result = LollmsEnvManager.run_lollmsenv_command(['pip', 'list'])
-        logging.debug(f"Packages result: {packages_result}")
-        if packages_result is None:
-            raise Exception("Failed to list packages")
-
-        return packages_result  
+        # Fallback when the lollmsenv package is not available: ask the environment's pip
+        result = subprocess.run(LollmsEnvManager.env_pip_argv(env_name, ['list']), capture_output=True, text=True)
+        logging.debug(f"Packages result: {result.stdout}")
+        if result.returncode != 0:
+            raise Exception(f"Failed to list packages: {result.stderr}")
+
+        rows = [line.split() for line in result.stdout.strip().split('\n')[2:]]  # Skip the header rows
+        return [{"name": row[0], "version": row[1]} for row in rows if len(row) >= 2]
 
     def on_packages_loaded(self, packages):
         self.spinner.hide()
         if packages:
-            self.packages_list.addItems(packages.split('\n')[2:])  # Skip the header rows
+            self.packages_list.addItems([f"{p['name']} {p['version']}" for p in packages])
         else:
             QMessageBox.warning(self, "Error", "Failed to load packages")
 
+    def on_progress(self, percent):
+        self.spinner.setRange(0, 100)
+        self.spinner.setValue(percent)
+
     def on_error(self, error_message):
         self.spinner.hide()
         QMessageBox.warning(self, "Error", f"An error occurred: {error_message}")
@@ -343,10 +611,10 @@ class PackagesView(QWidget):
         if current_env and package_name:
             env_name = current_env.text().split(':')[0]
             self.spinner.show()
-            self.worker = Worker(LollmsEnvManager.install_package, env_name, package_name)
-            self.worker.finished.connect(self.on_package_installed)
-            self.worker.error.connect(self.on_error)
-            self.worker.start()
+            job = self.jobs.submit(f"Install {package_name} in {env_name}",
+                                  LollmsEnvManager.install_package_command(env_name, package_name), f"env:{env_name}")
+            job.progress.connect(self.on_progress)
+            job.finished.connect(self.on_package_installed)
         else:
             QMessageBox.warning(self, "Invalid Input", "Please select an environment and enter a package name")
 
@@ -368,10 +636,10 @@ class PackagesView(QWidget):
                                          QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.Yes:
                 self.spinner.show()
-                self.worker = Worker(LollmsEnvManager.remove_package, env_name, package_name)
-                self.worker.finished.connect(self.on_package_removed)
-                self.worker.error.connect(self.on_error)
-                self.worker.start()
+                job = self.jobs.submit(f"Remove {package_name} in {env_name}",
+                                      LollmsEnvManager.remove_package_command(env_name, package_name), f"env:{env_name}")
+                job.progress.connect(self.on_progress)
+                job.finished.connect(self.on_package_removed)
         else:
             QMessageBox.warning(self, "No Selection", "Please select an environment and a package to remove")
 
@@ -389,10 +657,10 @@ class PackagesView(QWidget):
             env_name = current_env.text().split(':')[0]
             package_name = current_package.text().split()[0]
             self.spinner.show()
-            self.worker = Worker(LollmsEnvManager.update_package, env_name, package_name)
-            self.worker.finished.connect(self.on_package_updated)
-            self.worker.error.connect(self.on_error)
-            self.worker.start()
+            job = self.jobs.submit(f"Update {package_name} in {env_name}",
+                                  LollmsEnvManager.update_package_command(env_name, package_name), f"env:{env_name}")
+            job.progress.connect(self.on_progress)
+            job.finished.connect(self.on_package_updated)
         else:
             QMessageBox.warning(self, "No Selection", "Please select an environment and a package to update")
 
@@ -403,6 +671,67 @@ class PackagesView(QWidget):
         else:
             QMessageBox.warning(self, "Update Failed", "Failed to update package")
 
+class JobsView(QWidget):
+    def __init__(self, jobs):
+        super().__init__()
+        self.jobs = jobs
+        self.layout = QVBoxLayout()
+        self.jobs_list = QListWidget()
+        self.progress = QProgressBar()
+        self.output = QPlainTextEdit()
+        self.output.setReadOnly(True)
+        self.output.setMaximumBlockCount(Job.MAX_LINES)
+        self.cancel_button = QPushButton("Cancel Job")
+
+        self.layout.addWidget(QLabel("Jobs:"))
+        self.layout.addWidget(self.jobs_list)
+        self.layout.addWidget(self.progress)
+        self.layout.addWidget(QLabel("Output:"))
+        self.layout.addWidget(self.output)
+        self.layout.addWidget(self.cancel_button)
+
+        self.setLayout(self.layout)
+
+        self.jobs.job_added.connect(self.add_job)
+        self.jobs_list.currentRowChanged.connect(self.show_job)
+        self.cancel_button.clicked.connect(self.cancel_job)
+
+    def current_job(self):
+        row = self.jobs_list.currentRow()
+        return self.jobs.jobs[row] if 0 <= row < len(self.jobs.jobs) else None
+
+    def add_job(self, job):
+        item = QListWidgetItem(f"{job.title} [{job.state}]")
+        self.jobs_list.addItem(item)
+        job.state_changed.connect(lambda state, item=item, job=job: item.setText(f"{job.title} [{state}]"))
+        job.output.connect(lambda line, is_stderr, job=job: self.on_output(job, line))
+        job.progress.connect(lambda percent, job=job: self.on_progress(job, percent))
+        self.jobs_list.setCurrentItem(item)
+
+    def show_job(self, row):
+        job = self.current_job()
+        self.output.setPlainText("\n".join(job.lines) if job else "")
+        self.on_progress(job, job.percent if job else None)
+
+    def on_output(self, job, line):
+        if job is self.current_job():
+            self.output.appendPlainText(line)
+
+    def on_progress(self, job, percent):
+        if job is not self.current_job():
+            return
+        if percent is None:
+            self.progress.setRange(0, 0 if job is not None and job.state == "running" else 100)
+            self.progress.setValue(0)
+        else:
+            self.progress.setRange(0, 100)
+            self.progress.setValue(percent)
+
+    def cancel_job(self):
+        job = self.current_job()
+        if job is not None:
+            job.cancel()
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -415,21 +744,27 @@ class MainWindow(QMainWindow):
 
         # Create and setup sidebar
         self.sidebar = QListWidget()
-        self.sidebar.addItems(["Pythons", "Environments", "Packages"])
+        self.sidebar.addItems(["Pythons", "Environments", "Packages", "Jobs"])
         self.sidebar.setFixedWidth(150)
         self.sidebar.currentRowChanged.connect(self.change_view)
 
         # Create stacked widget for content area
         self.content_area = QStackedWidget()
 
+        # Every long-running operation goes through one queue, every view reads one registry model
+        self.jobs = JobQueue()
+        self.registry = RegistryModel(LollmsEnvManager.SCRIPT_DIR.parent)
+
         # Create and add views
-        self.pythons_view = PythonsView()
-        self.environments_view = EnvironmentsView()
-        self.packages_view = PackagesView()
+        self.pythons_view = PythonsView(self.jobs, self.registry)
+        self.environments_view = EnvironmentsView(self.jobs, self.registry)
+        self.packages_view = PackagesView(self.jobs, self.registry)
+        self.jobs_view = JobsView(self.jobs)
 
         self.content_area.addWidget(self.pythons_view)
         self.content_area.addWidget(self.environments_view)
         self.content_area.addWidget(self.packages_view)
+        self.content_area.addWidget(self.jobs_view)
 
         # Add widgets to main layout
         main_layout.addWidget(self.sidebar)
@@ -443,6 +778,10 @@ class MainWindow(QMainWindow):
     def change_view(self, index):
         self.content_area.setCurrentIndex(index)
 
+    def closeEvent(self, event):
+        self.jobs.cancel_all()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     